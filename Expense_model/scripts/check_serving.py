@@ -0,0 +1,92 @@
+#!/usr/bin/env python3
+"""
+Serving check for a freshly trained model
+Categorizes the descriptions of exp.csv through the backend's BillExtractor, as a batch
+and one by one, and fails unless the served features equal the training columns of
+prepare_dataset (the date features aside, which the API takes from the current time),
+the ML model (not just the keyword rules) answers some of them, the cascade counters move,
+every model answer is a category name and the batch agrees with the single-expense path.
+
+Usage: python check_serving.py   (run train_production_model.py first)
+"""
+
+import contextlib
+import io
+import os
+import sys
+import warnings
+import numpy as np
+import pandas as pd
+
+from train_production_model import prepare_dataset
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', '..', 'backend'))
+from models import TEMPORAL_FEATURES
+
+warnings.filterwarnings('ignore')
+
+
+def feature_mismatches(extractor):
+    """Served feature columns that differ from the training columns for the same notes"""
+    with contextlib.redirect_stdout(io.StringIO()):
+        df_clean = prepare_dataset()
+    notes_clean, served = extractor.feature_builder.batch_features(df_clean['Note'], df_clean['Amount'])
+    mismatches = [] if (notes_clean == df_clean['Note_clean']).all() else ['Note_clean']
+    for column in served.columns.drop(TEMPORAL_FEATURES, errors='ignore'):
+        if not np.allclose(served[column].to_numpy(dtype=float), df_clean[column].to_numpy(dtype=float)):
+            mismatches.append(column)
+    return mismatches
+
+
+def check_serving(limit=500):
+    with contextlib.redirect_stdout(io.StringIO()):
+        import app
+    extractor = app.bill_extractor
+    if extractor.expense_model is None or extractor.feature_builder is None:
+        print("❌ No trained model with named scaler features, run train_production_model.py first")
+        return False
+
+    feature_differences = feature_mismatches(extractor)
+    print(f"Served features that differ from training: {feature_differences or 'none'}")
+
+    df = pd.read_csv("../data/exp.csv").dropna(subset=['Note'])
+    df['Amount'] = pd.to_numeric(df['Amount'], errors='coerce').fillna(0)
+    expenses = list(zip(df['Note'].astype(str), df['Amount']))[:limit]
+    categories = set(extractor.label_encoder.classes_) if extractor.label_encoder is not None else None
+
+    # Both paths from a cold cache, so neither answers from the other's entries
+    extractor.category_cache.clear()
+    with contextlib.redirect_stdout(io.StringIO()):
+        batch = extractor.categorize_expenses(expenses)
+    extractor.category_cache.clear()
+    with contextlib.redirect_stdout(io.StringIO()):
+        single = [extractor.categorize_expense(description, amount) for description, amount in expenses]
+    extractor.category_cache.clear()
+
+    sources = {source: sum(result['source'] == source for result in batch) for source in ('rule', 'model', 'default')}
+    model_answers = {result['category'] for result in batch if result['source'] == 'model'}
+    mismatches = sum(result['category'] != category for result, category in zip(batch, single))
+    print(f"Sources: {sources}")
+    print(f"Cascade: {extractor.cascade_counters}")
+    print(f"Batch vs single mismatches: {mismatches} of {len(expenses)}")
+
+    failures = []
+    if feature_differences:
+        failures.append(f"served features differ from training: {feature_differences}")
+    if not sources['model']:
+        failures.append("no expense was categorized by the model")
+    if not extractor.cascade_counters['fast'] + extractor.cascade_counters['ensemble']:
+        failures.append("cascade counters did not move")
+    if categories is not None and not model_answers <= categories:
+        failures.append(f"model answers that are not category names: {sorted(model_answers - categories)[:5]}")
+    if mismatches:
+        failures.append(f"{mismatches} batch categories differ from categorize_expense")
+    for failure in failures:
+        print(f"❌ {failure}")
+    if not failures:
+        print("✅ Model serving checks passed")
+    return not failures
+
+
+if __name__ == "__main__":
+    sys.exit(0 if check_serving() else 1)
@@ -0,0 +1,91 @@
+#!/usr/bin/env python3
+"""
+Accuracy/latency report for cascade inference
+Runs the saved ensemble's logistic regression alone when it is confident and the full
+ensemble otherwise, over the held-out split of exp.csv, for a range of thresholds.
+Use it to pick SMARTSPEND_ML_CASCADE_THRESHOLD.
+
+Usage: python evaluate_cascade.py [threshold ...]   (run train_production_model.py first)
+"""
+
+import os
+import pickle
+import sys
+import time
+import warnings
+import numpy as np
+from scipy.sparse import hstack
+from sklearn.model_selection import train_test_split
+from sklearn.preprocessing import LabelEncoder
+
+from train_production_model import prepare_dataset
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', '..', 'backend'))
+from models import cascade_predict
+
+warnings.filterwarnings('ignore')
+
+DEFAULT_THRESHOLDS = [0.5, 0.6, 0.7, 0.8, 0.9, 0.95]
+
+
+def load(name):
+    with open(f"../models/{name}", 'rb') as f:
+        return pickle.load(f)
+
+
+def per_item_ms(predict, X):
+    """Mean milliseconds per single-row prediction, the way the API categorizes"""
+    start = time.perf_counter()
+    for i in range(X.shape[0]):
+        predict(X[i])
+    return (time.perf_counter() - start) * 1000 / X.shape[0]
+
+
+def evaluate_cascade(thresholds):
+    print("📊 Cascade evaluation: logistic regression first, ensemble when unsure")
+    print("=" * 60)
+
+    try:
+        ensemble = load("expense_model.pkl")
+        tfidf = load("tfidf_vectorizer.pkl")
+        scaler = load("feature_scaler.pkl")
+    except FileNotFoundError as e:
+        print(f"❌ {e.filename} not found, run train_production_model.py first")
+        return None
+
+    # Same features and held-out split as train_production_model
+    df_clean = prepare_dataset()
+    X_numeric = df_clean[list(scaler.feature_names_in_)].fillna(0)
+    X = hstack([tfidf.transform(df_clean['Note_clean']), scaler.transform(X_numeric)]).tocsr()
+    y_encoded = LabelEncoder().fit_transform(df_clean['Category'])
+    _, test_index = train_test_split(np.arange(X.shape[0]), test_size=0.2, random_state=42, stratify=y_encoded)
+    X_test, y_test = X[test_index], y_encoded[test_index]
+    print(f"Test samples: {X_test.shape[0]}")
+
+    ensemble_accuracy = float(np.mean(ensemble.predict(X_test) == y_test))
+    ensemble_ms = per_item_ms(ensemble.predict, X_test)
+    print(f"\n🏆 Full ensemble: accuracy {ensemble_accuracy:.4f}, {ensemble_ms:.2f} ms/item")
+
+    report = []
+    print(f"\n{'threshold':>9} {'accuracy':>9} {'vs ens.':>8} {'fast path':>10} {'ms/item':>8} {'speedup':>8}")
+    for threshold in thresholds:
+        predictions, confident = cascade_predict(ensemble, X_test, threshold)
+        accuracy = float(np.mean(predictions == y_test))
+        ms = per_item_ms(lambda row: cascade_predict(ensemble, row, threshold), X_test)
+        report.append({
+            'threshold': threshold,
+            'accuracy': accuracy,
+            'accuracy_delta': accuracy - ensemble_accuracy,
+            'fast_path_share': float(confident.mean()),
+            'fast_path_accuracy': float(np.mean(predictions[confident] == y_test[confident])) if confident.any() else None,
+            'ms_per_item': ms,
+            'speedup': ensemble_ms / ms
+        })
+        print(f"{threshold:>9.2f} {accuracy:>9.4f} {accuracy - ensemble_accuracy:>+8.4f} "
+              f"{confident.mean() * 100:>9.1f}% {ms:>8.2f} {ensemble_ms / ms:>7.1f}x")
+
+    return {'ensemble_accuracy': ensemble_accuracy, 'ensemble_ms_per_item': ensemble_ms, 'thresholds': report}
+
+
+if __name__ == "__main__":
+    evaluate_cascade([float(arg) for arg in sys.argv[1:]] or DEFAULT_THRESHOLDS)
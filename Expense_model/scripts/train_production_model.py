@@ -4,9 +4,10 @@ Production-Ready Ultra-Enhanced Model
 Fixed prediction interface for deployment
 """
 
+import os
+import sys
 import pandas as pd
 import numpy as np
-import re
 import warnings
 from sklearn.model_selection import train_test_split, cross_val_score
 from sklearn.feature_extraction.text import TfidfVectorizer
@@ -19,6 +20,10 @@ import json
 from datetime import datetime
 from scipy.sparse import hstack
 
+# The feature builder is shared with the backend, which serves exactly these features
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', '..', 'backend'))
+from models import TEMPORAL_FEATURES, expense_features
+
 warnings.filterwarnings('ignore')
 
 class ProductionExpenseClassifier:
@@ -29,84 +34,11 @@ class ProductionExpenseClassifier:
         self.scaler = scaler
         self.numeric_features = numeric_features
         self.label_encoder = label_encoder
-        
-        # Keyword categories for feature extraction
-        self.keyword_categories = {
-            'food': ['food', 'restaurant', 'cafe', 'meal', 'lunch', 'dinner', 'breakfast', 
-                    'snacks', 'grocery', 'milk', 'bread', 'delivery', 'dining', 'pizza', 
-                    'burger', 'chicken', 'rice', 'curry', 'naan', 'biryani'],
-            'transport': ['auto', 'taxi', 'train', 'bus', 'metro', 'fuel', 'gas', 'parking', 
-                         'uber', 'ola', 'transport', 'vehicle', 'car'],
-            'bills': ['bill', 'electric', 'electricity', 'water', 'internet', 'phone', 
-                     'mobile', 'subscription', 'utility', 'service'],
-            'shopping': ['shopping', 'store', 'mall', 'amazon', 'flipkart', 'clothes', 'electronics'],
-            'health': ['hospital', 'doctor', 'pharmacy', 'medical', 'health', 'clinic'],
-            'entertainment': ['movie', 'cinema', 'game', 'netflix', 'entertainment'],
-            'tools': ['tool', 'tools', 'equipment', 'hardware', 'saw', 'hammer', 'drill', 'wrench', 
-                     'stanley', 'bosch', 'makita', 'dewalt', 'craftsman', 'precision', 'manufacturing', 
-                     'workshop', 'machinery', 'component', 'spare', 'automatic', 'manual', 'industrial'],
-            'business': ['business', 'office', 'consulting', 'professional', 'legal', 'accounting', 
-                        'service', 'company', 'corporate', 'commercial']
-        }
-        
-    def _clean_text(self, text):
-        """Clean and normalize text"""
-        text = str(text).lower()
-        text = re.sub(r'[^\w\s]', ' ', text)
-        text = ' '.join(text.split())
-        return text
-    
-    def _count_keywords(self, text, keywords):
-        """Count keyword occurrences"""
-        text_lower = text.lower()
-        return sum(1 for keyword in keywords if keyword in text_lower)
     
     def _extract_features(self, note, amount):
-        """Extract features for prediction"""
-        note_clean = self._clean_text(note)
-        
-        # Basic features that match training
-        features = {
-            'Amount': amount,
-            'LogAmount': np.log1p(amount),
-            'AmountRange': self._get_amount_range(amount),
-            'DayOfWeek': pd.Timestamp.now().dayofweek,
-            'Month': pd.Timestamp.now().month,
-            'Day': pd.Timestamp.now().day,
-            'IsWeekend': 1 if pd.Timestamp.now().dayofweek >= 5 else 0,
-            'IsMonthEnd': 1 if pd.Timestamp.now().day >= 25 else 0,
-            'IsMonthStart': 1 if pd.Timestamp.now().day <= 5 else 0,
-            'TextLength': len(note_clean),
-            'WordCount': len(note_clean.split()),
-            'UpperCaseRatio': sum(1 for c in note if c.isupper()) / len(note) if note else 0,
-            'DigitRatio': sum(1 for c in note if c.isdigit()) / len(note) if note else 0,
-        }
-        
-        # Add keyword features
-        for category, keywords in self.keyword_categories.items():
-            features[f'{category}_keywords'] = self._count_keywords(note_clean, keywords)
-        
-        # Pattern features
-        features['HasAmountPattern'] = 1 if re.search(r'\d+\s*(rs|rupees|inr|\$)', note.lower()) else 0
-        features['HasTimePattern'] = 1 if re.search(r'\d{1,2}:\d{2}', note) else 0
-        features['HasPlacePattern'] = 1 if re.search(r'place\s+\d+', note.lower()) else 0
-        
-        return note_clean, features
-    
-    def _get_amount_range(self, amount):
-        """Get amount range category"""
-        if amount < 50:
-            return 0
-        elif amount < 200:
-            return 1
-        elif amount < 500:
-            return 2
-        elif amount < 1000:
-            return 3
-        elif amount < 5000:
-            return 4
-        else:
-            return 5
+        """Extract features for prediction, as the backend does"""
+        notes_clean, features = expense_features([note], [amount])
+        return notes_clean[0], features.iloc[0].to_dict()
     
     def predict(self, data):
         """Predict category for input data"""
@@ -150,13 +82,10 @@ class ProductionExpenseClassifier:
         
         return prediction
 
-def train_production_model():
-    """Train production-ready model"""
-    print("🚀 Training Production-Ready Ultra Model")
-    print("=" * 60)
-    
+def prepare_dataset(csv_path="../data/exp.csv"):
+    """Load exp.csv, clean it and add the engineered feature columns"""
     # Load data
-    df = pd.read_csv("../data/exp.csv")
+    df = pd.read_csv(csv_path)
     print(f"Dataset: {df.shape}")
     
     # Clean data
@@ -190,61 +119,30 @@ def train_production_model():
     print(f"Cleaned: {df_clean.shape}")
     print(f"Categories: {sorted(df_clean['Category'].unique())}")
     
-    # Feature engineering
-    def clean_text(text):
-        text = str(text).lower()
-        text = re.sub(r'[^\w\s]', ' ', text)
-        return ' '.join(text.split())
-    
-    def count_keywords(text, keywords):
-        return sum(1 for kw in keywords if kw in text.lower())
-    
-    df_clean['Note_clean'] = df_clean['Note'].apply(clean_text)
-    
-    # Create features
-    df_clean['LogAmount'] = np.log1p(df_clean['Amount'])
-    df_clean['AmountRange'] = pd.cut(df_clean['Amount'], 
-                                   bins=[0, 50, 200, 500, 1000, 5000, float('inf')],
-                                   labels=[0, 1, 2, 3, 4, 5]).astype(int)
-    
-    df_clean['TextLength'] = df_clean['Note_clean'].str.len()
-    df_clean['WordCount'] = df_clean['Note_clean'].str.split().str.len()
-    df_clean['UpperCaseRatio'] = df_clean['Note'].apply(lambda x: sum(1 for c in x if c.isupper()) / len(x) if x else 0)
-    df_clean['DigitRatio'] = df_clean['Note'].apply(lambda x: sum(1 for c in x if c.isdigit()) / len(x) if x else 0)
-    
-    # Keyword features
-    keyword_categories = {
-        'food': ['food', 'restaurant', 'chicken', 'pizza', 'meal', 'dining', 'naan', 'curry'],
-        'transport': ['taxi', 'auto', 'fuel', 'parking', 'uber', 'transport', 'gas', 'metro'],
-        'bills': ['bill', 'electric', 'internet', 'phone', 'subscription', 'utility'],
-        'shopping': ['shopping', 'amazon', 'store', 'clothes', 'electronics', 'mall'],
-        'health': ['hospital', 'doctor', 'medical', 'health', 'pharmacy', 'clinic'],
-        'entertainment': ['movie', 'game', 'entertainment', 'netflix', 'cinema'],
-        'tools': ['tool', 'tools', 'equipment', 'hardware', 'saw', 'hammer', 'drill', 'wrench', 
-                 'stanley', 'bosch', 'makita', 'precision', 'manufacturing', 'workshop', 'machinery'],
-        'business': ['business', 'office', 'consulting', 'professional', 'service', 'company']
-    }
-    
-    for category, keywords in keyword_categories.items():
-        df_clean[f'{category}_keywords'] = df_clean['Note_clean'].apply(
-            lambda x: count_keywords(x, keywords)
-        )
-    
-    # Pattern features
-    df_clean['HasAmountPattern'] = df_clean['Note'].apply(lambda x: 1 if re.search(r'\d+\s*(rs|rupees|inr)', x.lower()) else 0)
-    df_clean['HasTimePattern'] = df_clean['Note'].apply(lambda x: 1 if re.search(r'\d{1,2}:\d{2}', x) else 0)
-    df_clean['HasPlacePattern'] = df_clean['Note'].apply(lambda x: 1 if re.search(r'place\s+\d+', x.lower()) else 0)
-    
-    # Temporal features (simplified)
+    # Temporal features come from the expense dates when there are any
+    dates = None
     if 'Date' in df_clean.columns:
         df_clean['Date'] = pd.to_datetime(df_clean['Date'], errors='coerce')
         df_clean = df_clean.dropna(subset=['Date'])
-        df_clean['DayOfWeek'] = df_clean['Date'].dt.dayofweek
-        df_clean['Month'] = df_clean['Date'].dt.month
-        df_clean['Day'] = df_clean['Date'].dt.day
-        df_clean['IsWeekend'] = (df_clean['DayOfWeek'] >= 5).astype(int)
-        df_clean['IsMonthEnd'] = (df_clean['Day'] >= 25).astype(int)
-        df_clean['IsMonthStart'] = (df_clean['Day'] <= 5).astype(int)
+        dates = df_clean['Date']
+    
+    # Feature engineering: the same function the backend serves with
+    notes_clean, features = expense_features(df_clean['Note'], df_clean['Amount'], dates)
+    if dates is None:
+        features = features.drop(columns=TEMPORAL_FEATURES)
+    df_clean = df_clean.reset_index(drop=True)
+    df_clean['Note_clean'] = notes_clean
+    for column in features.columns.drop('Amount'):
+        df_clean[column] = features[column]
+    
+    return df_clean
+
+def train_production_model():
+    """Train production-ready model"""
+    print("🚀 Training Production-Ready Ultra Model")
+    print("=" * 60)
+    
+    df_clean = prepare_dataset()
     
     # Prepare features
     print("🔧 Preparing features...")
@@ -367,6 +265,10 @@ def train_production_model():
     with open("../models/feature_scaler.pkl", 'wb') as f:
         pickle.dump(scaler, f)
     
+    # The ensemble predicts label codes; the backend decodes them with this
+    with open("../models/label_encoder.pkl", 'wb') as f:
+        pickle.dump(label_encoder, f)
+    
     # Save model info
     model_info = {
         "accuracy": float(ensemble_score),
@@ -1,25 +1,53 @@
-from flask import Flask, request, jsonify
+from flask import Flask, Request, request, jsonify, Response, stream_with_context
 from flask_cors import CORS
+from werkzeug.exceptions import HTTPException
 import cv2
 import numpy as np
 import pandas as pd
 import pytesseract
-import re
 from datetime import datetime, timedelta
-import dateutil.parser as date_parser
 import joblib
 import os
-from PIL import Image
 import io
 import base64
 import json
+import time
 from collections import defaultdict
-from models import EnhancedExpenseClassifier
-import pdfplumber
-import PyPDF2
+from models import EnhancedExpenseClassifier, cascade_predict
+import ocr_engine
+import ocr_profiles
+import orientation
+import preprocessing
+import bill_document
+import date_scanner
+import patterns
+import rules
+import category_cache
+import pdf_pipeline
+from result_cache import ResultCache
+from job_queue import JobQueue, QueueFullError
+import batch_upload
+import uploads
+
+class UploadRequest(Request):
+    """Multipart PDF parts go straight to a named temporary file, so the PDF pipeline can use
+    its path instead of copying werkzeug's unnamed spool file to one"""
+
+    def _get_file_stream(self, total_content_length, content_type, filename=None, content_length=None):
+        if uploads.is_pdf_upload(content_type, filename):
+            return uploads.pdf_temp_file()
+        return super()._get_file_stream(total_content_length, content_type, filename, content_length)
 
 app = Flask(__name__)
+app.request_class = UploadRequest
 CORS(app)
+# Larger request bodies are refused with 413 before they are read
+app.config['MAX_CONTENT_LENGTH'] = uploads.MAX_UPLOAD_BYTES
+# Expenses per /api/categorize-expenses request, so one import can't hold a worker for long
+CATEGORIZE_BATCH_MAX = int(os.environ.get('SMARTSPEND_CATEGORIZE_BATCH_MAX', 500))
+# The ensemble's logistic regression answers alone when its top-class probability reaches this
+# (tune with Expense_model/scripts/evaluate_cascade.py; above 1 always runs the full ensemble)
+ML_CASCADE_THRESHOLD = float(os.environ.get('SMARTSPEND_ML_CASCADE_THRESHOLD', 0.7))
 
 # In-memory storage for expenses (replace with database in production)
 expenses_db = []
@@ -27,7 +55,6 @@ expense_id_counter = 1
 
 # Configure Tesseract path (update this path based on your installation)
 # For Windows, try these common paths:
-import fitz  # PyMuPDF
 import platform
 
 if platform.system() == "Windows":
@@ -61,6 +88,13 @@ class BillExtractor:
         model_path = os.path.join(os.path.dirname(os.path.dirname(__file__)), 'Expense_model', 'models', 'expense_model.pkl')
         tfidf_path = os.path.join(os.path.dirname(os.path.dirname(__file__)), 'Expense_model', 'models', 'tfidf_vectorizer.pkl')
         scaler_path = os.path.join(os.path.dirname(os.path.dirname(__file__)), 'Expense_model', 'models', 'feature_scaler.pkl')
+        label_encoder_path = os.path.join(os.path.dirname(os.path.dirname(__file__)), 'Expense_model', 'models', 'label_encoder.pkl')
+        self.feature_builder = None
+        self.label_encoder = None
+        # Size and modification time of each model file, part of the result cache key
+        self.model_fingerprint = tuple(
+            (os.path.basename(path), os.path.getsize(path), os.path.getmtime(path))
+            for path in (model_path, tfidf_path, scaler_path, label_encoder_path) if os.path.exists(path))
         
         if os.path.exists(model_path):
             try:
@@ -75,6 +109,14 @@ class BillExtractor:
                         self.tfidf_vectorizer = joblib.load(tfidf_path)
                         self.feature_scaler = joblib.load(scaler_path)
                         self.enhanced_features = True
+                        # Build exactly the numeric columns the scaler was fitted on
+                        if hasattr(self.feature_scaler, 'feature_names_in_'):
+                            self.feature_builder = EnhancedExpenseClassifier(
+                                self.expense_model, self.tfidf_vectorizer, self.feature_scaler,
+                                list(self.feature_scaler.feature_names_in_))
+                        # The ensemble is fitted on label codes, decoded back to category names
+                        if os.path.exists(label_encoder_path):
+                            self.label_encoder = joblib.load(label_encoder_path)
                         print("✅ Enhanced expense model with TF-IDF loaded successfully!")
                     else:
                         self.tfidf_vectorizer = None
@@ -91,40 +133,52 @@ class BillExtractor:
             self.expense_model = None
             self.enhanced_features = False
             print("Warning: Expense model not found at", model_path)
-    
-    def preprocess_image(self, image):
-        """Preprocess image for better OCR results"""
-        # Convert to grayscale
-        if len(image.shape) == 3:
-            gray = cv2.cvtColor(image, cv2.COLOR_BGR2GRAY)
-        else:
-            gray = image
         
-        # Apply Gaussian blur to reduce noise
-        blurred = cv2.GaussianBlur(gray, (5, 5), 0)
+        # OCR engine: checks Tesseract once and keeps a pool of warm workers
+        self.ocr = ocr_engine.OCREngine()
         
-        # Apply threshold to get binary image
-        _, thresh = cv2.threshold(blurred, 0, 255, cv2.THRESH_BINARY + cv2.THRESH_OTSU)
-        
-        # Morphological operations to clean up the image
-        kernel = np.ones((1, 1), np.uint8)
-        cleaned = cv2.morphologyEx(thresh, cv2.MORPH_CLOSE, kernel)
-        
-        return cleaned
+        # Keyword rules for categorization, reloadable with POST /api/categorization-rules/reload
+        self.category_rules = rules.RuleEngine()
+        # Categories of recently seen descriptions, dropped whenever the rules are reloaded
+        self.category_cache = category_cache.CategoryCache()
+        # Predictions answered by the cascade's logistic regression vs the full ensemble
+        self.cascade_counters = {'fast': 0, 'ensemble': 0}
+    
+    def preprocess_image(self, image, stats=None, detect_receipt=None, profile=None, enhance=False):
+        """Preprocess image for better OCR results"""
+        profile = profile or ocr_profiles.get_profile()
+        if detect_receipt is None:
+            detect_receipt = profile['receipt_detection']
+        
+        # Grayscale, crop/deskew the receipt and normalize the text size
+        gray, receipt_stats = preprocessing.prepare_receipt(image, detect_receipt=detect_receipt,
+                                                            target_text_height=profile['target_text_height'])
+        print(f"✂️ Preprocessing: {receipt_stats['original_size']} → {receipt_stats['final_size']} "
+              f"({receipt_stats['pixel_reduction'] * 100:.0f}% fewer pixels, "
+              f"receipt detected: {receipt_stats['receipt_detected']})")
+        # Undo sideways/upside-down photos and skew once, so no OCR pass reads rotated text
+        gray, orientation_info = orientation.correct(gray, profile['orientation'], self.ocr.detect_orientation)
+        if orientation_info:
+            print(f"🧭 Orientation: rotated {orientation_info['rotation']}°, skew {orientation_info['skew']:.1f}° "
+                  f"({orientation_info['method']}{', cached' if orientation_info['cached'] else ''}, "
+                  f"{orientation_info['elapsed_ms']}ms)")
+        
+        if enhance:
+            # Borderline image from the quality gate: equalize and sharpen before thresholding
+            gray = preprocessing.enhance(gray)
+        if stats is not None:
+            stats.update(receipt_stats, profile=profile['name'], enhanced=enhance, orientation=orientation_info)
+        
+        # Blur and Otsu threshold; a 1x1 closing is a no-op, so the binary image goes straight to OCR
+        return preprocessing.binarize(gray) if profile['binarize'] else gray
     
-    def extract_text_from_image(self, image):
+    def extract_text_from_image(self, image, stats=None, detect_receipt=None, profile=None, enhance=False):
         """Extract text from image using OCR"""
         try:
-            # Check if Tesseract is available
-            try:
-                pytesseract.get_tesseract_version()
-                tesseract_available = True
-                print("✅ Tesseract is available")
-            except:
-                tesseract_available = False
-                print("⚠️ Tesseract not available")
+            profile = profile or ocr_profiles.get_profile()
             
-            if not tesseract_available:
+            # Tesseract availability is checked once when the OCR engine starts
+            if not self.ocr.available:
                 # Instead of using demo data, try basic image analysis
                 print("🔍 Using basic image analysis fallback...")
                 
@@ -149,31 +203,25 @@ class BillExtractor:
                 """
             
             # Preprocess the image
-            processed_image = self.preprocess_image(image)
-            
-            # Try different OCR configurations for better results
-            configs = [
-                '--psm 6',  # Uniform block of text
-                '--psm 4',  # Single column of text
-                '--psm 3',  # Default
-                '--psm 12'  # Raw line text
-            ]
-            
-            best_text = ""
-            max_length = 0
-            
-            for config in configs:
-                try:
-                    text = pytesseract.image_to_string(processed_image, config=config)
-                    if len(text.strip()) > max_length:
-                        max_length = len(text.strip())
-                        best_text = text
-                except:
-                    continue
+            processed_image = self.preprocess_image(image, stats=stats, detect_receipt=detect_receipt,
+                                                    profile=profile, enhance=enhance)
+            
+            # OCR configurations of the selected speed/quality profile
+            configs = profile['configs']
+            
+            if profile['mode'] == 'confidence':
+                # One scored pass, other PSM modes only for low-confidence blocks
+                best_text = self.ocr.ocr_confidence(processed_image, configs[0], configs[1:])
+            elif profile['mode'] == 'parallel':
+                # Run the passes concurrently and stop at the first one that is good enough
+                best_text = self.ocr.ocr_parallel(processed_image, configs)
+            else:
+                # Every pass in turn on one warm worker, keeping the longest output
+                best_text = self.ocr.run(ocr_engine.best_of_passes, processed_image, configs)
             
             # If OCR failed, try with original image
             if not best_text.strip():
-                best_text = pytesseract.image_to_string(image, config='--psm 6')
+                best_text = self.ocr.image_to_string(image, config='--psm 6')
             
             print(f"📄 OCR extracted {len(best_text)} characters")
             return best_text
@@ -182,87 +230,22 @@ class BillExtractor:
             print(f"❌ OCR Error: {e}")
             return f"OCR Error: {str(e)}"
     
-    def extract_text_from_pdf(self, pdf_file):
-        """Extract text from PDF file with OCR fallback for scanned PDFs"""
-        try:
-            text = ""
-            
-            # Try pdfplumber first (better for structured documents)
-            try:
-                with pdfplumber.open(pdf_file) as pdf:
-                    for page in pdf.pages:
-                        page_text = page.extract_text()
-                        if page_text:
-                            text += page_text + "\n"
-                
-                if text.strip():
-                    print(f"📄 PDF extracted {len(text)} characters using pdfplumber")
-                    return text
-            except Exception as e:
-                print(f"⚠️ pdfplumber failed: {e}")
-            
-            # Fallback to PyPDF2
-            try:
-                pdf_file.seek(0)  # Reset file pointer
-                pdf_reader = PyPDF2.PdfReader(pdf_file)
-                
-                for page_num in range(len(pdf_reader.pages)):
-                    page = pdf_reader.pages[page_num]
-                    page_text = page.extract_text()
-                    if page_text:
-                        text += page_text + "\n"
-                
-                if text.strip():
-                    print(f"📄 PDF extracted {len(text)} characters using PyPDF2")
-                    return text
-            except Exception as e:
-                print(f"⚠️ PyPDF2 failed: {e}")
-            
-            # If both text extraction methods failed, try OCR on PDF pages
-            print("🔍 Attempting OCR extraction from PDF pages...")
-            return self.extract_text_from_scanned_pdf(pdf_file)
-            
-        except Exception as e:
-            print(f"❌ PDF Extraction Error: {e}")
-            return f"PDF Error: {str(e)}"
-    
-    def extract_text_from_scanned_pdf(self, pdf_file):
-        """Extract text from scanned PDF using OCR"""
+    def extract_text_from_pdf(self, pdf_file, force_ocr=False, progress=None, profile=None):
+        """Extract text from PDF file, page by page, with OCR for pages that have no text layer"""
         try:
-            import fitz  # PyMuPDF for converting PDF to images
-            
-            pdf_file.seek(0)  # Reset file pointer
-            doc = fitz.open(stream=pdf_file.read(), filetype="pdf")
-            
-            extracted_text = ""
+            with pdf_pipeline.pdf_path_for(pdf_file) as pdf_path:
+                pages = pdf_pipeline.extract_pages(pdf_path, self.ocr, force_ocr=force_ocr,
+                                                   progress=progress, profile=profile)
             
-            for page_num in range(len(doc)):
-                print(f"🔍 Processing PDF page {page_num + 1}...")
-                page = doc.load_page(page_num)
-                
-                # Convert PDF page to image
-                mat = fitz.Matrix(2.0, 2.0)  # High resolution
-                pix = page.get_pixmap(matrix=mat)
-                img_data = pix.tobytes("png")
-                
-                # Convert to PIL Image for OCR
-                from io import BytesIO
-                image = Image.open(BytesIO(img_data))
-                image_array = np.array(image)
-                
-                # Extract text using OCR
-                page_text = self.extract_text_from_image(image_array)
-                if page_text and page_text.strip():
-                    extracted_text += page_text + "\n"
-                    print(f"📄 Page {page_num + 1} OCR extracted {len(page_text)} characters")
-            
-            doc.close()
+            extracted_text = "".join(page['text'] + "\n" for page in pages if page['text'].strip())
             
             if extracted_text.strip():
-                print(f"✅ PDF OCR extraction successful: {len(extracted_text)} total characters")
+                text_pages = sum(1 for page in pages if page['source'] == 'text')
+                print(f"📄 PDF extracted {len(extracted_text)} characters "
+                      f"({text_pages} text pages, {len(pages) - text_pages} OCR pages)")
                 return extracted_text
             else:
-                print("❌ No text extracted from PDF using OCR")
+                print("❌ No text extracted from PDF")
                 return """
                 PDF_EXTRACTION_FAILED
                 
@@ -274,152 +257,50 @@ class BillExtractor:
                 
                 Note: PDF may be corrupted or contain no readable text.
                 """
-                
-        except ImportError:
-            print("⚠️ PyMuPDF not installed, cannot perform PDF OCR")
-            return """
-            PDF_EXTRACTION_FAILED
-            
-            Could not extract text from PDF.
-            Please try:
-            1. Converting PDF to image format
-            2. Using a different PDF file
-            3. Manual entry
-            
-            Note: Some scanned PDFs require OCR processing.
-            """
+            
+        except uploads.UploadTooLargeError:
+            raise
         except Exception as e:
-            print(f"❌ PDF OCR Error: {e}")
-            return f"PDF OCR Error: {str(e)}"
+            print(f"❌ PDF Extraction Error: {e}")
+            return f"PDF Error: {str(e)}"
+    
+    def extract_text_from_scanned_pdf(self, pdf_file):
+        """Extract text from scanned PDF using OCR on every page"""
+        return self.extract_text_from_pdf(pdf_file, force_ocr=True)
+    
+    def stream_pdf(self, pdf_file, force_ocr=False, profile=None):
+        """Yield a 'page' event with partial extraction as each PDF page finishes, then the full 'result'"""
+        texts = {}
+        today = datetime.now().strftime('%Y-%m-%d')
+        
+        with pdf_pipeline.pdf_path_for(pdf_file) as pdf_path:
+            for page in pdf_pipeline.iter_pages(pdf_path, self.ocr, force_ocr=force_ocr, profile=profile):
+                texts[page['page']] = page['text']
+                event = dict(page, event='page', amounts=[], currency=None, date=None, vendor=None)
+                
+                if page['text'].strip():
+                    # Partial results from this page alone
+                    amounts, currency = self.extract_amounts(page['text'])
+                    page_date = self.extract_dates(page['text'])
+                    event.update(amounts=amounts[:5], currency=currency,
+                                 date=page_date if page_date != today else None)
+                    if page['page'] == 1:
+                        event['vendor'] = self.extract_vendor_info(page['text'])
+                yield event
+        
+        extracted_text = "".join(texts[number] + "\n" for number in sorted(texts) if texts[number].strip())
+        if not extracted_text.strip():
+            extracted_text = "PDF_EXTRACTION_FAILED\nNo text could be extracted from the PDF."
+        yield dict(self.process_bill_text(extracted_text), event='result', page_count=len(texts))
     
     def extract_dates(self, text):
-        """Extract dates from bill text with improved accuracy and current date fallback"""
-        dates = []
-        found_dates_set = set()  # To avoid duplicates
-        
-        # Prioritized date patterns - YYYY-MM-DD first for better accuracy
-        date_patterns = [
-            r'(?:invoice\s+date|bill\s+date|date)\s*[:]\s*(\d{2}/\d{2}/\d{4})',  # "Invoice Date : DD/MM/YYYY" (highest priority)
-            r'(?:invoice\s+date|bill\s+date|date)\s*[:]\s*([a-zA-Z]+\s+\d{1,2},?\s+\d{4})',  # "Invoice Date: July 26, 2017" format
-            r'(\d{4}-\d{2}-\d{2})',  # YYYY-MM-DD format
-            r'(?:invoice\s+date|bill\s+date|date)[:\s]*(\d{4}-\d{2}-\d{2})',
-            r'(?:invoice\s+date|bill\s+date|date)[:\s]*(\d{1,2}[/-]\d{1,2}[/-]\d{4})',
-            r'(?:invoice\s+date|bill\s+date|date)[:\s]*(\d{1,2}\s+(?:Jan|Feb|Mar|Apr|May|Jun|Jul|Aug|Sep|Oct|Nov|Dec)[a-z]*\s+\d{4})',
-            r'(?:dated)[:\s]*(\d{4}-\d{2}-\d{2})',
-            r'(?:dated)[:\s]*(\d{1,2}[/-]\d{1,2}[/-]\d{4})',
-            r'(\d{1,2}[/-]\d{1,2}[/-]\d{4})',  # General 4-digit year pattern
-            r'(\d{1,2}\s+(?:Jan|Feb|Mar|Apr|May|Jun|Jul|Aug|Sep|Oct|Nov|Dec)[a-z]*\s+\d{4})',  # DD Month YYYY
-            # Add OCR corruption patterns
-            r'(\d{2}/\d{2}/\d{4})',  # DD/MM/YYYY or MM/DD/YYYY
-            r'(00/\d{2}/\d{4})',     # OCR corruption: 00/MM/YYYY
-            # Add more flexible patterns for various receipt formats
-            r'(\d{1,2}/\d{1,2}/\d{4})',  # D/M/YYYY or DD/MM/YYYY or MM/DD/YYYY
-            r'(\d{1,2}-\d{1,2}-\d{4})',  # D-M-YYYY or DD-MM-YYYY or MM-DD-YYYY
-        ]
-        
-        # Look for date keywords
-        date_keywords = ['date:', 'invoice date:', 'bill date:', 'dated:', 'on:']
-        
-        lines = text.split('\n')
-        for line in lines:
-            line_lower = line.lower()
-            
-            # Check if line contains date keywords
-            has_date_keyword = any(keyword in line_lower for keyword in date_keywords)
-            
-            for i, pattern in enumerate(date_patterns):
-                matches = re.findall(pattern, line, re.IGNORECASE)
-                for match in matches:
-                    # Skip if we've already found this date string
-                    if match in found_dates_set:
-                        continue
-                        
-                    try:
-                        # Handle OCR corruptions in dates
-                        cleaned_match = match
-                        
-                        # Fix common OCR date corruptions
-                        if '00/' in cleaned_match:
-                            # If it's 00/MM/YYYY format, assume day is corrupted
-                            if cleaned_match.startswith('00/'):
-                                # Replace 00 with 10 as a reasonable day
-                                cleaned_match = cleaned_match.replace('00/', '10/')
-                                print(f"📅 Fixed OCR day corruption: '{match}' → '{cleaned_match}'")
-                        
-                        # Fix year 2028 to 2020 (common OCR error) - DISABLED FOR DEBUGGING
-                        # if '2028' in cleaned_match:
-                        #     cleaned_match = cleaned_match.replace('2028', '2020')
-                        #     print(f"📅 Fixed OCR year corruption: '{match}' → '{cleaned_match}'")
-                        
-                        # Use the cleaned match for parsing
-                        try:
-                            # Handle ambiguous dates like 9/10/2025 (could be Sep 10 or Oct 9)
-                            if re.match(r'^\d{1,2}/\d{1,2}/\d{4}$', cleaned_match):
-                                # Try both interpretations for ambiguous dates
-                                try:
-                                    # Try DD/MM/YYYY first (European/Indian format)
-                                    parsed_date = datetime.strptime(cleaned_match, '%d/%m/%Y')
-                                except ValueError:
-                                    try:
-                                        # Try MM/DD/YYYY (American format)
-                                        parsed_date = datetime.strptime(cleaned_match, '%m/%d/%Y')
-                                    except ValueError:
-                                        # Fallback to fuzzy parsing
-                                        parsed_date = date_parser.parse(cleaned_match, fuzzy=True)
-                            else:
-                                parsed_date = date_parser.parse(cleaned_match, fuzzy=True)
-                        except:
-                            # Fallback to fuzzy parsing
-                            parsed_date = date_parser.parse(cleaned_match, fuzzy=True)
-                        
-                        # Additional year correction for future dates that are likely OCR errors - DISABLED FOR DEBUGGING
-                        # if parsed_date.year > datetime.now().year + 1:
-                        #     # If it's more than 1 year in the future, it's likely an OCR error
-                        #     corrected_year = parsed_date.year - 8  # 2028 -> 2020
-                        #     parsed_date = parsed_date.replace(year=corrected_year)
-                        #     print(f"📅 Corrected future year: {parsed_date.strftime('%Y-%m-%d')}")
-                        
-                        # Skip dates that are clearly wrong (too far in future or past)
-                        current_year = datetime.now().year
-                        if parsed_date.year < 1990 or parsed_date.year > current_year + 1:
-                            continue
-                        
-                        formatted_date = parsed_date.strftime('%Y-%m-%d')
-                        
-                        # Skip if we already have this formatted date
-                        if formatted_date in [d['date'] for d in dates]:
-                            continue
-                        
-                        # Prefer dates with keywords or recent dates
-                        confidence = 2.0 if has_date_keyword else 1.0
-                        
-                        # HIGHEST confidence for dates right after "Invoice Date :" 
-                        if i == 0:  # First pattern (Invoice Date : DD/MM/YYYY)
-                            confidence += 3.0
-                        elif i == 1:  # Second pattern (YYYY-MM-DD)
-                            confidence += 1.0
-                        
-                        # Boost confidence for recent dates (within last 10 years)
-                        if parsed_date.year >= current_year - 10:
-                            confidence += 0.5
-                        
-                        found_dates_set.add(match)
-                        dates.append({
-                            'date': formatted_date,
-                            'raw_text': match,
-                            'confidence': confidence,
-                            'parsed_date': parsed_date
-                        })
-                        
-                        print(f"📅 Found date: {formatted_date} (confidence: {confidence:.1f}) from '{match}'")
-                        
-                    except (ValueError, TypeError) as e:
-                        print(f"📅 Could not parse date '{match}': {e}")
-                        continue
+        """Extract dates from bill text (or a BillDocument) with improved accuracy and current date fallback"""
+        dates = date_scanner.find_dates(bill_document.parse(text))
         
         # Sort by confidence and return the best date
         dates.sort(key=lambda x: x['confidence'], reverse=True)
-        print(f"📅 All extracted dates: {[d['date'] + f' (conf: {d['confidence']:.1f})' for d in dates]}")
+        summary = [f"{d['date']} (conf: {d['confidence']:.1f})" for d in dates]
+        print(f"📅 All extracted dates: {summary}")
         
         current_date = datetime.now().strftime('%Y-%m-%d')
         
@@ -441,65 +322,35 @@ class BillExtractor:
             print(f"📅 No date found, using current date: {current_date}")
             return current_date
 
-    def is_amount_in_bad_context(self, text, amount_str):
-        """Check if an amount appears in a context that's not a bill total (GSTIN, phone, etc.)"""
-        # Create a pattern to find the amount in context
-        escaped_amount = re.escape(str(amount_str))
-        context_pattern = f'.{{0,50}}{escaped_amount}.{{0,50}}'
-        
-        context_matches = re.findall(context_pattern, text, re.IGNORECASE)
-        for context in context_matches:
-            context_lower = context.lower()
-            # Check for bad contexts
-            bad_indicators = [
-                'gstin', 'gst', 'tax', 'pan', 'cin', 'ph:', 'phone', 'mobile',
-                'email', 'uid:', 'invoice mo', 'invoice no', 'receipt no',
-                'bill no', 'order no', '@', '.com', 'www.', 'http'
-            ]
-            
-            if any(indicator in context_lower for indicator in bad_indicators):
-                print(f"   ⏭️ Skipping amount {amount_str} - found in bad context: {context.strip()}")
-                return True
+    def extract_dated_rows(self, text):
+        """Statement mode: every line of the text that holds a date, with that date"""
+        rows = date_scanner.dated_rows(bill_document.parse(text))
+        print(f"📅 Found {len(rows)} dated rows")
+        return rows
+
+    def is_amount_in_bad_context(self, text, amount_str, context_index=None):
+        """Check if an amount appears in a context that's not a bill total (GSTIN, phone, etc.)
+
+        Pass a ContextIndex built once for the text when checking many amounts.
+        """
+        if context_index is None:
+            context_index = bill_document.ContextIndex(text)
+        context = context_index.bad_context(amount_str)
+        if context is not None:
+            print(f"   ⏭️ Skipping amount {amount_str} - found in bad context: {context.strip()}")
+            return True
         
         return False
 
     def extract_amounts(self, text):
-        """Extract monetary amounts from text with improved pattern matching"""
-        # More comprehensive patterns for Indian currency and general amounts
-        amount_patterns = [
-            # Direct currency patterns
-            r'INR\s*([0-9,]+\.?[0-9]*)',  # INR 47,925.00
-            r'₹\s*([0-9,]+\.?[0-9]*)',    # ₹47,925.00
-            r'Rs\.?\s*([0-9,]+\.?[0-9]*)', # Rs.47,925.00
-            
-            # Context-based patterns (prioritize grand total)
-            r'(?:grand\s+total|final\s+total|payable\s+amount)[:\s]+.*?(?:INR|₹|Rs\.?)\s*([0-9,]+\.?[0-9]*)', 
-            r'(?:grand\s+total|final\s+total|payable\s+amount)[:\s]+([0-9,]+\.?[0-9]*)', 
-            r'(?:total|amount|invoice\s+amount|bill\s+amount|net\s+total)[:\s]+.*?(?:INR|₹|Rs\.?)\s*([0-9,]+\.?[0-9]*)', 
-            r'(?:total|amount|invoice\s+amount|bill\s+amount|net\s+total)[:\s]+([0-9,]+\.?[0-9]*)', 
-            
-            # Line-based patterns with aggressive Grand Total matching
-            r'^.*(?:grand\s+total|final\s+total|payable).*?([0-9,]+\.?[0-9]*).*$',  # Grand total lines (priority)
-            r'^.*grand.*?([0-9]+).*$',  # Any line with "grand" and a number
-            r'^.*(?:total|amount).*?([0-9,]+\.[0-9]{2}).*$',  # Lines containing 'total' or 'amount'
-            r'^.*([0-9,]+\.[0-9]{2}).*(?:INR|₹|Rs|total|amount).*$',  # Amount followed by currency/keywords
-            
-            # General amount patterns (last resort)
-            r'([0-9]{1,2},[0-9]{3}\.[0-9]{2})',  # Format: 12,345.67
-            r'([0-9]{1,3},[0-9]{3})',  # Format: 12,345 (without decimals)
-            r'([0-9]+\.[0-9]{2})(?=\s*(?:INR|₹|Rs|\s*$))', # Amount followed by currency or end of line
-            r'([0-9]{2,4})(?=\s*$)',  # 2-4 digit numbers at end of line (like "70")
-            
-            # Fallback patterns
-            r'\$\s*([0-9,]+\.?[0-9]*)',   # $123.45
-            r'USD\s*([0-9,]+\.?[0-9]*)',  # USD 123.45
-        ]
-        
+        """Extract monetary amounts from text (or a BillDocument) with improved pattern matching"""
+        document = bill_document.parse(text)
+        text = document.text
         amounts = []
         currency_type = "INR"  # Default to INR
         
         # Detect currency type
-        text_upper = text.upper()
+        text_upper = document.upper
         if any(keyword in text_upper for keyword in ['INR', '₹', 'RUPEES', 'RS.']):
             currency_type = "INR"
         elif any(keyword in text_upper for keyword in ['USD', '$', 'DOLLARS']):
@@ -509,7 +360,7 @@ class BillExtractor:
         print(f"📄 Text preview for amount extraction: {text[:500]}")
         
         # Process line by line for better context
-        lines = text.split('\n')
+        lines = document.lines
         for line_num, line in enumerate(lines):
             line_clean = line.strip()
             if not line_clean:
@@ -524,7 +375,7 @@ class BillExtractor:
                 continue
                 
             # Skip lines that look like codes (like "C108", "B11", etc.)
-            if re.match(r'^[A-Z][0-9]{2,4}$', line_clean.strip()):
+            if patterns.AMOUNT_CODE_LINE.match(line_clean.strip()):
                 print(f"   ⏭️ Skipping code line: {line_clean}")
                 continue
                 
@@ -543,8 +394,8 @@ class BillExtractor:
             else:
                 priority = 0  # No keyword context
             
-            for pattern in amount_patterns:
-                matches = re.findall(pattern, line_clean, re.IGNORECASE | re.MULTILINE)
+            for pattern in patterns.AMOUNT_LINE:
+                matches = pattern.findall(line_clean)
                 for match in matches:
                     try:
                         # Clean up the match (remove commas)
@@ -560,13 +411,8 @@ class BillExtractor:
                         continue
         
         # CRITICAL FIX: Handle common OCR corruption patterns (but filter out IDs)
-        ocr_fixes = [
-            (r'f([0-9,]+\s*[0-9]{3}\.?[0-9]*)', r'\1'),  # "f2, 400.06" -> "2, 400.06"
-            (r'([0-9,]+)\s*([0-9]{3})\.([0-9]{2})', r'\1\2.\3'),  # "2, 400.06" -> "2400.06"
-        ]
-        
-        for pattern, replacement in ocr_fixes:
-            fixed_matches = re.findall(pattern, text)
+        for pattern, replacement in patterns.AMOUNT_OCR_FIXES:
+            fixed_matches = pattern.findall(text)
             for match in fixed_matches:
                 try:
                     if isinstance(match, tuple):
@@ -582,40 +428,23 @@ class BillExtractor:
                     continue
         
         # CRITICAL: Add specific pattern for "Three Thousand Four Hundred" = 3400
-        text_amount_patterns = [
-            # Specific pattern for this receipt
-            (r'three\s+thousand\s+four\s+(?:hundred|_wundred)', 3400),
-            (r'three\s+thousand\s+four\s+(?:hundred|wundred)', 3400),
-            # General patterns
-            (r'three\s+thousand\s+(?:and\s+)?four\s+hundred', 3400),
-            (r'four\s+thousand', 4000),
-            (r'five\s+thousand', 5000),
-            (r'two\s+thousand\s+(?:and\s+)?four\s+hundred', 2400),
-        ]
-        
-        for pattern, amount_value in text_amount_patterns:
-            if re.search(pattern, text, re.IGNORECASE):
+        for pattern, amount_value in patterns.AMOUNT_TEXT_VALUES:
+            if pattern.search(text):
                 confidence = 3  # Lower priority than invoice amounts but higher than OCR fixes
-                amounts.append((amount_value, confidence, -1, f"Text amount: {pattern}"))
-                print(f"💰 Found TEXT AMOUNT: {amount_value} (priority: {confidence}) from pattern '{pattern}'")
+                amounts.append((amount_value, confidence, -1, f"Text amount: {pattern.pattern}"))
+                print(f"💰 Found TEXT AMOUNT: {amount_value} (priority: {confidence}) from pattern '{pattern.pattern}'")
         
         # SMART PATTERN: Look for amounts near "total", "amount", "rupees" context
-        smart_amount_patterns = [
-            (r'(?:invoice\s+amount|invoice\s+total|total\s+amount|grand\s+total|final\s+total)\s*[:\-\s]*([0-9,]{3,}(?:\.[0-9]{2})?)', 'invoice amount/total'),  # Highest priority
-            (r'(?:total|amount|rupees|rs\.?|₹)\s*[:\-\s]*([0-9,]{3,}(?:\.[0-9]{2})?)', 'near total/amount'),
-            (r'([0-9,]{3,}(?:\.[0-9]{2})?)\s*(?:only|rupees|rs\.?)', 'followed by rupees/only'),
-            (r'(?:three|four|five)\s+thousand.*?([0-9,]{3,4})', 'words to number context'),
-        ]
-        
-        for pattern, context_name in smart_amount_patterns:
-            matches = re.findall(pattern, text, re.IGNORECASE)
+        context_index = document.context_index  # indicator positions, found once
+        for pattern, context_name in patterns.AMOUNT_SMART:
+            matches = pattern.findall(text)
             for match in matches:
                 try:
                     amount_str = str(match).replace(',', '')
                     amount = float(amount_str)
                     
                     # Check if this amount is in a bad context (GSTIN, phone, etc.)
-                    if not self.is_amount_in_bad_context(text, match):
+                    if not self.is_amount_in_bad_context(text, match, context_index):
                         if 1000 <= amount <= 100000:  # Increased upper limit for business invoices
                             # HIGHEST priority for "Invoice Amount" and "Invoice Total"
                             if context_name == 'invoice amount/total':
@@ -663,13 +492,8 @@ class BillExtractor:
                 return 0
         
         # Check for amount in words patterns
-        amount_words_patterns = [
-            r'amount.*?in.*?words?.*?([a-zA-Z\s_-]+?)(?:\n|$)',
-            r'(?:three|four|five|six|seven|eight|nine|ten).*?(?:thousand|hundred).*?(?:hundred|rupees|only)',
-        ]
-        
-        for pattern in amount_words_patterns:
-            matches = re.findall(pattern, text, re.IGNORECASE | re.MULTILINE)
+        for pattern in patterns.AMOUNT_IN_WORDS:
+            matches = pattern.findall(text)
             for match in matches:
                 amount_from_words = words_to_number(match)
                 if 100 <= amount_from_words <= 100000:  # Reasonable range
@@ -677,16 +501,8 @@ class BillExtractor:
                     amounts.append((amount_from_words, confidence, -1, f"Amount in words: {match}"))
                     print(f"💰 Found amount from words: {amount_from_words} (priority: {confidence}) from '{match.strip()}'")
         
-        # Enhanced total amount patterns with better 3400 detection
-        enhanced_patterns = [
-            r'(?:total|amount).*?([0-9,]{4})[^0-9]',  # Total 3,400 or similar
-            r'([0-9]{4})\s*(?:\.00)?(?:\s*only)?$',  # 3400 or 3400.00 only
-            r'(?:rs|₹)\s*([0-9,]{3,})',  # Rs 3400 or ₹3400
-            r'([0-9]{4})\s*rupees',  # 3400 rupees
-        ]
-        
-        for pattern in enhanced_patterns:
-            matches = re.findall(pattern, text, re.IGNORECASE)
+        for pattern in patterns.AMOUNT_ENHANCED:
+            matches = pattern.findall(text)
             for match in matches:
                 try:
                     amount_str = str(match).replace(',', '')
@@ -714,17 +530,8 @@ class BillExtractor:
             
             if 'grand' in prev_context or 'grand' in line_lower:
                 # Look for standalone numbers or OCR errors
-                standalone_patterns = [
-                    r'^([0-9]{2,3})$',  # Just "70" 
-                    r'^([0-9]{1,2})o+$',  # "7Oo" or "7ooo" (OCR error)
-                    r'^([0-9]{1,2})O+$',  # "7OO" (OCR error)
-                    r'^([0-9]{2,3})\s*$',  # "70 "
-                    r'([0-9]{2,3})\s*$',  # "70" at end of line
-                    r'^.*?([0-9]{2,3})\s*$',  # Any line ending with 2-3 digits
-                ]
-                
-                for pattern in standalone_patterns:
-                    matches = re.findall(pattern, line_clean)
+                for pattern in patterns.AMOUNT_STANDALONE:
+                    matches = pattern.findall(line_clean)
                     for match in matches:
                         try:
                             # Handle OCR errors like "7Oo" -> "70"
@@ -756,34 +563,25 @@ class BillExtractor:
         return unique_amounts, currency_type
     
     def extract_vendor_info(self, text):
-        """Extract vendor/merchant information with enhanced detection"""
-        lines = text.split('\n')
+        """Extract vendor/merchant information from text (or a BillDocument) with enhanced detection"""
+        document = bill_document.parse(text)
+        text, lines = document.text, document.lines
         vendor_candidates = []
         
         print(f"🔍 Extracting vendor from {len(lines)} lines of text...")
         
-        # Look for common vendor patterns
-        vendor_patterns = [
-            r'Supplier[:\s]+(.+)',
-            r'Vendor[:\s]+(.+)', 
-            r'Company[:\s]+(.+)',
-            r'([A-Z][a-z]+ (?:SOFTWARE|LABS|PVT|LTD|INC|CORP|COMPANY|TOOLS|FREIGHT|INDUSTRIES|ENTERPRISES).+)',
-            r'([A-Z][A-Za-z\s]+ (?:Pvt\.?\s*Ltd\.?|Inc\.?|Corp\.?|Tools|Freight))',
-        ]
-        
         # First try regex patterns
-        for pattern in vendor_patterns:
-            matches = re.findall(pattern, text, re.IGNORECASE)
+        for pattern in patterns.VENDOR_LABELS:
+            matches = pattern.findall(text)
             if matches:
                 vendor_candidates.extend(matches)
                 print(f"📋 Pattern match found: {matches}")
         
         # Check first few lines for company names (enhanced)
-        for i, line in enumerate(lines[:8]):  # Check first 8 lines
-            line = line.strip()
+        for i, line in enumerate(document.lines_stripped[:8]):  # Check first 8 lines
             print(f"📄 Line {i}: '{line}'")
             
-            if len(line) > 3 and not re.match(r'^\d+$', line):  # Not just numbers
+            if len(line) > 3 and not patterns.DIGITS_ONLY.match(line):  # Not just numbers
                 
                 # Skip common non-vendor lines
                 if any(skip_word in line.lower() for skip_word in [
@@ -877,395 +675,337 @@ class BillExtractor:
         return "Unknown Vendor"
     
     def extract_items(self, text):
-        """Extract line items from the bill"""
-        lines = text.split('\n')
+        """Extract line items from the bill text (or a BillDocument)"""
+        document = bill_document.parse(text)
         items = []
         
-        for line in lines:
-            line = line.strip()
+        # Skip lines that are likely headers or totals
+        skip_lines = document.lines_with_any(['total', 'subtotal', 'tax', 'receipt', 'thank you'])
+        for line_num, line in enumerate(document.lines_stripped):
             # Look for lines that contain both text and amounts
-            if re.search(r'[a-zA-Z]', line) and re.search(r'\d+\.?\d*', line):
-                # Skip lines that are likely headers or totals
-                if not any(keyword in line.lower() for keyword in ['total', 'subtotal', 'tax', 'receipt', 'thank you']):
-                    items.append(line)
+            if line_num not in skip_lines and patterns.HAS_LETTER.search(line) and patterns.HAS_NUMBER.search(line):
+                items.append(line)
         
         return items
     
+    @staticmethod
+    def _expense_amount(amount):
+        """Amount as a float (missing counts as 0); raises ValueError for anything else"""
+        try:
+            return float(amount or 0)
+        except (TypeError, ValueError):
+            raise ValueError(f"Amount must be a valid number, got {amount!r}")
+    
+    def _category_key(self, description, amount):
+        return (category_cache.normalize(description),
+                category_cache.amount_bucket(amount, self.category_rules.rule_set.large_amount))
+    
     def categorize_expense(self, description, amount):
-        """Enhanced categorization using improved ML model with rule-based fallback"""
+        """Category of an expense, memoized on its normalized description and amount bucket"""
+        description = str(description)
+        amount = self._expense_amount(amount)
+        key = self._category_key(description, amount)
+        category = self.category_cache.get(key)
+        if category is not None:
+            print(f"⚡ Cached category: '{category}' for '{key[0][:50]}...'")
+            return category
+        category, settled = self._categorize_expense(description, amount, key[0])
+        if settled:
+            self.category_cache.put(key, category)
+        return category
+    
+    def categorization_fingerprint(self):
+        """Identifies the loaded model and rules; results categorized under others differ"""
+        return self.model_fingerprint, self.category_rules.digest
+    
+    def reload_categorization_rules(self):
+        """Re-read the rules file and forget the categories cached under the old rules"""
+        stats = self.category_rules.reload()
+        self.category_cache.clear()
+        return stats
+    
+    def _categorize_expense(self, description, amount, description_normalized):
+        """Enhanced categorization using improved ML model with rule-based fallback
+        
+        The rules see the normalized description the category is cached under; the model
+        sees the original, since features such as UpperCaseRatio were trained on it.
+        Returns (category, settled); settled is False when the ML model failed and the
+        rule-based fallback was returned instead, which must not be cached.
+        """
         
         # Always try rule-based categorization first for high confidence cases
-        rule_based_category = self._fallback_categorization(description, amount)
+        rule_based_category = self._fallback_categorization(description_normalized, amount)
         
         # If rule-based found a specific category (not Miscellaneous), use it
         if rule_based_category != 'Miscellaneous':
             print(f"🎯 Rule-based categorization: '{rule_based_category}' for '{description[:50]}...'")
-            return rule_based_category
+            return rule_based_category, True
         
         # Use enhanced ML model if available
         if not self.expense_model:
-            return rule_based_category
+            return rule_based_category, True
         
         try:
             if self.enhanced_features and self.tfidf_vectorizer and self.feature_scaler:
-                # Enhanced prediction with TF-IDF and additional features
                 print(f"🤖 Using enhanced ML model for '{description[:50]}...'")
-                
-                # Clean text
-                def clean_text(text):
-                    text = str(text).lower()
-                    text = re.sub(r'[^\w\s]', ' ', text)
-                    return ' '.join(text.split())
-                
-                description_clean = clean_text(description)
-                
-                # Create enhanced features
-                text_features = self.tfidf_vectorizer.transform([description_clean])
-                
-                # Numeric features (same as training)
-                log_amount = np.log1p(amount)
-                word_count = len(description_clean.split())
-                numeric_features = np.array([[amount, log_amount, word_count]])
-                numeric_scaled = self.feature_scaler.transform(numeric_features)
-                
-                # Combine features
-                from scipy.sparse import hstack
-                X_combined = hstack([text_features, numeric_scaled])
-                
-                # Predict
-                ml_category = self.expense_model.predict(X_combined)[0]
+                ml_category = self._predict_categories([description], [amount])[0]
                 print(f"🤖 Enhanced ML prediction: '{ml_category}'")
-                return ml_category
-                
             else:
-                # Basic ML prediction (original method)
                 print(f"🤖 Using basic ML model for '{description[:50]}...'")
-                data = pd.DataFrame({
-                    'Note': [description],
-                    'Amount': [amount],
-                    'DayOfWeek': [datetime.now().weekday()],
-                    'Month': [datetime.now().month]
-                })
-                
-                ml_category = self.expense_model.predict(data)[0]
+                ml_category = self._predict_categories([description], [amount])[0]
                 print(f"🤖 Basic ML prediction: '{ml_category}'")
-                return ml_category
+            return ml_category, True
             
         except Exception as e:
             print(f"Error in ML categorization: {e}")
-            return rule_based_category
+            return rule_based_category, False
+    
+    def _predict_categories(self, descriptions, amounts):
+        """ML categories for many descriptions, with one model call for all of them"""
+        if self.enhanced_features and self.tfidf_vectorizer and self.feature_scaler:
+            # Enhanced prediction with TF-IDF and additional features
+            
+            if self.feature_builder is not None:
+                # Cleaned text and the numeric columns of train_production_model, in the scaler's order
+                descriptions_clean, numeric_features = self.feature_builder.batch_features(descriptions, amounts)
+            else:
+                # Scalers fitted without column names: amount, log amount and word count
+                def clean_text(text):
+                    text = str(text).lower()
+                    text = patterns.PUNCTUATION.sub(' ', text)
+                    return ' '.join(text.split())
+                
+                descriptions_clean = [clean_text(description) for description in descriptions]
+                amounts = np.asarray(amounts, dtype=float)
+                word_counts = [len(description.split()) for description in descriptions_clean]
+                numeric_features = np.column_stack([amounts, np.log1p(amounts), word_counts])
+            
+            # Create enhanced features
+            text_features = self.tfidf_vectorizer.transform(descriptions_clean)
+            numeric_scaled = self.feature_scaler.transform(numeric_features)
+            
+            # Combine features
+            from scipy.sparse import hstack
+            X_combined = hstack([text_features, numeric_scaled]).tocsr()
+            
+            # Predict: logistic regression first, the full ensemble only where it is unsure
+            predictions, confident = cascade_predict(self.expense_model, X_combined, ML_CASCADE_THRESHOLD)
+            fast = int(confident.sum())
+            self.cascade_counters['fast'] += fast
+            self.cascade_counters['ensemble'] += len(predictions) - fast
+            return self._decode_categories(predictions)
+        
+        # Basic ML prediction (original method)
+        now = datetime.now()
+        data = pd.DataFrame({
+            'Note': list(descriptions),
+            'Amount': list(amounts),
+            'DayOfWeek': now.weekday(),
+            'Month': now.month
+        })
+        return self._decode_categories(self.expense_model.predict(data))
+    
+    def _decode_categories(self, predictions):
+        """Category names for the model's predictions, which are label codes when it was
+        trained by train_production_model"""
+        predictions = np.asarray(predictions)
+        if self.label_encoder is None or predictions.dtype.kind not in 'iu':
+            return [str(category) for category in predictions]
+        if len(predictions) and predictions.max() >= len(self.label_encoder.classes_):
+            raise ValueError(f"Model predicts label {predictions.max()}, but label_encoder.pkl only has "
+                             f"{len(self.label_encoder.classes_)} categories; retrain to refresh both")
+        return [str(category) for category in self.label_encoder.inverse_transform(predictions)]
+    
+    def categorize_expenses(self, expenses):
+        """Categorize many (description, amount) pairs: rules for each, then one ML call for
+        every expense the rules left as Miscellaneous
+        
+        Returns a dict per expense with category, source ('rule', 'model', 'cache' or 'default')
+        and elapsed_ms (the ML call's time is shared out over the expenses it covered).
+        """
+        results = []
+        undecided = []
+        failed = set()  # expenses whose ML call raised, left uncached
+        keys = []
+        first = {}  # key -> index of its first expense; repeats take that one's category
+        expenses = [(str(description), self._expense_amount(amount)) for description, amount in expenses]
+        for index, (description, amount) in enumerate(expenses):
+            start = time.perf_counter()
+            key = self._category_key(description, amount)
+            keys.append(key)
+            if key in first:
+                # What categorize_expense would answer from the cache the first one filled
+                results.append({'category': None, 'source': 'cache', 'rule': None,
+                                'elapsed_ms': (time.perf_counter() - start) * 1000})
+                continue
+            first[key] = index
+            category = self.category_cache.get(key)
+            if category is not None:
+                results.append({'category': category, 'source': 'cache', 'rule': None,
+                                'elapsed_ms': (time.perf_counter() - start) * 1000})
+                continue
+            category, rule, _ = self.category_rules.rule_set.categorize(key[0], amount)
+            results.append({
+                'category': category,
+                'source': 'rule' if category != 'Miscellaneous' else 'default',
+                'rule': rule.name if rule is not None else None,
+                'elapsed_ms': (time.perf_counter() - start) * 1000
+            })
+            if category == 'Miscellaneous':
+                undecided.append(index)
+        
+        if undecided and self.expense_model:
+            start = time.perf_counter()
+            try:
+                categories = self._predict_categories([expenses[i][0] for i in undecided],
+                                                      [expenses[i][1] for i in undecided])
+            except Exception as e:
+                print(f"Error in ML categorization: {e}")
+                categories = None
+                failed.update(undecided)
+            share = (time.perf_counter() - start) * 1000 / len(undecided)
+            for index, category in zip(undecided, categories or ()):
+                results[index].update(category=category, source='model')
+            for index in undecided:
+                results[index]['elapsed_ms'] += share
+        
+        for index, (key, result) in enumerate(zip(keys, results)):
+            if first[key] != index:
+                result['category'] = results[first[key]]['category']
+            elif result['source'] != 'cache' and index not in failed:
+                self.category_cache.put(key, result['category'])
+            result['elapsed_ms'] = round(result['elapsed_ms'], 3)
+        print(f"🏷️ Categorized {len(results)} expenses: "
+              f"{sum(r['source'] == 'rule' for r in results)} by rules, "
+              f"{sum(r['source'] == 'model' for r in results)} by the ML model, "
+              f"{sum(r['source'] == 'cache' for r in results)} from the cache")
+        return results
     
     def _fallback_categorization(self, description, amount):
-        """Enhanced rule-based categorization with comprehensive keyword matching"""
-        import re  # Import at the top of the function
+        """Rule-based categorization with the keyword rules of categorization_rules.json"""
         description_lower = description.lower()
         print(f"🔍 Rule-based categorization for: '{description_lower[:100]}...'")
         
-        # Maintenance & Repair (check first for specificity)
-        # Use regex/word-boundary checks and include common phrases to reduce false positives
-        maintenance_patterns = [
-            r"\bmaintenance\b",
-            r"\brepair\b",
-            r"\brepairs\b",
-            r"\bservic(?:e|ing)\b",
-            r"\bservicing\b",
-            r"\bworkshop\b",
-            r"\bgarage\b",
-            r"\bmechanic\b",
-            r"\binstallation\b",
-            r"\binstallation/repair\b",
-            r"\binstallations?\b",
-            r"\bengine repair\b",
-            r"\bac repair\b",
-            r"\bvehicle repair\b",
-            r"\bcar service\b",
-            r"\bauto service\b",
-            r"\bplumber\b",
-            r"\belectrician\b",
-            r"\btune[- ]?up\b",
-            r"\binspection\b",
-            r"\boverhaul\b",
-            r"\breplacement\b",
-            r"\brefurbish\b",
-            r"\brefurbishment\b",
-        ]
-
-        for pat in maintenance_patterns:
-            if re.search(pat, description_lower):
-                return 'Maintenance'
-        
-        # � Electronics & Technology Shopping (CHECK FIRST - highest priority)
-        electronics_stores = [
-            'poorvika', 'croma', 'reliance digital', 'vijay sales', 'samsung', 'apple store',
-            'mi store', 'oneplus', 'oppo', 'vivo', 'realme', 'nokia', 'lg', 'sony',
-            'dell', 'hp', 'lenovo', 'asus', 'acer', 'flipkart', 'amazon', 'snapdeal'
-        ]
-        
-        electronics_items = [
-            'mobile', 'phone', 'smartphone', 'tablet', 'laptop', 'computer', 'pc',
-            'headphone', 'earphone', 'speaker', 'charger', 'adapter', 'power adapter',
-            'cable', 'usb', 'bluetooth', 'smartwatch', 'tv', 'television', 'monitor',
-            'keyboard', 'mouse', 'webcam', 'camera', 'hard drive', 'ssd', 'memory card',
-            'processor', 'graphics card', 'motherboard', 'electronics', 'gadget',
-            'accessory', 'case', 'cover', 'screen guard', 'tempered glass'
-        ]
-        
-        # Check for electronics stores (highest priority)
-        for store in electronics_stores:
-            if store in description_lower:
-                print(f"📱 Electronics store matched: '{store}'")
-                return 'Shopping'
-        
-        # Check for electronics items
-        for item in electronics_items:
-            if item in description_lower:
-                print(f"🔌 Electronics item matched: '{item}'")
-                return 'Shopping'
-        
-        # Technology brands and models
-        tech_patterns = [
-            r'\bsamsung\b', r'\bapple\b', r'\biphone\b', r'\bipad\b', r'\bmacbook\b',
-            r'\boneplus\b', r'\bxiaomi\b', r'\bmi\s+\d+\b', r'\brealme\b', r'\boppo\b',
-            r'\bvivo\b', r'\bnokia\b', r'\bmoto\b', r'\blg\b', r'\bsony\b',
-            r'\bt\d+\w*\b', r'\bep\s+\w+\b', r'\bmodel\s+\w+\d+\b'
-        ]
-        
-        for pattern in tech_patterns:
-            if re.search(pattern, description_lower):
-                print(f"📱 Tech pattern matched: '{pattern}'")
-                return 'Shopping'
-        
-        # �🔧 Tools & Equipment (check FIRST for specificity)
-        tool_keywords = [
-            # Specific tools
-            'hammer', 'saw', 'drill', 'screwdriver', 'wrench', 'pliers', 'chisel', 'file',
-            'measuring tape', 'level', 'square', 'caliper', 'micrometer', 'gauge',
-            'socket', 'spanner', 'ratchet', 'torque', 'clamp', 'vise',
-            
-            # Tool brands
-            'stanley', 'bosch', 'makita', 'dewalt', 'craftsman', 'milwaukee', 'ridgid',
-            'black & decker', 'worx', 'ryobi', 'porter cable', 'festool',
-            
-            # Tool categories
-            'precision tool', 'cutting tool', 'measuring tool', 'hand tool', 'power tool',
-            'workshop tool', 'mechanics tool', 'carpentry tool', 'electrical tool',
-            
-            # Equipment & machinery
-            'equipment', 'machinery', 'apparatus', 'device', 'instrument', 'component',
-            'spare part', 'replacement part', 'toolbox', 'tool kit', 'tool set'
-        ]
-        
-        # Count tool keywords
-        tool_count = sum(1 for word in tool_keywords if word in description_lower)
-        
-        # Strong tool indicators
-        if (tool_count >= 2 or 
-            any(brand in description_lower for brand in ['stanley', 'bosch', 'makita', 'dewalt', 'craftsman']) or
-            any(specific_tool in description_lower for specific_tool in ['automatic saw', 'claw hammer', 'precision', 'manufacturing']) or
-            ('tool' in description_lower and any(word in description_lower for word in ['precision', 'manufacturing', 'workshop', 'industrial']))
-        ):
-            return 'Tools'
-        
-        # Business Services & Industrial (after tools check)
-        if any(word in description_lower for word in [
-            # Software & Technology Services
-            'software labs', 'software', 'tech', 'technology', 'it services', 'cloudzen',
-            'development', 'programming', 'coding', 'web services', 'app development',
-            
-            # Business Services (not tools)
-            'business service', 'office', 'consulting', 'professional service',
-            'legal service', 'accounting', 'audit', 'tax preparation', 'financial services',
-            
-            # Construction Services (not tools)
-            'construction service', 'contractor', 'renovation service', 'installation service',
-            
-            # Investment & Finance
-            'maturity', 'investment', 'finance', 'policy', 'insurance', 'mutual fund', 'stocks',
-            'bonds', 'portfolio', 'banking', 'loan', 'credit', 'mortgage'
-        ]):
-            return 'Business Services'
-        
-        # Food & Dining (prioritize food items - check before bills)
-        food_keywords = [
-            # Restaurant dishes & specific foods
-            'chicken', 'fish', 'mutton', 'beef', 'pork', 'paneer', 'dal', 'curry', 'biryani',
-            'naan', 'roti', 'paratha', 'rice', 'pasta', 'pizza', 'burger', 'sandwich', 'salad',
-            'soup', 'starter', 'dessert', 'ice cream', 'cake', 'coffee', 'tea', 'juice',
-            'angara', 'masala', 'tandoori', 'gravy', 'fried', 'grilled', 'roasted',
-            
-            # General food terms
-            'restaurant', 'food', 'cafe', 'dining', 'kitchen', 'meal', 'breakfast', 'lunch', 
-            'dinner', 'snack', 'beverage', 'drink', 'bakery', 'deli', 'catering',
-            'grocery', 'supermarket', 'walmart', 'target'
-        ]
-        
-        # Count food keywords
-        food_count = sum(1 for word in food_keywords if word in description_lower)
-        
-        # If we have multiple food keywords or specific dish names, it's definitely food
-        if food_count >= 2 or any(dish in description_lower for dish in [
-            'chicken', 'biryani', 'curry', 'naan', 'roti', 'paratha', 'angara', 'masala', 
-            'tandoori', 'paneer', 'dal', 'rice', 'pasta', 'pizza', 'burger'
-        ]):
-            return 'Food & Dining'
-        
-        # Single food keyword with restaurant context
-        if food_count >= 1 and any(context in description_lower for context in [
-            'restaurant', 'cafe', 'dining', 'kitchen', 'meal', 'menu', 'order'
-        ]):
-            return 'Food & Dining'
-        
-        # Shopping & Retail (prioritize specific brands and clothing terms - CHECK FIRST)
-        clothing_brands = [
-            'allen solly', 'aditya birla', 'lifestyle brands', 'raymond', 'arrow', 'van heusen',
-            'louis philippe', 'peter england', 'zara', 'h&m', 'uniqlo', 'levis', 'nike', 'adidas',
-            'puma', 'reebok', 'woodland', 'bata', 'liberty', 'metro brands'
-        ]
-        
-        clothing_items = [
-            'shirt', 'trouser', 'trousers', 'pant', 'pants', 'duffel bag', 'bag', 'clothing',
-            'apparel', 'wear', 'dress', 'skirt', 'jacket', 'blazer', 'suit', 'tie', 'belt',
-            'shoes', 'sandal', 'sneaker', 'formal', 'casual', 'sleeve', 'collar', 'hanky',
-            'socks', 'ankle length', 'half sleeve', 'flat front'
-        ]
-        
-        # Check for clothing brands first (highest priority)
-        for brand in clothing_brands:
-            if brand in description_lower:
-                print(f"👗 Clothing brand matched: '{brand}'")
-                return 'Shopping'
-        
-        # Check for clothing items
-        for item in clothing_items:
-            if item in description_lower:
-                print(f"👕 Clothing item matched: '{item}'")
-                return 'Shopping'
-        
-        # General shopping keywords
-        if any(word in description_lower for word in [
-            'store', 'shop', 'mall', 'amazon', 'retail', 'purchase',
-            'buy', 'shopping', 'clothes', 'electronics', 'cosmetics', 'jewelry', 'accessories'
-        ]):
-            return 'Shopping'
-
-        # Transportation (be more specific to avoid conflicts)
-        transportation_specific = [
-            'uber ride', 'uber trip', 'ola ride', 'ola cab', 'taxi fare', 'cab fare', 
-            'bus ticket', 'train ticket', 'metro ticket', 'metro card',
-            'parking fee', 'toll plaza', 'fuel station', 'petrol pump', 'gas station',
-            'auto rickshaw', 'rickshaw fare', 'transport service', 'travel agency', 
-            'journey fare', 'ride booking', 'trip fare', 'flight booking', 'airline ticket', 
-            'airport taxi'
-        ]
-        
-        # Standalone transport words (more specific patterns)
-        transport_patterns = [
-            'uber', 'lyft', 'grab'  # Only exact ride service names
-        ]
-        
-        # Specific fuel-related keywords
-        fuel_keywords = [
-            'petrol', 'diesel', 'cng', 'fuel pump', 'gasoline', 'bp petrol', 'hp petrol',
-            'indian oil', 'bharat petroleum', 'hindustan petroleum', 'fuel station'
-        ]
-        
-        # Vehicle-related (be specific)
-        vehicle_keywords = [
-            'car service', 'vehicle maintenance', 'auto repair', 'garage', 'mechanic'
-        ]
-        
-        # Check for specific transportation services
-        for transport in transportation_specific:
-            if transport in description_lower:
-                print(f"🚗 Transportation keyword matched: '{transport}'")
-                return 'Transportation'
+        # One pass over the description finds every rule keyword; the first rule that holds wins
+        category, rule, matched = self.category_rules.rule_set.categorize(description_lower, amount)
+        if rule is not None and rule.message:
+            print(rule.message.format(match=matched))
+        return category
+    
+    @staticmethod
+    def decode_base64_image(image_data):
+        """Decode a base64 image string, with or without a data URL prefix"""
+        # Remove data URL prefix if present
+        if image_data.startswith('data:image'):
+            image_data = image_data.split(',')[1]
+        
+        return base64.b64decode(image_data)
+    
+    def select_total_amount(self, document, amounts):
+        """Total of a bill: the highest priority extracted amount, else the largest plausible number"""
+        total_amount = 0.0
+        if amounts:
+            # If we have multiple amounts, use the first one (highest priority from extraction)
+            total_amount = amounts[0]  # First amount has highest priority (grand total if found)
+            print(f"💰 Selected amount: {total_amount} (from {len(amounts)} found amounts: {amounts})")
+        
+        # If no amount was extracted, try a more aggressive search
+        if total_amount == 0.0:
+            print("⚠️ No amount found, trying aggressive extraction...")
+            # Look for any number that looks like money
+            for pattern in patterns.AMOUNT_FALLBACK:
+                matches = pattern.findall(document.text)
+                fallback_amounts = []
+                for match in matches:
+                    try:
+                        amount = float(match)
+                        if 10 <= amount <= 100000:  # Reasonable range
+                            fallback_amounts.append(amount)
+                    except ValueError:
+                        continue
                 
-        # Check for exact transport service names with word boundaries
-        for pattern in transport_patterns:
-            if re.search(r'\b' + pattern + r'\b', description_lower):
-                print(f"🚗 Transportation pattern matched: '{pattern}'")
-                return 'Transportation'
-        
-        # Check for fuel-related transactions
-        for fuel in fuel_keywords:
-            if fuel in description_lower:
-                print(f"⛽ Fuel keyword matched: '{fuel}'")
-                return 'Transportation'
-            
-        # Check for vehicle services
-        for vehicle in vehicle_keywords:
-            if vehicle in description_lower:
-                print(f"🔧 Vehicle keyword matched: '{vehicle}'")
-                return 'Transportation'
-        
-        # Entertainment
-        if any(word in description_lower for word in [
-            'movie', 'theater', 'entertainment', 'game', 'netflix', 'cinema', 'concert',
-            'show', 'event', 'amusement', 'park', 'sports', 'hobby', 'music', 'book'
-        ]):
-            return 'Entertainment'
-        
-        # Bills & Utilities (be more specific to avoid restaurant bills)
-        utility_keywords = [
-            'electric bill', 'electricity bill', 'power bill', 'energy bill',
-            'water bill', 'gas bill', 'internet bill', 'phone bill', 'mobile bill',
-            'utility bill', 'broadband bill', 'cable bill', 'subscription',
-            'electricity', 'water utility', 'internet', 'broadband', 'cable', 
-            'mobile plan', 'phone plan', 'power', 'energy'
-        ]
-        
-        # Only classify as Bills & Utilities if we have specific utility terms
-        # and NOT food context
-        if any(keyword in description_lower for keyword in utility_keywords):
-            # Double check it's not a restaurant bill
-            if not any(food_word in description_lower for food_word in [
-                'chicken', 'food', 'restaurant', 'dining', 'meal', 'naan', 'curry', 'rice'
-            ]):
-                return 'Bills & Utilities'
-        
-        # Healthcare
-        if any(word in description_lower for word in [
-            'hospital', 'doctor', 'pharmacy', 'medical', 'health', 'clinic', 'medicine',
-            'treatment', 'checkup', 'surgery', 'dental', 'optical', 'lab test', 'prescription'
-        ]):
-            return 'Healthcare'
-        
-        # Education
-        if any(word in description_lower for word in [
-            'school', 'college', 'university', 'education', 'tuition', 'course', 'training',
-            'book', 'study', 'exam', 'certification', 'workshop', 'seminar', 'library'
-        ]):
-            return 'Education'
-        
-        # Default category based on amount and context
-        if amount > 10000:
-            return 'Business Services'  # Large amounts likely business-related
-        else:
-            return 'Miscellaneous'
+                if fallback_amounts:
+                    total_amount = max(fallback_amounts)
+                    print(f"🎯 Fallback amount found: {total_amount}")
+                    break
+        return total_amount
+    
+    def analyze_document(self, document):
+        """Fields of a BillDocument shared by the image and text pipelines: vendor, amounts,
+        currency, total_amount, date and items"""
+        print("🏢 Extracting vendor...")
+        vendor = self.extract_vendor_info(document)
+        
+        print("💰 Extracting amounts...")
+        amounts, currency = self.extract_amounts(document)
+        print(f"💰 Amounts found: {amounts}")
+        print(f"💱 Currency detected: {currency}")
+        
+        print("📅 Extracting dates...")
+        bill_date = self.extract_dates(document)
+        
+        print("📋 Extracting items...")
+        items = self.extract_items(document)
+        
+        return {
+            'vendor': vendor,
+            'amounts': amounts,
+            'currency': currency,
+            'total_amount': self.select_total_amount(document, amounts),
+            'date': bill_date,
+            'items': items
+        }
     
-    def process_bill(self, image_data):
+    def process_bill(self, image_data, profile=None):
         """Main function to process bill and extract all information"""
         try:
             print("🔍 Starting bill processing...")
             
-            # Convert base64 to image if needed
+            # Convert base64 or raw bytes to image if needed
             if isinstance(image_data, str):
-                # Remove data URL prefix if present
-                if image_data.startswith('data:image'):
-                    image_data = image_data.split(',')[1]
-                
-                # Decode base64
-                image_bytes = base64.b64decode(image_data)
-                image = Image.open(io.BytesIO(image_bytes))
-                image = np.array(image)
+                image_data = self.decode_base64_image(image_data)
+            if isinstance(image_data, (bytes, bytearray, memoryview)):
+                # One decode straight to grayscale, downsampled while decoding when very large
+                image, reduction = preprocessing.decode_image(image_data)
+                if reduction > 1:
+                    print(f"🔽 Decoded at 1/{reduction} resolution")
             else:
                 image = image_data
             
             print(f"📊 Image shape: {image.shape}")
             
+            # Cheap triage before any OCR: hopeless images are rejected, borderline ones enhanced
+            preprocessing_stats = {}
+            quality = None
+            if preprocessing.QUALITY_GATE:
+                quality = preprocessing.assess_quality(preprocessing.to_grayscale(image))
+                preprocessing_stats['quality'] = quality
+                print(f"🩺 Image quality: {quality['verdict']} ({quality['reason'] or 'readable'}, "
+                      f"contrast {quality['contrast']}, sharpness {quality['sharpness']}, "
+                      f"{quality['text_components']} glyphs, {quality['elapsed_ms']}ms)")
+                
+                if quality['verdict'] == 'reject':
+                    return {
+                        'success': True,
+                        'manual_entry_required': True,
+                        'rejected': True,
+                        'reject_reason': quality['reason'],
+                        'extracted_text': '',
+                        'vendor': 'Unknown Vendor',
+                        'amount': 0.0,
+                        'currency': 'INR',
+                        'date': datetime.now().strftime('%Y-%m-%d'),
+                        'items': [],
+                        'category': 'Other',
+                        'confidence': 0.0,
+                        'message': preprocessing.QUALITY_REJECT_MESSAGES[quality['reason']],
+                        'preprocessing': preprocessing_stats
+                    }
+            
             # Extract text from image
             print("📄 Extracting text with OCR...")
-            extracted_text = self.extract_text_from_image(image)
+            extracted_text = self.extract_text_from_image(image, stats=preprocessing_stats, profile=profile,
+                                                          enhance=quality is not None and quality['verdict'] == 'enhance')
             
             if not extracted_text or extracted_text.startswith("OCR Error"):
                 return {
@@ -1292,78 +1032,30 @@ class BillExtractor:
             
             print(f"📝 Extracted text preview: {extracted_text[:200]}...")
             
-            # Extract various components
-            print("💰 Extracting amounts...")
-            amounts, currency = self.extract_amounts(extracted_text)
-            
-            print("📅 Extracting dates...")
-            bill_date = self.extract_dates(extracted_text)
-            
-            print("🏢 Extracting vendor...")
-            vendor = self.extract_vendor_info(extracted_text)
-            
-            print("📋 Extracting items...")
-            items = self.extract_items(extracted_text)
+            document = bill_document.parse(extracted_text)
+            fields = self.analyze_document(document)
+            vendor, currency, bill_date, items = fields['vendor'], fields['currency'], fields['date'], fields['items']
+            total_amount = fields['total_amount']
             
-            # Determine total amount (prioritize grand total over max amount)
-            total_amount = 0.0
-            if amounts:
-                # If we have multiple amounts, use the first one (highest priority from extraction)
-                total_amount = amounts[0]  # First amount has highest priority (grand total if found)
-                print(f"💰 Selected amount: {total_amount} (from {len(amounts)} found amounts: {amounts})")
-            
-            # If no amount was extracted, try a more aggressive search
+            # If still no amount, ask for manual entry
             if total_amount == 0.0:
-                print("⚠️ No amount found, trying aggressive extraction...")
-                # Look for any number that looks like money
-                fallback_patterns = [
-                    r'([0-9]{1,6}\.[0-9]{2})',  # Any decimal number like 123.45
-                    r'([0-9]{1,6})',  # Any whole number
-                ]
-                
-                for pattern in fallback_patterns:
-                    matches = re.findall(pattern, extracted_text)
-                    fallback_amounts = []
-                    for match in matches:
-                        try:
-                            amount = float(match)
-                            if 10 <= amount <= 100000:  # Reasonable range
-                                fallback_amounts.append(amount)
-                        except ValueError:
-                            continue
-                    
-                    if fallback_amounts:
-                        total_amount = max(fallback_amounts)
-                        print(f"🎯 Fallback amount found: {total_amount}")
-                        break
-                
-                # If still no amount, ask for manual entry
-                if total_amount == 0.0:
-                    print("❌ Could not extract amount, manual entry required")
-                    return {
-                        'success': True,
-                        'manual_entry_required': True,
-                        'extracted_text': extracted_text,
-                        'vendor': vendor or 'Unknown Vendor',
-                        'amount': 0.0,
-                        'currency': currency,
-                        'date': bill_date,
-                        'items': items,
-                        'category': 'Other',
-                        'confidence': 0.2,
-                        'message': 'Could not extract amount from bill. Please enter manually.'
-                    }
+                print("❌ Could not extract amount, manual entry required")
+                return {
+                    'success': True,
+                    'manual_entry_required': True,
+                    'extracted_text': extracted_text,
+                    'vendor': vendor or 'Unknown Vendor',
+                    'amount': 0.0,
+                    'currency': currency,
+                    'date': bill_date,
+                    'items': items,
+                    'category': 'Other',
+                    'confidence': 0.2,
+                    'message': 'Could not extract amount from bill. Please enter manually.'
+                }
             
             print(f"💵 Total amount determined: {currency} {total_amount}")
             
-            # Format the amount with proper currency symbol
-            if currency == "INR":
-                formatted_amount = f"₹{total_amount:,.2f}"
-            elif currency == "USD":
-                formatted_amount = f"${total_amount:,.2f}"
-            else:
-                formatted_amount = f"{total_amount:,.2f}"
-            
             # Categorize the expense
             print("🏷️ Categorizing expense...")
             
@@ -1381,16 +1073,8 @@ class BillExtractor:
             
             # Add food-related keywords from extracted text
             food_keywords_in_text = []
-            food_patterns = [
-                r'\b(chicken|mutton|fish|beef|pork|paneer)\b',
-                r'\b(biryani|curry|naan|roti|paratha|rice)\b', 
-                r'\b(pizza|burger|sandwich|pasta)\b',
-                r'\b(restaurant|cafe|dining|food|meal)\b',
-                r'\b(angara|masala|tandoori|gravy|fried)\b'
-            ]
-            
-            for pattern in food_patterns:
-                matches = re.findall(pattern, extracted_text.lower())
+            for pattern in patterns.FOOD_KEYWORDS:
+                matches = pattern.findall(document.lower)
                 food_keywords_in_text.extend(matches)
             
             # Add found food keywords
@@ -1416,7 +1100,8 @@ class BillExtractor:
                 'date': bill_date,
                 'items': items,
                 'category': category,
-                'confidence': 0.8
+                'confidence': 0.8,
+                'preprocessing': preprocessing_stats
             }
             
             print("✅ Bill processing completed successfully!")
@@ -1446,73 +1131,28 @@ class BillExtractor:
                     'extracted_text': extracted_text
                 }
             
-            # Extract vendor information
-            print("🏪 Extracting vendor information...")
-            vendor = self.extract_vendor_info(extracted_text)
-            
-            # Extract amounts
-            print("💰 Extracting amounts...")
-            amounts, extracted_currency = self.extract_amounts(extracted_text)
-            print(f"💰 Amounts found: {amounts}")
-            print(f"💱 Currency detected: {extracted_currency}")
-            
             # Debug: Show the extracted text for analysis
             print(f"📝 Full extracted text for debugging:")
             print(f"'{extracted_text}'")
             print(f"📝 Text length: {len(extracted_text)} characters")
             
-            # Determine total amount (prioritize grand total over max amount)
-            total_amount = 0.0
-            if amounts:
-                # If we have multiple amounts, use the first one (highest priority from extraction)
-                total_amount = amounts[0]  # First amount has highest priority (grand total if found)
-                print(f"💰 Selected amount: {total_amount} (from {len(amounts)} found amounts: {amounts})")
+            document = bill_document.parse(extracted_text)
+            fields = self.analyze_document(document)
+            vendor, bill_date, items = fields['vendor'], fields['date'], fields['items']
+            total_amount = fields['total_amount']
             
-            # If no amount was extracted, try a more aggressive search
+            # If still no amount, ask for manual entry
             if total_amount == 0.0:
-                print("⚠️ No amount found, trying aggressive extraction...")
-                # Look for any number that looks like money
-                fallback_patterns = [
-                    r'([0-9]{1,6}\.[0-9]{2})',  # Any decimal number like 123.45
-                    r'([0-9]{1,6})',  # Any whole number
-                ]
-                
-                for pattern in fallback_patterns:
-                    matches = re.findall(pattern, extracted_text)
-                    fallback_amounts = []
-                    for match in matches:
-                        try:
-                            amount = float(match)
-                            if 10 <= amount <= 100000:  # Reasonable range
-                                fallback_amounts.append(amount)
-                        except ValueError:
-                            continue
-                    
-                    if fallback_amounts:
-                        total_amount = max(fallback_amounts)
-                        print(f"🎯 Fallback amount found: {total_amount}")
-                        break
-                
-                # If still no amount, ask for manual entry
-                if total_amount == 0.0:
-                    print("❌ Could not extract amount, manual entry required")
-                    return {
-                        'success': True,
-                        'manual_entry_required': True,
-                        'message': 'Could not extract amount from text',
-                        'extracted_text': extracted_text
-                    }
-            
-            # Extract dates with current date fallback
-            print("📅 Extracting dates...")
-            bill_date = self.extract_dates(extracted_text)
-            
-            # Extract items
-            print("📋 Extracting items...")
-            items = self.extract_items(extracted_text)
+                print("❌ Could not extract amount, manual entry required")
+                return {
+                    'success': True,
+                    'manual_entry_required': True,
+                    'message': 'Could not extract amount from text',
+                    'extracted_text': extracted_text
+                }
             
             # Determine currency
-            currency = extracted_currency if extracted_currency else 'INR'  # Use extracted currency or default to INR
+            currency = fields['currency'] or 'INR'  # Use extracted currency or default to INR
             if any(symbol in extracted_text for symbol in ['$', 'USD', 'Dollar']):
                 currency = 'USD'
             
@@ -1523,14 +1163,6 @@ class BillExtractor:
             category = self.categorize_expense(categorization_text, total_amount)
             print(f"🏷️ Final category: {category}")
             
-            # Format amount display
-            if currency == "INR":
-                formatted_amount = f"₹{total_amount:,.2f}"
-            elif currency == "USD":
-                formatted_amount = f"${total_amount:,.2f}"
-            else:
-                formatted_amount = f"{total_amount:,.2f}"
-            
             # Prepare result
             result = {
                 'success': True,
@@ -1558,54 +1190,293 @@ class BillExtractor:
 
 # Initialize the bill extractor
 bill_extractor = BillExtractor()
+# Fork the OCR workers now, while this is the only thread: forking once request and job
+# threads run would copy whatever locks they hold into every worker
+bill_extractor.ocr.start()
+
+# Results of earlier uploads, keyed on the uploaded content
+result_cache = ResultCache()
+
+def pipeline_variant(file_type, profile):
+    """Settings that change the extraction result and so belong in the cache key"""
+    return (file_type, sorted(profile.items()), preprocessing.DECODE_MIN_PIXELS,
+            bill_extractor.categorization_fingerprint())
+
+def cached_result(content, file_type, compute, profile=None):
+    """Return the cached result for this content or compute and store it"""
+    profile = profile or ocr_profiles.get_profile()
+    cache_key = result_cache.make_key(content, *pipeline_variant(file_type, profile))
+    result = result_cache.get(cache_key)
+    if result is not None:
+        print(f"⚡ Result cache hit ({file_type}, key {cache_key[:12]})")
+        # The stored date may be the current-date fallback of the day it was extracted
+        if result.get('extracted_text'):
+            result['date'] = bill_extractor.extract_dates(result['extracted_text'])
+        result['cached'] = True
+        return result
+    
+    result = compute()
+    # Only cache real extractions; manual entry may be caused by a missing OCR install
+    if result.get('success') and not result.get('manual_entry_required'):
+        result_cache.put(cache_key, result)
+    result['cached'] = False
+    return result
+
+def read_upload():
+    """Return (file_type, filename, content) for the uploaded bill, or an error response
+
+    Image content is bytes; PDF content is a named temporary file that is never read whole.
+    """
+    # Check for PDF file
+    if 'pdf' in request.files:
+        file = request.files['pdf']
+        if file.filename == '':
+            return None, (jsonify({'error': 'No PDF file selected'}), 400)
+        # Already on disk in a named file (UploadRequest)
+        return ('pdf', file.filename, file.stream), None
+    
+    # Check for image file
+    if 'image' in request.files:
+        # Handle file upload
+        file = request.files['image']
+        return ('image', file.filename, uploads.read_limited(file.stream, uploads.MAX_IMAGE_BYTES)), None
+    
+    # Raw binary body: the bytes are decoded as-is, no base64 or multipart wrapping
+    if request.mimetype == 'application/pdf':
+        return ('pdf', request.args.get('filename', 'uploaded.pdf'), uploads.spool_pdf(request.stream)), None
+    if request.mimetype.startswith('image/') or request.mimetype == 'application/octet-stream':
+        head = request.stream.read(5)
+        if head == b'%PDF-':
+            return ('pdf', request.args.get('filename', 'uploaded.pdf'), uploads.spool_pdf(request.stream, head=head)), None
+        body = uploads.spool(request.stream, head=head)
+        content = uploads.read_limited(body, uploads.MAX_IMAGE_BYTES)
+        return ('image', request.args.get('filename', 'uploaded_image'), content), None
+    
+    data = request.get_json(silent=True) or {}
+    if 'image_data' in data:
+        # Handle base64 image data
+        content = bill_extractor.decode_base64_image(data['image_data'])
+        if len(content) > uploads.MAX_IMAGE_BYTES:
+            raise uploads.UploadTooLargeError(f'Image exceeds {uploads.MAX_IMAGE_BYTES // uploads.MB} MB')
+        return ('image', 'uploaded_image', content), None
+    
+    return None, (jsonify({'error': 'No image or PDF file provided'}), 400)
+
+def requested_profile():
+    """OCR profile named by the request (query, form or JSON `profile`), else the deployment default"""
+    name = request.args.get('profile') or request.form.get('profile')
+    if not name:
+        name = (request.get_json(silent=True) or {}).get('profile')
+    return ocr_profiles.get_profile(name)
+
+def process_upload(file_type, filename, content, progress=None, profile=None):
+    """Run an uploaded bill through BillExtractor, using the result cache
+
+    content is bytes, or for PDFs also a seekable file object.
+    """
+    progress = progress or (lambda stage, fraction: None)
+    profile = profile or ocr_profiles.get_profile()
+    
+    if file_type == 'pdf':
+        pdf_file = io.BytesIO(content) if isinstance(content, bytes) else content
+        
+        def compute():
+            # Extract text from PDF and process it
+            progress('extracting_text', 0.05)
+            extracted_text = bill_extractor.extract_text_from_pdf(
+                pdf_file,
+                progress=lambda done, total: progress('pages', 0.05 + 0.85 * done / max(total, 1)),
+                profile=profile
+            )
+            progress('analyzing', 0.9)
+            return bill_extractor.process_bill_text(extracted_text)
+    else:
+        # Refuse oversized images and decompression bombs before decoding
+        if len(content) > uploads.MAX_IMAGE_BYTES:
+            raise uploads.UploadTooLargeError(f'Image exceeds {uploads.MAX_IMAGE_BYTES // uploads.MB} MB')
+        size = preprocessing.image_size(content)
+        if size:
+            uploads.check_image_pixels(*size)
+        
+        def compute():
+            # Process the bill image
+            progress('ocr', 0.1)
+            return bill_extractor.process_bill(content, profile=profile)
+    
+    result = cached_result(content, file_type, compute, profile)
+    result['file_type'] = file_type
+    result['filename'] = filename
+    result['ocr_profile'] = profile['name']
+    return result
+
+def run_job(job, payload, progress):
+    """Job queue handler: payload is the stored upload as an open file"""
+    content = payload if job['file_type'] == 'pdf' else payload.read()
+    return process_upload(job['file_type'], job['filename'], content, progress,
+                          ocr_profiles.get_profile(job['options'].get('profile')))
+
+# Background processing for async uploads
+job_queue = JobQueue(run_job)
+
+@app.before_request
+def start_job_queue():
+    # Started on the first request so the debug reloader's parent never runs jobs
+    job_queue.start()
+
+def stream_events(events, fmt):
+    """Serialize events as NDJSON lines or server-sent events"""
+    for event in events:
+        data = json.dumps(event, default=str)
+        if fmt == 'sse':
+            yield f"event: {event.get('event', 'message')}\ndata: {data}\n\n"
+        else:
+            yield data + "\n"
+
+def stream_bill(fmt, profile):
+    """Streaming mode of /api/process-bill: per-page events for PDFs, one result event for images"""
+    if 'pdf' in request.files:
+        file = request.files['pdf']
+        pdf_source, filename = file.stream, file.filename
+    elif request.mimetype == 'application/pdf':
+        # Spooled to a temporary file straight from the request stream
+        pdf_source, filename = request.stream, request.args.get('filename', 'uploaded.pdf')
+    else:
+        pdf_source = None
+        upload, error = read_upload()
+        if error:
+            return error
+        file_type, filename, content = upload
+    
+    def generate():
+        try:
+            if pdf_source is not None:
+                for event in bill_extractor.stream_pdf(pdf_source, profile=profile):
+                    yield dict(event, file_type='pdf', filename=filename, ocr_profile=profile['name'])
+            else:
+                yield dict(process_upload(file_type, filename, content, profile=profile), event='result')
+        except Exception as e:
+            yield {'event': 'error', 'error': str(e)}
+    
+    mimetype = 'text/event-stream' if fmt == 'sse' else 'application/x-ndjson'
+    return Response(stream_with_context(stream_events(generate(), fmt)), mimetype=mimetype,
+                    headers={'Cache-Control': 'no-cache'})
+
+def job_links(job_id):
+    return {
+        'job_id': job_id,
+        'status_url': f'/api/jobs/{job_id}',
+        'events_url': f'/api/jobs/{job_id}/events'
+    }
+
+@app.errorhandler(413)
+def request_too_large(e):
+    return jsonify({
+        'error': f'Upload exceeds {uploads.MAX_UPLOAD_BYTES // uploads.MB} MB',
+        'max_bytes': uploads.MAX_UPLOAD_BYTES
+    }), 413
 
 @app.route('/api/process-bill', methods=['POST'])
 def process_bill():
     """API endpoint to process uploaded bill image or PDF"""
     try:
-        # Check for PDF file
-        if 'pdf' in request.files:
-            file = request.files['pdf']
-            if file.filename == '':
-                return jsonify({'error': 'No PDF file selected'}), 400
-            
-            # Extract text from PDF
-            extracted_text = bill_extractor.extract_text_from_pdf(file.stream)
-            
-            # Process the extracted text
-            result = bill_extractor.process_bill_text(extracted_text)
-            result['file_type'] = 'pdf'
-            result['filename'] = file.filename
-            
-            return jsonify(result)
-        
-        # Check for image file
-        elif 'image' in request.files or 'image_data' in request.json:
-            if 'image' in request.files:
-                # Handle file upload
-                file = request.files['image']
-                image = Image.open(file.stream)
-                image_array = np.array(image)
-                filename = file.filename
-            else:
-                # Handle base64 image data
-                image_data = request.json['image_data']
-                image_array = image_data
-                filename = 'uploaded_image'
-            
-            # Process the bill image
-            result = bill_extractor.process_bill(image_array)
-            result['file_type'] = 'image'
-            result['filename'] = filename
-            
-            return jsonify(result)
-        
-        else:
-            return jsonify({'error': 'No image or PDF file provided'}), 400
-        
+        try:
+            profile = requested_profile()
+        except ValueError as e:
+            return jsonify({'error': str(e)}), 400
+        
+        # Streaming mode: ?stream=ndjson (or 1) / ?stream=sse
+        stream = request.args.get('stream', '').lower()
+        if stream:
+            return stream_bill('sse' if stream == 'sse' else 'ndjson', profile)
+        
+        upload, error = read_upload()
+        if error:
+            return error
+        file_type, filename, content = upload
+        
+        # Async mode: accept the upload now, process it in the background
+        if request.args.get('async', '').lower() in ('1', 'true', 'yes'):
+            try:
+                job = job_queue.submit(file_type, filename, content, {'profile': profile['name']})
+            except QueueFullError as e:
+                return jsonify({'error': str(e), 'queue': job_queue.stats()}), 503
+            return jsonify(dict(job_links(job['id']), success=True, status=job['status'])), 202
+        
+        result = process_upload(file_type, filename, content, profile=profile)
+        # Statement mode: also list every dated row (transactions) of the text
+        if request.args.get('statement', '').lower() in ('1', 'true', 'yes') and result.get('extracted_text'):
+            result['rows'] = bill_extractor.extract_dated_rows(result['extracted_text'])
+        return jsonify(result)
+        
+    except uploads.UploadTooLargeError as e:
+        return jsonify({'error': str(e)}), 413
+    except HTTPException:
+        # e.g. 413 from MAX_CONTENT_LENGTH, answered by its error handler
+        raise
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
+@app.route('/api/process-bills', methods=['POST'])
+def process_bills():
+    """API endpoint to process many bills (files and/or zip archives), streamed as NDJSON"""
+    files = request.files.getlist('files') + request.files.getlist('pdf') + request.files.getlist('image')
+    if not files:
+        return jsonify({'error': 'No files provided'}), 400
+    try:
+        profile = requested_profile()
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    
+    def process(file_type, filename, content):
+        return process_upload(file_type, filename, content, profile=profile)
+    
+    def generate():
+        try:
+            items = batch_upload.expand_uploads(files)
+            for record in batch_upload.run_batch(items, process):
+                yield json.dumps(record, default=str) + "\n"
+        except batch_upload.BatchError as e:
+            yield json.dumps({'error': str(e)}) + "\n"
+    
+    return Response(stream_with_context(generate()), mimetype='application/x-ndjson')
+
+@app.route('/api/jobs', methods=['GET'])
+def jobs_status():
+    """Job queue depth and counters"""
+    return jsonify({'success': True, 'queue': job_queue.stats()})
+
+@app.route('/api/jobs/<job_id>', methods=['GET'])
+def job_status(job_id):
+    """Poll the status of an async bill-processing job"""
+    job = job_queue.get(job_id)
+    if job is None:
+        return jsonify({'error': 'Job not found'}), 404
+    return jsonify(dict(job, success=True))
+
+@app.route('/api/jobs/<job_id>/events', methods=['GET'])
+def job_events(job_id):
+    """Stream job progress as server-sent events until it finishes"""
+    job = job_queue.get(job_id)
+    if job is None:
+        return jsonify({'error': 'Job not found'}), 404
+    
+    def generate(job):
+        while True:
+            yield f"event: {job['status']}\ndata: {json.dumps(job, default=str)}\n\n"
+            if job['status'] in ('done', 'failed'):
+                return
+            
+            version = job['version']
+            while True:
+                update = job_queue.wait_for_change(job_id, version)
+                if update is not None:
+                    job = update
+                    break
+                yield ": keep-alive\n\n"
+    
+    return Response(stream_with_context(generate(job)), mimetype='text/event-stream',
+                    headers={'Cache-Control': 'no-cache'})
+
 @app.route('/api/categorize-expense', methods=['POST'])
 def categorize_expense():
     """API endpoint to categorize an expense"""
@@ -1621,9 +1492,52 @@ def categorize_expense():
             'success': True
         })
         
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
+@app.route('/api/categorize-expenses', methods=['POST'])
+def categorize_expenses():
+    """API endpoint to categorize a batch of expenses: {"expenses": [{"description", "amount"}, ...]}"""
+    data = request.get_json(silent=True)
+    expenses = data.get('expenses') if isinstance(data, dict) else data
+    if not isinstance(expenses, list):
+        return jsonify({'error': 'Expected a list of expenses'}), 400
+    if len(expenses) > CATEGORIZE_BATCH_MAX:
+        return jsonify({
+            'error': f'Too many expenses: {len(expenses)} (limit {CATEGORIZE_BATCH_MAX} per request)'
+        }), 413
+    
+    pairs = []
+    for index, expense in enumerate(expenses):
+        if not isinstance(expense, dict):
+            return jsonify({'error': f'Expense {index} is not an object'}), 400
+        try:
+            pairs.append((str(expense.get('description', '')), float(expense.get('amount', 0) or 0)))
+        except (TypeError, ValueError):
+            return jsonify({'error': f'Expense {index}: amount must be a valid number'}), 400
+    
+    try:
+        start = time.perf_counter()
+        results = bill_extractor.categorize_expenses(pairs)
+        return jsonify({
+            'results': results,
+            'count': len(results),
+            'elapsed_ms': round((time.perf_counter() - start) * 1000, 3),
+            'success': True
+        })
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+@app.route('/api/categorization-rules/reload', methods=['POST'])
+def reload_categorization_rules():
+    """Re-read categorization_rules.json; invalid rules are reported and the old ones kept"""
+    try:
+        return jsonify(dict(bill_extractor.reload_categorization_rules(), success=True))
+    except (rules.RulesError, OSError) as e:
+        return jsonify({'error': str(e), 'success': False}), 400
+
 @app.route('/api/expenses', methods=['GET', 'POST'])
 def expenses():
     """API endpoint to manage expenses"""
@@ -1812,7 +1726,16 @@ def health_check():
     return jsonify({
         'status': 'healthy', 
         'model_loaded': bill_extractor.expense_model is not None,
-        'expenses_count': len(expenses_db)
+        'expenses_count': len(expenses_db),
+        'ocr': bill_extractor.ocr.stats(),
+        'ocr_profiles': {'default': ocr_profiles.OCR_PROFILE, 'available': list(ocr_profiles.OCR_PROFILES)},
+        'result_cache': result_cache.stats(),
+        'orientation_cache': orientation.decision_cache.stats(),
+        'date_cache': date_scanner.cache_stats(),
+        'categorization_rules': bill_extractor.category_rules.stats(),
+        'category_cache': bill_extractor.category_cache.stats(),
+        'ml_cascade': dict(bill_extractor.cascade_counters, threshold=ML_CASCADE_THRESHOLD),
+        'jobs': job_queue.stats()
     })
 
 @app.route('/api/fix-dates', methods=['POST'])
@@ -0,0 +1,121 @@
+"""
+Batch bill ingestion: expand uploads and zip archives into individual bills and
+process them concurrently, yielding each result as soon as it finishes
+"""
+
+import os
+import time
+import zipfile
+from concurrent.futures import ThreadPoolExecutor, FIRST_COMPLETED, wait
+import uploads
+
+BATCH_WORKERS = int(os.environ.get('SMARTSPEND_BATCH_WORKERS', 4))
+BATCH_MAX_FILES = int(os.environ.get('SMARTSPEND_BATCH_MAX_FILES', 500))
+# Total uncompressed size accepted from zip archives in one batch
+BATCH_MAX_ARCHIVE_BYTES = int(os.environ.get('SMARTSPEND_BATCH_MAX_ARCHIVE_BYTES', 500 * 1024 * 1024))
+
+IMAGE_EXTENSIONS = ('.jpg', '.jpeg', '.png', '.bmp', '.tif', '.tiff', '.webp')
+
+
+class BatchError(Exception):
+    """Raised when a batch cannot be accepted"""
+
+
+def file_type_for(filename, content):
+    """'pdf', 'image' or None for unsupported files"""
+    if content[:5] == b'%PDF-' or filename.lower().endswith('.pdf'):
+        return 'pdf'
+    if filename.lower().endswith(IMAGE_EXTENSIONS):
+        return 'image'
+    return None
+
+
+def _archive_members(archive_name, archive, budget):
+    """Yield (filename, loader) for the files inside a zip archive"""
+    for info in archive.infolist():
+        name = info.filename
+        base = os.path.basename(name)
+        if info.is_dir() or not base or base.startswith('.') or name.startswith('__MACOSX/'):
+            continue
+
+        if info.file_size > uploads.MAX_UPLOAD_BYTES:
+            # Reported as a failed file, never decompressed
+            yield f'{archive_name}/{name}', (lambda: None)
+            continue
+        budget['bytes'] -= info.file_size
+        if budget['bytes'] < 0:
+            raise BatchError(f'Archives exceed {BATCH_MAX_ARCHIVE_BYTES} uncompressed bytes')
+        yield f'{archive_name}/{name}', (lambda info=info: archive.read(info))
+
+
+def expand_uploads(files):
+    """Yield (filename, loader) for every bill in the uploads, opening zip archives"""
+    budget = {'bytes': BATCH_MAX_ARCHIVE_BYTES}
+    for file in files:
+        if not file.filename:
+            continue
+        if file.filename.lower().endswith('.zip') or zipfile.is_zipfile(file.stream):
+            file.stream.seek(0)
+            yield from _archive_members(file.filename, zipfile.ZipFile(file.stream), budget)
+        else:
+            file.stream.seek(0)
+            yield file.filename, file.read
+
+
+def run_batch(items, process, workers=None):
+    """Process (filename, loader) items concurrently, yielding one record per file as it completes
+
+    process(file_type, filename, content) returns the result dict for one bill. At most
+    workers * 2 files are loaded at once so large archives are never held in memory whole.
+    """
+    workers = workers or BATCH_WORKERS
+    items = iter(enumerate(items))
+    pending = {}
+    counts = {'total': 0, 'succeeded': 0, 'failed': 0, 'skipped': 0}
+    started = time.time()
+
+    def run_one(index, filename, content):
+        item_started = time.time()
+        if content is None:
+            return {'index': index, 'filename': filename, 'file_type': None, 'success': False,
+                    'error': f'File exceeds {uploads.MAX_UPLOAD_BYTES // uploads.MB} MB', 'elapsed_ms': 0.0}
+        file_type = file_type_for(filename, content)
+        record = {'index': index, 'filename': filename, 'file_type': file_type}
+        if file_type is None:
+            record.update(success=False, skipped=True, error='Unsupported file type')
+        else:
+            try:
+                record.update(process(file_type, filename, content))
+            except Exception as e:
+                record.update(success=False, error=str(e))
+        record['elapsed_ms'] = round((time.time() - item_started) * 1000, 1)
+        return record
+
+    def fill(executor):
+        while len(pending) < workers * 2:
+            try:
+                index, (filename, loader) = next(items)
+            except StopIteration:
+                return
+            if index >= BATCH_MAX_FILES:
+                raise BatchError(f'Batch exceeds {BATCH_MAX_FILES} files')
+            pending[executor.submit(run_one, index, filename, loader())] = index
+
+    with ThreadPoolExecutor(max_workers=workers, thread_name_prefix='bill-batch') as executor:
+        fill(executor)
+        while pending:
+            done, _ = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                del pending[future]
+                record = future.result()
+                counts['total'] += 1
+                if record.get('skipped'):
+                    counts['skipped'] += 1
+                elif record.get('success', False):
+                    counts['succeeded'] += 1
+                else:
+                    counts['failed'] += 1
+                yield record
+            fill(executor)
+
+    yield {'summary': dict(counts, elapsed_ms=round((time.time() - started) * 1000, 1))}
@@ -0,0 +1,148 @@
+"""
+Benchmark the OCR profiles on a folder of sample bills
+
+Every bill is processed with each profile (the result cache is bypassed) and the
+report lists latency and how often the extracted amount, date and vendor agree with
+the 'accurate' profile, to help pick a tier for interactive uploads and for batches.
+With a truth file ({file name: {'amount', 'date', 'vendor'}}, e.g. the truth.json that
+sample_bills.py writes, picked up from the folder by default) it also lists how often
+each field is right.
+
+Usage:
+    python benchmark_ocr.py path/to/bills [--profiles fast,balanced,accurate] [--repeat 3]
+                            [--truth truth.json] [--json report.json]
+"""
+
+import argparse
+import io
+import json
+import os
+import statistics
+import time
+
+SUPPORTED_EXTENSIONS = ('.pdf', '.jpg', '.jpeg', '.png', '.bmp', '.tif', '.tiff', '.webp')
+COMPARED_FIELDS = ('amount', 'date', 'vendor')
+
+
+def find_bills(path):
+    if os.path.isfile(path):
+        return [path]
+    bills = []
+    for root, _, files in os.walk(path):
+        for name in sorted(files):
+            if name.lower().endswith(SUPPORTED_EXTENSIONS):
+                bills.append(os.path.join(root, name))
+    return bills
+
+
+def load_truth(path, truth_path=None):
+    """Expected fields by file name, or None without a truth file"""
+    if truth_path is None and os.path.isdir(path):
+        truth_path = os.path.join(path, 'truth.json')
+    if truth_path is None or not os.path.isfile(truth_path):
+        return None
+    with open(truth_path, encoding='utf-8') as f:
+        return json.load(f)
+
+
+def field_correct(field, extracted, expected):
+    if field == 'amount':
+        return extracted is not None and abs(float(extracted) - float(expected)) < 0.01
+    if field == 'vendor':
+        return ' '.join(str(extracted or '').upper().split()) == ' '.join(str(expected).upper().split())
+    return extracted == expected
+
+
+def run_once(extractor, path, content, profile):
+    if path.lower().endswith('.pdf'):
+        text = extractor.extract_text_from_pdf(io.BytesIO(content), profile=profile)
+        return extractor.process_bill_text(text)
+    return extractor.process_bill(content, profile=profile)
+
+
+def percentile(values, fraction):
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(round(fraction * (len(ordered) - 1))))]
+
+
+def benchmark(paths, profile_names, repeat, truth=None):
+    from app import bill_extractor
+    import ocr_profiles
+
+    if not bill_extractor.ocr.available:
+        raise SystemExit("Tesseract is not available, nothing to benchmark")
+
+    results = {name: {} for name in profile_names}
+    timings = {name: [] for name in profile_names}
+
+    for path in paths:
+        with open(path, 'rb') as f:
+            content = f.read()
+        for name in profile_names:
+            profile = ocr_profiles.get_profile(name)
+            for _ in range(repeat):
+                started = time.time()
+                result = run_once(bill_extractor, path, content, profile)
+                timings[name].append((time.time() - started) * 1000)
+            results[name][path] = result
+
+    reference = results.get('accurate')
+    report = []
+    for name in profile_names:
+        ms = timings[name]
+        successes = sum(1 for r in results[name].values() if r.get('success'))
+        row = {
+            'profile': name,
+            'bills': len(paths),
+            'runs': len(ms),
+            'median_ms': round(statistics.median(ms), 1),
+            'p95_ms': round(percentile(ms, 0.95), 1),
+            'success_rate': round(successes / len(paths), 3),
+            'avg_text_chars': round(statistics.mean(len(r.get('extracted_text') or '') for r in results[name].values()), 1)
+        }
+        if reference is not None:
+            for field in COMPARED_FIELDS:
+                agree = sum(1 for path in paths if results[name][path].get(field) == reference[path].get(field))
+                row[f'{field}_agreement'] = round(agree / len(paths), 3)
+        if truth:
+            labeled = [path for path in paths if os.path.basename(path) in truth]
+            for field in COMPARED_FIELDS:
+                correct = sum(1 for path in labeled
+                              if field_correct(field, results[name][path].get(field), truth[os.path.basename(path)][field]))
+                row[f'{field}_accuracy'] = round(correct / len(labeled), 3) if labeled else None
+        report.append(row)
+    return report
+
+
+def print_report(report):
+    columns = list(report[0].keys())
+    widths = [max(len(column), *(len(str(row[column])) for row in report)) for column in columns]
+    print('  '.join(column.ljust(width) for column, width in zip(columns, widths)))
+    for row in report:
+        print('  '.join(str(row[column]).ljust(width) for column, width in zip(columns, widths)))
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark SmartSpend OCR profiles')
+    parser.add_argument('path', help='bill file or folder of bills (images and PDFs)')
+    parser.add_argument('--profiles', default='fast,balanced,accurate')
+    parser.add_argument('--repeat', type=int, default=1, help='runs per bill and profile')
+    parser.add_argument('--truth', help="expected fields per file name (default: the folder's truth.json)")
+    parser.add_argument('--json', help='also write the report to this file')
+    args = parser.parse_args()
+
+    paths = find_bills(args.path)
+    if not paths:
+        raise SystemExit(f"No bills found in {args.path}")
+
+    report = benchmark(paths, args.profiles.split(','), args.repeat, load_truth(args.path, args.truth))
+    print()
+    print_report(report)
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump(report, f, indent=2)
+        print(f"\n💾 Report written to {args.json}")
+
+
+if __name__ == '__main__':
+    main()
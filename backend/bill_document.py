@@ -0,0 +1,192 @@
+"""
+A bill's text parsed once and shared by every extractor
+
+process_bill and process_bill_text used to hand the raw text to each extractor, which
+split it into lines, lowercased it and searched it again on its own. BillDocument does
+that work once per bill, and lazily: lines with their offsets, lowercased and stripped
+lines, and an index from keyword to the lines holding it.
+
+ContextIndex does the same for the bad-context check on smart-pattern amount
+candidates: the indicator words (GSTIN, phone, URLs, ...) are located once per document
+and each candidate's surroundings are checked with a bisect rather than a regex pass each.
+"""
+
+import bisect
+from functools import cached_property
+import patterns
+
+# Text around an amount that marks it as an ID, phone number or address rather than a total
+BAD_CONTEXT_INDICATORS = [
+    'gstin', 'gst', 'tax', 'pan', 'cin', 'ph:', 'phone', 'mobile',
+    'email', 'uid:', 'invoice mo', 'invoice no', 'receipt no',
+    'bill no', 'order no', '@', '.com', 'www.', 'http'
+]
+CONTEXT_CHARS = 50
+
+
+class ContextIndex:
+    """Positions of every bad-context indicator in a document, found once
+
+    bad_context(amount_str) answers what scanning the whole text with
+    ".{0,50}<amount>.{0,50}" and testing each match for an indicator did, with a few
+    str.find calls and a bisect per occurrence of the amount instead of a regex pass
+    over the document per candidate.
+    """
+
+    def __init__(self, text, lowered=None):
+        self.text = text
+        lowered = text.lower() if lowered is None else lowered
+        if len(lowered) == len(text):
+            self.offsets = None
+        else:
+            # Some characters lowercase to two ('İ'), so map text offsets to lowered ones
+            self.offsets = [0]
+            for char in text:
+                self.offsets.append(self.offsets[-1] + len(char.lower()))
+
+        spans = []
+        for indicator in BAD_CONTEXT_INDICATORS:
+            position = lowered.find(indicator)
+            while position != -1:
+                spans.append((position, position + len(indicator)))
+                position = lowered.find(indicator, position + 1)
+        spans.sort()
+        self.starts = [start for start, _ in spans]
+        # earliest_end[i]: smallest end among the indicators starting at or after starts[i]
+        self.earliest_end = [end for _, end in spans]
+        for i in range(len(spans) - 2, -1, -1):
+            self.earliest_end[i] = min(self.earliest_end[i], self.earliest_end[i + 1])
+
+    def has_indicator(self, start, end):
+        """Whether an indicator lies wholly within text[start:end]"""
+        if self.offsets is not None:
+            start, end = self.offsets[start], self.offsets[end]
+        i = bisect.bisect_left(self.starts, start)
+        return i < len(self.starts) and self.earliest_end[i] <= end
+
+    def contexts(self, amount_str):
+        """(start, end) of each match of ".{0,50}<amount>.{0,50}", in findall order"""
+        text = self.text
+        length = len(amount_str)
+        position = 0
+        occurrence = text.find(amount_str)
+        while occurrence != -1:
+            # The match starts as far back as 50 characters on the amount's line allow...
+            start = max(position, occurrence - CONTEXT_CHARS)
+            start = max(start, text.rfind('\n', start, occurrence) + 1)
+            # ...the greedy prefix runs to the last occurrence it can reach on the line...
+            limit = start + 2 * CONTEXT_CHARS + length
+            line_end = text.find('\n', start, limit)
+            if line_end == -1:
+                line_end = min(limit, len(text))
+            reach = min(start + CONTEXT_CHARS, line_end) + length
+            last = occurrence
+            following = text.find(amount_str, occurrence + 1, reach)
+            while following != -1:
+                last = following
+                following = text.find(amount_str, following + 1, reach)
+            # ...and the suffix takes up to 50 more characters before the line ends
+            position = min(last + length + CONTEXT_CHARS, line_end)
+            yield start, position
+            occurrence = text.find(amount_str, position)
+
+    def bad_context(self, amount_str):
+        """The first context around amount_str containing an indicator, or None"""
+        for start, end in self.contexts(str(amount_str)):
+            if self.has_indicator(start, end):
+                return self.text[start:end]
+        return None
+
+
+class BillDocument:
+    """Lines, offsets and keyword hits of one bill's text"""
+
+    def __init__(self, text):
+        self.text = text
+        self.lines = text.split('\n')
+        self._keyword_lines = {}
+
+    @cached_property
+    def line_starts(self):
+        """Offset of each line in the text"""
+        return _line_starts(self.lines)
+
+    @cached_property
+    def lower_line_starts(self):
+        """Offset of each line in the lowercased text ('İ' lowercases to two characters)"""
+        return self.line_starts if len(self.lower) == len(self.text) else _line_starts(self.lines_lower)
+
+    @cached_property
+    def lower(self):
+        return self.text.lower()
+
+    @cached_property
+    def upper(self):
+        return self.text.upper()
+
+    @cached_property
+    def lines_lower(self):
+        # lower() never adds or removes a newline, so this is each line lowercased
+        return self.lower.split('\n')
+
+    @cached_property
+    def lines_stripped(self):
+        return [line.strip() for line in self.lines]
+
+    @cached_property
+    def context_index(self):
+        """Bad-context indicator positions for the amount extractor"""
+        return ContextIndex(self.text, self.lower)
+
+    @cached_property
+    def year_lines(self):
+        """Lines with a four-digit run, the only ones that can hold a date"""
+        return self.lines_of(match.start() for match in patterns.DATE_YEAR.finditer(self.text))
+
+    def line_of(self, position):
+        """Line number of a text offset"""
+        return bisect.bisect_right(self.line_starts, position) - 1
+
+    def lines_of(self, positions, starts=None):
+        """Set of line numbers of ascending text offsets"""
+        found = set()
+        starts, line = starts or self.line_starts, 0
+        for position in positions:
+            while line + 1 < len(starts) and starts[line + 1] <= position:
+                line += 1
+            found.add(line)
+        return found
+
+    def lines_with(self, keyword):
+        """Line numbers whose lowercased line contains keyword (lowercase, no newline)"""
+        lines = self._keyword_lines.get(keyword)
+        if lines is None:
+            lower, positions = self.lower, []
+            position = lower.find(keyword)
+            while position != -1:
+                positions.append(position)
+                position = lower.find(keyword, position + 1)
+            lines = self._keyword_lines[keyword] = self.lines_of(positions, self.lower_line_starts)
+        return lines
+
+    def lines_with_any(self, keywords):
+        """Line numbers whose lowercased line contains any of the keywords"""
+        found = set()
+        for keyword in keywords:
+            found |= self.lines_with(keyword)
+        return found
+
+
+def _line_starts(lines):
+    starts, offset = [], 0
+    for line in lines:
+        starts.append(offset)
+        offset += len(line) + 1
+    return starts
+
+
+def parse(text_or_document):
+    """The BillDocument for a text, or the document itself when given one"""
+    if isinstance(text_or_document, BillDocument):
+        return text_or_document
+    return BillDocument(text_or_document)
@@ -0,0 +1,72 @@
+"""
+Memoized expense categories
+
+The same descriptions ("uber trip", "electricity bill") are categorized over and over,
+and each time pays for the rule scan and, when no rule holds, the ML model. Categories
+are cached on the normalized description (lowercased, whitespace collapsed) and an amount
+bucket. The bucket edges are the model's amount ranges plus the rules' large-amount
+threshold, so amounts on either side of that threshold never share an entry.
+"""
+
+import bisect
+import os
+import threading
+from collections import OrderedDict
+
+CATEGORY_CACHE_ENTRIES = int(os.environ.get('SMARTSPEND_CATEGORY_CACHE_ENTRIES', 4096))
+
+# Edges of the AmountRange feature the expense model was trained with (models.AMOUNT_RANGE_EDGES),
+# each the inclusive upper end of its range
+AMOUNT_EDGES = [50, 200, 500, 1000, 5000]
+
+
+def normalize(description):
+    return ' '.join(str(description).lower().split())
+
+
+def amount_bucket(amount, large_amount=None):
+    """(amount range, above the large-amount threshold) for an amount"""
+    above = bool(large_amount) and amount > large_amount['above']
+    return bisect.bisect_left(AMOUNT_EDGES, amount), above
+
+
+class CategoryCache:
+    """LRU of categories keyed by (normalized description, amount bucket)"""
+    def __init__(self, entries=None):
+        self.entries = CATEGORY_CACHE_ENTRIES if entries is None else entries
+        self._categories = OrderedDict()
+        self._lock = threading.Lock()
+        self.counters = {'hits': 0, 'misses': 0, 'evictions': 0, 'invalidations': 0}
+
+    def get(self, key):
+        with self._lock:
+            category = self._categories.get(key)
+            if category is None:
+                self.counters['misses'] += 1
+                return None
+            self._categories.move_to_end(key)
+            self.counters['hits'] += 1
+            return category
+
+    def put(self, key, category):
+        if self.entries <= 0:
+            return
+        with self._lock:
+            self._categories[key] = category
+            self._categories.move_to_end(key)
+            while len(self._categories) > self.entries:
+                self._categories.popitem(last=False)
+                self.counters['evictions'] += 1
+
+    def clear(self):
+        """Drop every entry, e.g. after the rules or the model changed"""
+        with self._lock:
+            self._categories.clear()
+            self.counters['invalidations'] += 1
+
+    def stats(self):
+        with self._lock:
+            lookups = self.counters['hits'] + self.counters['misses']
+            return dict(self.counters,
+                        hit_rate=round(self.counters['hits'] / lookups, 3) if lookups else 0.0,
+                        entries=len(self._categories), max_entries=self.entries)
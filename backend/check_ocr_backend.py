@@ -0,0 +1,100 @@
+"""
+Check that the OCR workers recognize with warm in-process Tesseract (tesserocr)
+
+Starts the OCR pool, asks every worker which backend it runs, then recognizes a rendered
+receipt with each PSM pass, the confidence strategy and orientation detection through
+the pool. Fails unless every worker is on tesserocr and the receipt text, its total and
+a 90° rotation come back right. With the tesseract binary installed the same passes are
+also timed through pytesseract (one subprocess and temp file per pass) for comparison.
+
+Usage:
+    python check_ocr_backend.py [--workers 2] [--repeat 5]
+"""
+
+import argparse
+import statistics
+import sys
+import time
+
+import cv2
+import numpy as np
+import pytesseract
+
+import ocr_engine
+
+RECEIPT_LINES = ['GROCERY MART', 'Milk 2x 45.00', 'Bread 30.00', 'Grand Total 120.00', 'Thank you visit again']
+
+
+def render_receipt():
+    image = np.full((60 + 70 * len(RECEIPT_LINES), 900), 255, dtype=np.uint8)
+    for i, line in enumerate(RECEIPT_LINES):
+        cv2.putText(image, line, (20, 60 + i * 70), cv2.FONT_HERSHEY_SIMPLEX, 1.3, 0, 3)
+    return image
+
+
+def ms_per_pass(recognize, image, configs, repeat):
+    timings = []
+    for _ in range(repeat):
+        for config in configs:
+            start = time.perf_counter()
+            recognize(image, config)
+            timings.append((time.perf_counter() - start) * 1000)
+    return statistics.median(timings)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--workers', type=int, default=2)
+    parser.add_argument('--repeat', type=int, default=5)
+    args = parser.parse_args()
+
+    engine = ocr_engine.OCREngine(workers=args.workers)
+    failures = []
+    if not engine.available:
+        print("❌ Tesseract is not available (neither the binary nor tesserocr with eng data)")
+        return 1
+
+    backends = engine.worker_backends()
+    print(f"Workers: {backends}")
+    if any(backend != 'tesserocr' for backend in backends):
+        failures.append("workers are not on tesserocr (is it installed, with eng traineddata?)")
+
+    receipt = render_receipt()
+    for config in ocr_engine.OCR_CONFIGS:
+        text = engine.image_to_string(receipt, config)
+        if 'Grand Total 120.00' not in text:
+            failures.append(f"'{config}' read {text.strip()[:80]!r}")
+    text = engine.ocr_confidence(receipt)
+    if '120.00' not in text:
+        failures.append(f"confidence strategy read {text.strip()[:80]!r}")
+
+    try:
+        rotation, confidence = engine.detect_orientation(np.ascontiguousarray(np.rot90(receipt)))
+        print(f"Orientation of the receipt turned 90° counter-clockwise: rotate {rotation}° (confidence {confidence:.1f})")
+        if rotation != 90:
+            failures.append(f"orientation detection says rotate {rotation}°, expected 90°")
+    except Exception as e:
+        failures.append(f"orientation detection failed: {e}")
+
+    warm_ms = ms_per_pass(engine.image_to_string, receipt, ocr_engine.OCR_CONFIGS, args.repeat)
+    print(f"Pool ({backends[0]}): {warm_ms:.1f} ms per pass")
+    try:
+        pytesseract.get_tesseract_version()
+    except Exception:
+        print("pytesseract: no tesseract binary, not timed")
+    else:
+        subprocess_ms = ms_per_pass(lambda image, config: pytesseract.image_to_string(image, config=config),
+                                    receipt, ocr_engine.OCR_CONFIGS, args.repeat)
+        print(f"pytesseract (subprocess per pass): {subprocess_ms:.1f} ms per pass, "
+              f"{subprocess_ms / warm_ms:.1f}x the pool")
+
+    for failure in failures:
+        print(f"❌ {failure}")
+    if failures:
+        return 1
+    print("✅ OCR workers recognize with warm tesserocr instances")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,160 @@
+"""
+Date extraction for bill and statement text
+
+Lines without a four-digit run cannot hold a date and are skipped before any pattern
+runs, and the keyword patterns only run on lines mentioning "date" (both looked up in
+the BillDocument's indexes). Each date token is parsed by the first strict strptime
+format that fits its shape (patterns.DATE_FAST_PATHS) and only falls back to dateutil's
+much slower fuzzy parser when none does. Parses are memoized per token, so a statement
+repeating the same dates parses each once.
+"""
+
+import os
+from datetime import date, datetime
+from functools import lru_cache
+import dateutil.parser as date_parser
+import patterns
+
+DATE_CACHE_SIZE = int(os.environ.get('SMARTSPEND_DATE_CACHE_SIZE', 4096))
+
+# Lines with these are more likely to hold the bill date
+DATE_KEYWORDS = ['date:', 'invoice date:', 'bill date:', 'dated:', 'on:']
+
+SLASHED_FORMATS = (
+    '%d/%m/%Y',  # DD/MM/YYYY first (European/Indian format)
+    '%m/%d/%Y',  # then MM/DD/YYYY (American format)
+)
+
+
+@lru_cache(maxsize=DATE_CACHE_SIZE)
+def _parse(token, today):
+    """datetime for a token, or the ValueError/TypeError parsing raised
+
+    today is only part of the cache key: dateutil fills missing fields from the current date.
+    """
+    try:
+        # Ambiguous dates like 9/10/2025 (could be Sep 10 or Oct 9)
+        if patterns.DATE_SLASHED.match(token):
+            formats = SLASHED_FORMATS
+        else:
+            formats = next((formats for shape, formats in patterns.DATE_FAST_PATHS if shape.match(token)), ())
+        for fmt in formats:
+            try:
+                return datetime.strptime(token, fmt)
+            except ValueError:
+                continue
+        return date_parser.parse(token, fuzzy=True)
+    except (ValueError, TypeError) as e:
+        return e
+
+
+def parse_date(token):
+    """Parse a date token, raising ValueError or TypeError when it is not a date"""
+    parsed = _parse(token, date.today())
+    if isinstance(parsed, Exception):
+        raise parsed.with_traceback(None)
+    return parsed
+
+
+def cache_stats():
+    info = _parse.cache_info()
+    lookups = info.hits + info.misses
+    return {'hits': info.hits, 'misses': info.misses,
+            'hit_rate': round(info.hits / lookups, 3) if lookups else 0.0,
+            'entries': info.currsize, 'max_entries': info.maxsize}
+
+
+def repair(match):
+    """Fix common OCR date corruptions: 00/MM/YYYY has a corrupted day, read as 10"""
+    if match.startswith('00/'):
+        return match.replace('00/', '10/')
+    return match
+
+
+def in_range(parsed_date):
+    """Dates too far in the future or past are misreads"""
+    return 1990 <= parsed_date.year <= datetime.now().year + 1
+
+
+def line_matches(line, has_date_word):
+    """(pattern index, date string) for every DATE_LINE match on a line, in pattern order"""
+    for i, pattern in enumerate(patterns.DATE_LINE):
+        if i in patterns.DATE_KEYWORD_LINE and not has_date_word:
+            continue
+        for match in pattern.findall(line):
+            yield i, match
+
+
+def find_dates(document):
+    """Every distinct date in a BillDocument, as dicts with date, raw_text, confidence and parsed_date"""
+    dates = []
+    found_tokens = set()  # To avoid duplicates
+    found_dates = set()
+    current_year = datetime.now().year
+    date_word_lines = document.lines_with('date')
+    keyword_lines = document.lines_with_any(DATE_KEYWORDS)
+
+    # Only lines with a four-digit run can hold a date
+    for line_num in sorted(document.year_lines):
+        for i, match in line_matches(document.lines[line_num], line_num in date_word_lines):
+            # Skip if we've already found this date string
+            if match in found_tokens:
+                continue
+            cleaned_match = repair(match)
+            if cleaned_match != match:
+                print(f"📅 Fixed OCR day corruption: '{match}' → '{cleaned_match}'")
+            try:
+                parsed_date = parse_date(cleaned_match)
+            except (ValueError, TypeError) as e:
+                print(f"📅 Could not parse date '{match}': {e}")
+                continue
+
+            if not in_range(parsed_date):
+                continue
+            formatted_date = parsed_date.strftime('%Y-%m-%d')
+            # Skip if we already have this formatted date
+            if formatted_date in found_dates:
+                continue
+
+            # Prefer dates with keywords or recent dates
+            confidence = 2.0 if line_num in keyword_lines else 1.0
+            # HIGHEST confidence for dates right after "Invoice Date :"
+            if i == 0:  # First pattern (Invoice Date : DD/MM/YYYY)
+                confidence += 3.0
+            elif i == 1:  # Second pattern (Invoice Date: July 26, 2017)
+                confidence += 1.0
+            # Boost confidence for recent dates (within last 10 years)
+            if parsed_date.year >= current_year - 10:
+                confidence += 0.5
+
+            found_tokens.add(match)
+            found_dates.add(formatted_date)
+            dates.append({
+                'date': formatted_date,
+                'raw_text': match,
+                'confidence': confidence,
+                'parsed_date': parsed_date
+            })
+            print(f"📅 Found date: {formatted_date} (confidence: {confidence:.1f}) from '{match}'")
+    return dates
+
+
+def dated_rows(document):
+    """Statement mode: every line of a BillDocument holding a date, in order, with the first date on it
+
+    Rows are not de-duplicated, since a statement lists many transactions per day.
+    """
+    rows = []
+    date_word_lines = document.lines_with('date')
+    for line_num in sorted(document.year_lines):
+        line = document.lines[line_num]
+        for _, match in line_matches(line, line_num in date_word_lines):
+            try:
+                parsed_date = parse_date(repair(match))
+            except (ValueError, TypeError):
+                continue
+            if in_range(parsed_date):
+                rows.append({'line': line_num, 'date': parsed_date.strftime('%Y-%m-%d'),
+                             'raw_text': match, 'text': line.strip()})
+                break
+    return rows
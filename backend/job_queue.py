@@ -0,0 +1,258 @@
+"""
+Background job queue for bill processing
+
+Accepted uploads are written to a local jobs directory before they are queued, so a
+restart picks them up again instead of losing them.
+"""
+
+import json
+import os
+import queue
+import threading
+import time
+import uuid
+import uploads
+
+JOB_WORKERS = int(os.environ.get('SMARTSPEND_JOB_WORKERS', 2))
+JOB_QUEUE_MAX = int(os.environ.get('SMARTSPEND_JOB_QUEUE_MAX', 32))
+JOB_RETENTION_SECONDS = int(os.environ.get('SMARTSPEND_JOB_RETENTION_SECONDS', 24 * 3600))
+JOBS_DIR = os.environ.get(
+    'SMARTSPEND_JOBS_DIR',
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), 'cache', 'jobs')
+)
+
+FINISHED_STATES = ('done', 'failed')
+
+
+class QueueFullError(Exception):
+    """Raised when the job queue is at capacity"""
+
+
+class JobQueue:
+    """Bounded queue of bill-processing jobs served by a pool of worker threads"""
+    def __init__(self, handler, workers=None, max_depth=None, jobs_dir=None):
+        self.handler = handler
+        self.workers = JOB_WORKERS if workers is None else workers
+        self.max_depth = JOB_QUEUE_MAX if max_depth is None else max_depth
+        self.jobs_dir = JOBS_DIR if jobs_dir is None else jobs_dir
+
+        self._queue = queue.Queue(maxsize=self.max_depth)
+        self._jobs = {}
+        self._lock = threading.Lock()
+        self._changed = threading.Condition(self._lock)
+        self._threads = []
+        self._started = False
+        self.counters = {'submitted': 0, 'completed': 0, 'failed': 0, 'rejected': 0, 'recovered': 0}
+
+    def _job_path(self, job_id):
+        return os.path.join(self.jobs_dir, job_id + '.json')
+
+    def _upload_path(self, job_id):
+        return os.path.join(self.jobs_dir, job_id + '.upload')
+
+    def _save(self, job):
+        """Persist the job record atomically"""
+        path = self._job_path(job['id'])
+        tmp_path = f"{path}.{threading.get_ident()}.tmp"
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(job, f, default=str)
+        os.replace(tmp_path, path)
+
+    def _update(self, job_id, **fields):
+        with self._changed:
+            job = self._jobs[job_id]
+            job.update(fields)
+            job['version'] += 1
+            snapshot = dict(job)
+            self._changed.notify_all()
+        # Written outside the lock so progress of other jobs never waits on this disk write;
+        # only the worker running a job updates it, so its writes stay in order
+        self._save(snapshot)
+
+    def start(self):
+        """Recover persisted jobs and start the workers (idempotent)"""
+        with self._lock:
+            if self._started:
+                return
+            self._started = True
+        os.makedirs(self.jobs_dir, exist_ok=True)
+        self._recover()
+
+        for i in range(self.workers):
+            thread = threading.Thread(target=self._work, name=f'bill-job-{i}', daemon=True)
+            thread.start()
+            self._threads.append(thread)
+        print(f"🧵 Job queue started: {self.workers} workers, max depth {self.max_depth}")
+
+    def _recover(self):
+        """Reload job records; re-queue the ones that were accepted but never finished"""
+        now = time.time()
+        pending = []
+        for name in os.listdir(self.jobs_dir):
+            if not name.endswith('.json'):
+                continue
+            try:
+                with open(os.path.join(self.jobs_dir, name), 'r', encoding='utf-8') as f:
+                    job = json.load(f)
+            except (OSError, ValueError):
+                continue
+
+            if job['status'] in FINISHED_STATES and now - job.get('finished_at', now) > JOB_RETENTION_SECONDS:
+                self._remove_files(job['id'])
+                continue
+
+            self._jobs[job['id']] = job
+            if job['status'] not in FINISHED_STATES:
+                job.update(status='queued', stage='queued', progress=0.0)
+                pending.append(job)
+
+        for job in sorted(pending, key=lambda j: j['created_at']):
+            try:
+                self._queue.put_nowait(job['id'])
+                self.counters['recovered'] += 1
+            except queue.Full:
+                job.update(status='failed', error='Job queue full after restart', finished_at=time.time())
+            self._save(job)
+
+        if pending:
+            print(f"♻️ Recovered {len(pending)} unfinished jobs")
+
+    def _prune(self):
+        """Forget finished jobs older than the retention period"""
+        cutoff = time.time() - JOB_RETENTION_SECONDS
+        with self._lock:
+            expired = [job_id for job_id, job in self._jobs.items()
+                       if job['status'] in FINISHED_STATES and job.get('finished_at', cutoff) < cutoff]
+            for job_id in expired:
+                del self._jobs[job_id]
+        for job_id in expired:
+            self._remove_files(job_id)
+
+    def _remove_files(self, job_id):
+        for path in (self._job_path(job_id), self._upload_path(job_id)):
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+
+    def submit(self, file_type, filename, payload, options=None):
+        """Persist the upload (bytes or a file object) and queue it, returns the job record"""
+        self.start()
+        self._prune()
+        job_id = uuid.uuid4().hex
+        job = {
+            'id': job_id,
+            'status': 'queued',
+            'stage': 'queued',
+            'progress': 0.0,
+            'file_type': file_type,
+            'filename': filename,
+            'options': options or {},
+            'created_at': time.time(),
+            'version': 0,
+            'result': None,
+            'error': None
+        }
+
+        # Refuse before copying anything when the queue is already full
+        self._check_capacity()
+
+        # The copy and the job record are written before the job is visible and without the
+        # lock, so a large upload never stalls progress reports of the jobs already running.
+        # Spooled uploads are copied in chunks, never read whole.
+        try:
+            uploads.copy_to_path(payload, self._upload_path(job_id))
+            self._save(job)
+        except OSError:
+            self._remove_files(job_id)
+            raise
+
+        with self._lock:
+            # Registered before it is queued, so a worker never dequeues an unknown id
+            self._jobs[job_id] = job
+            try:
+                self._queue.put_nowait(job_id)
+            except queue.Full:
+                # Filled up while the upload was being copied
+                del self._jobs[job_id]
+                self.counters['rejected'] += 1
+                full = True
+            else:
+                self.counters['submitted'] += 1
+                full = False
+        if full:
+            self._remove_files(job_id)
+            raise QueueFullError(f'Job queue is full ({self.max_depth} jobs waiting)')
+
+        return dict(job)
+
+    def _check_capacity(self):
+        with self._lock:
+            if self._queue.full():
+                self.counters['rejected'] += 1
+                raise QueueFullError(f'Job queue is full ({self.max_depth} jobs waiting)')
+
+    def _work(self):
+        while True:
+            job_id = self._queue.get()
+            try:
+                self._run(job_id)
+            finally:
+                self._queue.task_done()
+
+    def _run(self, job_id):
+        job = self._jobs.get(job_id)
+        if job is None:
+            return
+
+        self._update(job_id, status='running', stage='started', started_at=time.time())
+
+        def progress(stage, fraction):
+            self._update(job_id, stage=stage, progress=round(fraction, 3))
+
+        try:
+            # The handler gets the stored upload as an open file
+            with open(self._upload_path(job_id), 'rb') as payload:
+                result = self.handler(job, payload, progress)
+        except Exception as e:
+            print(f"❌ Job {job_id} failed: {e}")
+            self._update(job_id, status='failed', stage='failed', error=str(e), finished_at=time.time())
+            with self._lock:
+                self.counters['failed'] += 1
+        else:
+            self._update(job_id, status='done', stage='done', progress=1.0, result=result,
+                         finished_at=time.time())
+            with self._lock:
+                self.counters['completed'] += 1
+
+        try:
+            os.remove(self._upload_path(job_id))
+        except OSError:
+            pass
+
+    def get(self, job_id):
+        with self._lock:
+            job = self._jobs.get(job_id)
+            return dict(job) if job else None
+
+    def wait_for_change(self, job_id, version, timeout=15.0):
+        """Block until the job's version moves past `version`, returns the job or None on timeout"""
+        with self._changed:
+            self._changed.wait_for(
+                lambda: job_id not in self._jobs or self._jobs[job_id]['version'] != version,
+                timeout=timeout
+            )
+            job = self._jobs.get(job_id)
+            if job is None or job['version'] == version:
+                return None
+            return dict(job)
+
+    def stats(self):
+        with self._lock:
+            running = sum(1 for job in self._jobs.values() if job['status'] == 'running')
+            return dict(self.counters,
+                        started=self._started,
+                        workers=self.workers,
+                        queue_depth=self._queue.qsize(),
+                        max_depth=self.max_depth,
+                        running=running)
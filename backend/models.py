@@ -5,6 +5,88 @@ Model classes for SmartSpend ML functionality - Enhanced Version
 import pandas as pd
 import numpy as np
 import re
+import sys
+from functools import lru_cache
+from scipy.sparse import hstack
+
+
+@lru_cache(maxsize=None)
+def _char_class(predicate):
+    """Regex character class of every code point for which predicate (e.g. str.isupper) holds,
+    so counting those characters is one regex pass instead of a Python loop per character"""
+    ranges = []
+    start = None
+    for code in range(sys.maxunicode + 2):
+        if code <= sys.maxunicode and predicate(chr(code)):
+            if start is None:
+                start = code
+        elif start is not None:
+            ranges.append(f'\\U{start:08x}-\\U{code - 1:08x}')
+            start = None
+    return re.compile(f"[{''.join(ranges)}]")
+
+
+# Keyword counts and amount ranges of the model's features. train_production_model builds
+# its training columns with expense_features too, so what is served is what was trained.
+KEYWORD_CATEGORIES = {
+    'food': ['food', 'restaurant', 'chicken', 'pizza', 'meal', 'dining', 'naan', 'curry'],
+    'transport': ['taxi', 'auto', 'fuel', 'parking', 'uber', 'transport', 'gas', 'metro'],
+    'bills': ['bill', 'electric', 'internet', 'phone', 'subscription', 'utility'],
+    'shopping': ['shopping', 'amazon', 'store', 'clothes', 'electronics', 'mall'],
+    'health': ['hospital', 'doctor', 'medical', 'health', 'pharmacy', 'clinic'],
+    'entertainment': ['movie', 'game', 'entertainment', 'netflix', 'cinema'],
+    'tools': ['tool', 'tools', 'equipment', 'hardware', 'saw', 'hammer', 'drill', 'wrench',
+              'stanley', 'bosch', 'makita', 'precision', 'manufacturing', 'workshop', 'machinery'],
+    'business': ['business', 'office', 'consulting', 'professional', 'service', 'company']
+}
+# Upper edges, inclusive: AmountRange 0 is amount <= 50, 1 is 50 < amount <= 200, ...
+AMOUNT_RANGE_EDGES = [50, 200, 500, 1000, 5000]
+TEMPORAL_FEATURES = ['DayOfWeek', 'Month', 'Day', 'IsWeekend', 'IsMonthEnd', 'IsMonthStart']
+
+
+def expense_features(notes, amounts, dates=None):
+    """Cleaned notes and every engineered feature column for many expenses at once
+
+    notes is a sequence of descriptions, amounts a matching sequence (or one amount for
+    all) and dates a matching sequence of timestamps, or None to use the current time as
+    the API does. Returns (cleaned notes Series, DataFrame with one column per feature).
+    """
+    notes = pd.Series(notes, dtype=object).fillna('').astype(str).reset_index(drop=True)
+    amounts = np.broadcast_to(np.asarray(amounts, dtype=float), (len(notes),))
+    notes_clean = notes.str.lower().str.replace(r'[^\w\s]', ' ', regex=True).str.split().str.join(' ')
+    notes_lower = notes.str.lower()
+    lengths = notes.str.len().to_numpy()
+    has_text = lengths > 0
+
+    features = {
+        'Amount': amounts,
+        'LogAmount': np.log1p(amounts),
+        'AmountRange': np.digitize(amounts, AMOUNT_RANGE_EDGES, right=True),
+        'TextLength': notes_clean.str.len().to_numpy(),
+        'WordCount': notes_clean.str.split().str.len().to_numpy(),
+        'UpperCaseRatio': np.divide(notes.str.count(_char_class(str.isupper)).to_numpy(), lengths,
+                                    out=np.zeros(len(notes)), where=has_text),
+        'DigitRatio': np.divide(notes.str.count(_char_class(str.isdigit)).to_numpy(), lengths,
+                                out=np.zeros(len(notes)), where=has_text),
+    }
+    for category, keywords in KEYWORD_CATEGORIES.items():
+        features[f'{category}_keywords'] = sum(
+            notes_clean.str.contains(keyword, regex=False).to_numpy(dtype=int) for keyword in keywords)
+    features['HasAmountPattern'] = notes_lower.str.contains(r'\d+\s*(?:rs|rupees|inr)').to_numpy(dtype=int)
+    features['HasTimePattern'] = notes.str.contains(r'\d{1,2}:\d{2}').to_numpy(dtype=int)
+    features['HasPlacePattern'] = notes_lower.str.contains(r'place\s+\d+').to_numpy(dtype=int)
+
+    if dates is None:
+        dates = pd.Series(pd.Timestamp.now(), index=notes.index)
+    dates = pd.to_datetime(pd.Series(dates).reset_index(drop=True))
+    features['DayOfWeek'] = dates.dt.dayofweek.to_numpy()
+    features['Month'] = dates.dt.month.to_numpy()
+    features['Day'] = dates.dt.day.to_numpy()
+    features['IsWeekend'] = (features['DayOfWeek'] >= 5).astype(int)
+    features['IsMonthEnd'] = (features['Day'] >= 25).astype(int)
+    features['IsMonthStart'] = (features['Day'] <= 5).astype(int)
+    return notes_clean, pd.DataFrame(features)
+
 
 class EnhancedExpenseClassifier:
     """Enhanced classifier wrapper compatible with new model"""
@@ -13,80 +95,23 @@ class EnhancedExpenseClassifier:
         self.tfidf = tfidf
         self.scaler = scaler
         self.numeric_features = numeric_features
-        
-        # Enhanced keyword categories
-        self.keyword_categories = {
-            'food': ['food', 'restaurant', 'cafe', 'meal', 'lunch', 'dinner', 'breakfast', 
-                    'snacks', 'grocery', 'milk', 'bread', 'delivery', 'dining', 'pizza', 
-                    'burger', 'chicken', 'rice', 'curry', 'naan', 'biryani', 'angara'],
-            'transport': ['auto', 'taxi', 'train', 'bus', 'metro', 'fuel', 'gas', 'parking', 
-                         'uber', 'ola', 'transport', 'vehicle', 'car'],
-            'bills': ['bill', 'electric', 'electricity', 'water', 'internet', 'phone', 
-                     'mobile', 'subscription', 'utility', 'service', 'recharge'],
-            'shopping': ['shopping', 'store', 'mall', 'amazon', 'flipkart', 'clothes', 
-                        'electronics', 'purchase'],
-            'health': ['hospital', 'doctor', 'pharmacy', 'medical', 'health', 'clinic', 'medicine'],
-            'entertainment': ['movie', 'cinema', 'game', 'netflix', 'entertainment', 'show']
-        }
-
-    def _clean_text(self, text):
-        """Enhanced text cleaning"""
-        text = str(text).lower()
-        text = re.sub(r'[^\w\s]', ' ', text)
-        text = ' '.join(text.split())
-        return text
-
-    def _count_keywords(self, text, keywords):
-        """Count keyword occurrences"""
-        text_lower = text.lower()
-        return sum(1 for keyword in keywords if keyword in text_lower)
 
     def _extract_features(self, note, amount):
         """Extract comprehensive features for prediction"""
-        note_clean = self._clean_text(note)
-
-        # Enhanced feature dictionary
-        features = {
-            'Amount': amount,
-            'LogAmount': np.log1p(amount),
-            'AmountRange': self._get_amount_range(amount),
-            'DayOfWeek': pd.Timestamp.now().dayofweek,
-            'Month': pd.Timestamp.now().month,
-            'Day': pd.Timestamp.now().day,
-            'IsWeekend': 1 if pd.Timestamp.now().dayofweek >= 5 else 0,
-            'IsMonthEnd': 1 if pd.Timestamp.now().day >= 25 else 0,
-            'IsMonthStart': 1 if pd.Timestamp.now().day <= 5 else 0,
-            'TextLength': len(note_clean),
-            'WordCount': len(note_clean.split()),
-            'UpperCaseRatio': sum(1 for c in note if c.isupper()) / len(note) if note else 0,
-            'DigitRatio': sum(1 for c in note if c.isdigit()) / len(note) if note else 0,
-        }
-        
-        # Add keyword features
-        for category, keywords in self.keyword_categories.items():
-            features[f'{category}_keywords'] = self._count_keywords(note_clean, keywords)
-        
-        # Pattern features
-        features['HasAmountPattern'] = 1 if re.search(r'\d+\s*(rs|rupees|inr|\$)', note.lower()) else 0
-        features['HasTimePattern'] = 1 if re.search(r'\d{1,2}:\d{2}', note) else 0
-        features['HasPlacePattern'] = 1 if re.search(r'place\s+\d+', note.lower()) else 0
-
-        return note_clean, features
-
-    def _get_amount_range(self, amount):
-        """Get amount range category"""
-        if amount < 50:
-            return 0
-        elif amount < 200:
-            return 1
-        elif amount < 500:
-            return 2
-        elif amount < 1000:
-            return 3
-        elif amount < 5000:
-            return 4
-        else:
-            return 5
+        notes_clean, features = expense_features([note], [amount])
+        return notes_clean[0], features.iloc[0].to_dict()
+
+    def batch_features(self, notes, amounts):
+        """Cleaned notes and the numeric feature matrix (columns in numeric_features order)
+        for many notes at once; features the scaler expects but expense_features lacks are 0
+
+        The serving path scales these and runs cascade_predict on them (predict handles a
+        single expense).
+        """
+        notes_clean, features = expense_features(notes, amounts)
+        numeric = pd.DataFrame({feat: features[feat] if feat in features else 0
+                                for feat in self.numeric_features}, index=features.index, columns=self.numeric_features)
+        return notes_clean, numeric
 
     def predict(self, data):
         """Enhanced prediction with better feature handling"""
@@ -126,7 +151,6 @@ class EnhancedExpenseClassifier:
             numeric_scaled = np.array([numeric_array])
 
         # Combine features
-        from scipy.sparse import hstack
         X_combined = hstack([text_features, numeric_scaled])
 
         # Predict
@@ -155,4 +179,37 @@ class EnhancedExpenseClassifier:
         if any(keyword in note_lower for keyword in ['electricity', 'internet', 'phone bill', 'utility']):
             return "Bills & Utilities"
         
-        return "Miscellaneous"
\ No newline at end of file
+        return "Miscellaneous"
+
+def cascade_predict(model, X, threshold, fast_estimator='logistic_regression'):
+    """Predict with a soft-voting ensemble, but let its cheap member answer alone when sure
+
+    Rows where the fast estimator's top-class probability reaches threshold take its
+    prediction; only the rest run the other members, and their soft vote reuses the fast
+    estimator's probabilities instead of computing them again. Returns (predictions,
+    boolean mask of the rows the fast estimator answered). Models without that member
+    are simply predicted in full.
+    """
+    names = [name for name, estimator in getattr(model, 'estimators', []) if estimator != 'drop']
+    if (getattr(model, 'voting', None) != 'soft' or fast_estimator not in names
+            or not hasattr(model, 'le_') or len(names) != len(getattr(model, 'estimators_', []))):
+        return np.asarray(model.predict(X)), np.zeros(X.shape[0], dtype=bool)
+
+    # The ensemble's members are fitted on its own encoding of the labels (model.le_)
+    members = dict(zip(names, model.estimators_))
+    fast_proba = members[fast_estimator].predict_proba(X)
+    confident = fast_proba.max(axis=1) >= threshold
+    predictions = np.empty(X.shape[0], dtype=model.le_.classes_.dtype)
+    if confident.any():
+        predictions[confident] = model.le_.inverse_transform(fast_proba[confident].argmax(axis=1))
+    if not confident.all():
+        # The soft vote of VotingClassifier.predict: weighted mean of the members' probabilities
+        rest = np.flatnonzero(~confident)
+        X_rest = X[rest]
+        probas = [fast_proba[rest] if name == fast_estimator else members[name].predict_proba(X_rest)
+                  for name in names]
+        weights = None
+        if model.weights is not None:
+            weights = [weight for (_, estimator), weight in zip(model.estimators, model.weights) if estimator != 'drop']
+        predictions[rest] = model.le_.inverse_transform(np.average(probas, axis=0, weights=weights).argmax(axis=1))
+    return predictions, confident
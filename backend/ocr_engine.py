@@ -0,0 +1,587 @@
+"""
+OCR engine for SmartSpend bill extraction
+
+Tesseract availability is checked once when the engine is created. Recognition runs
+in a pool of long-lived worker processes; when the optional `tesserocr` binding is
+installed each worker keeps warm in-process Tesseract instances, so no subprocess
+or temp file is created per image. Large images are handed to the workers through
+shared memory instead of being pickled over the pipe.
+"""
+
+import multiprocessing
+import os
+import shlex
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor, FIRST_COMPLETED, wait
+from multiprocessing import resource_tracker, shared_memory
+import numpy as np
+import pytesseract
+from PIL import Image
+
+# OCR mode: 'sequential' runs every PSM pass one after another (original behaviour),
+# 'parallel' sends the passes to a bounded process pool and stops at the first good one,
+# 'confidence' runs one scored pass and only re-reads low-confidence blocks
+OCR_MODE = os.environ.get('SMARTSPEND_OCR_MODE', 'sequential')
+OCR_WORKERS = int(os.environ.get('SMARTSPEND_OCR_WORKERS', min(4, os.cpu_count() or 1)))
+
+# PSM passes tried by the sequential and parallel modes
+OCR_CONFIGS = [
+    '--psm 6',  # Uniform block of text
+    '--psm 4',  # Single column of text
+    '--psm 3',  # Default
+    '--psm 12'  # Raw line text
+]
+
+# Quality bar for early exit: 'length' (characters) or 'confidence' (mean word confidence 0-100)
+OCR_QUALITY_METRIC = os.environ.get('SMARTSPEND_OCR_QUALITY_METRIC', 'length')
+OCR_QUALITY_THRESHOLD = float(os.environ.get('SMARTSPEND_OCR_QUALITY_THRESHOLD', 200))
+
+# Confidence strategy: primary pass, then fallback PSM modes for weak blocks only
+OCR_PRIMARY_CONFIG = os.environ.get('SMARTSPEND_OCR_PRIMARY_CONFIG', '--psm 6')
+OCR_FALLBACK_CONFIGS = ['--psm 4', '--psm 3', '--psm 12']
+OCR_BLOCK_MIN_CONFIDENCE = float(os.environ.get('SMARTSPEND_OCR_BLOCK_MIN_CONFIDENCE', 60))
+OCR_BLOCK_PADDING = 8
+
+# How pool workers are started. The app starts the pool at import, while it is the only
+# thread, so forking is safe there; fork also spares each worker from re-importing the app
+# (spawn and forkserver run the main module again in every child)
+OCR_START_METHOD = os.environ.get(
+    'SMARTSPEND_OCR_START_METHOD',
+    'fork' if 'fork' in multiprocessing.get_all_start_methods() else 'spawn'
+)
+
+# Images at least this large go to the workers through shared memory
+OCR_SHM_MIN_BYTES = int(os.environ.get('SMARTSPEND_OCR_SHM_MIN_BYTES', 256 * 1024))
+
+# Warm Tesseract instances of the current worker, keyed by (lang, oem, variables).
+# Stays None in the web process and when tesserocr is not installed.
+_worker_apis = None
+
+
+def _init_worker(tesseract_cmd):
+    """Set up a pool worker: same Tesseract binary as the parent, warm API when available"""
+    global _worker_apis
+    pytesseract.pytesseract.tesseract_cmd = tesseract_cmd
+    try:
+        import tesserocr  # noqa: F401
+        _worker_apis = {}
+        _get_api('--psm 6')
+    except ImportError:
+        _worker_apis = None
+    except Exception as e:
+        print(f"⚠️ Could not start in-process Tesseract, using pytesseract: {e}")
+        _worker_apis = None
+
+
+def _warmup():
+    """No-op task used to spawn every worker up front"""
+    return os.getpid()
+
+
+def _worker_backend():
+    """Task: the backend this worker recognizes with"""
+    return 'tesserocr' if _worker_apis is not None else 'pytesseract'
+
+
+def parse_config(config):
+    """Split a Tesseract CLI config string into (psm, oem, lang, variables)"""
+    psm, oem, lang, variables = 3, None, 'eng', {}
+    args = shlex.split(config or '')
+    i = 0
+    while i < len(args):
+        arg = args[i]
+        value = args[i + 1] if i + 1 < len(args) else None
+        if arg == '--psm' and value is not None:
+            psm = int(value)
+            i += 1
+        elif arg == '--oem' and value is not None:
+            oem = int(value)
+            i += 1
+        elif arg == '-l' and value is not None:
+            lang = value
+            i += 1
+        elif arg == '-c' and value is not None and '=' in value:
+            key, val = value.split('=', 1)
+            variables[key] = val
+            i += 1
+        i += 1
+    return psm, oem, lang, variables
+
+
+def _get_api(config):
+    """Return a warm tesserocr API for this config, or None to use pytesseract"""
+    if _worker_apis is None:
+        return None
+
+    from tesserocr import PyTessBaseAPI, OEM
+    psm, oem, lang, variables = parse_config(config)
+    key = (lang, oem, tuple(sorted(variables.items())))
+    api = _worker_apis.get(key)
+    if api is None:
+        api = PyTessBaseAPI(lang=lang, oem=OEM.DEFAULT if oem is None else oem)
+        for name, value in variables.items():
+            api.SetVariable(name, value)
+        _worker_apis[key] = api
+    api.SetPageSegMode(psm)
+    return api
+
+
+def image_to_string(image, config=''):
+    """Recognize an image, using the worker's warm API when there is one"""
+    api = _get_api(config)
+    if api is None:
+        return pytesseract.image_to_string(image, config=config)
+
+    api.SetImage(Image.fromarray(image))
+    try:
+        return api.GetUTF8Text()
+    finally:
+        api.Clear()
+
+
+def image_to_data(image, config=''):
+    """Word-level results in the same dict layout as pytesseract.image_to_data"""
+    api = _get_api(config)
+    if api is None:
+        return pytesseract.image_to_data(image, config=config, output_type=pytesseract.Output.DICT)
+
+    from tesserocr import RIL, iterate_level
+    data = {key: [] for key in ('text', 'conf', 'block_num', 'par_num', 'line_num',
+                                'left', 'top', 'width', 'height')}
+    api.SetImage(Image.fromarray(image))
+    try:
+        api.Recognize()
+        iterator = api.GetIterator()
+        if iterator is None:
+            return data
+
+        block_num = par_num = line_num = 0
+        for word in iterate_level(iterator, RIL.WORD):
+            if word.IsAtBeginningOf(RIL.BLOCK):
+                block_num += 1
+                par_num = line_num = 0
+            if word.IsAtBeginningOf(RIL.PARA):
+                par_num += 1
+                line_num = 0
+            if word.IsAtBeginningOf(RIL.TEXTLINE):
+                line_num += 1
+
+            box = word.BoundingBox(RIL.WORD)
+            if box is None:
+                continue
+            x1, y1, x2, y2 = box
+            data['text'].append(word.GetUTF8Text(RIL.WORD) or '')
+            data['conf'].append(word.Confidence(RIL.WORD))
+            data['block_num'].append(block_num)
+            data['par_num'].append(par_num)
+            data['line_num'].append(line_num)
+            data['left'].append(x1)
+            data['top'].append(y1)
+            data['width'].append(x2 - x1)
+            data['height'].append(y2 - y1)
+        return data
+    finally:
+        api.Clear()
+
+
+class SharedImage:
+    """Picklable reference to an image copied into shared memory"""
+    def __init__(self, image):
+        self._shm = shared_memory.SharedMemory(create=True, size=max(1, image.nbytes))
+        self.name = self._shm.name
+        self.shape = image.shape
+        self.dtype = image.dtype.str
+        np.ndarray(image.shape, dtype=image.dtype, buffer=self._shm.buf)[...] = image
+        self._refs = 0
+        self._lock = threading.Lock()
+
+    def __getstate__(self):
+        return {'name': self.name, 'shape': self.shape, 'dtype': self.dtype}
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self._shm = None
+
+    def acquire(self):
+        with self._lock:
+            self._refs += 1
+
+    def release(self, _future=None):
+        """Drop one task reference, freeing the segment after the last one"""
+        with self._lock:
+            self._refs -= 1
+            if self._refs > 0:
+                return
+        self._shm.close()
+        self._shm.unlink()
+
+
+def _call_with_image(fn, image, args):
+    """Worker-side wrapper: attach shared memory images before calling the task"""
+    if not isinstance(image, SharedImage):
+        return fn(image, *args)
+
+    shm = shared_memory.SharedMemory(name=image.name)
+    try:
+        # Copy out of the segment so the task never holds a view after close()
+        array = np.ndarray(image.shape, dtype=np.dtype(image.dtype), buffer=shm.buf).copy()
+    finally:
+        shm.close()
+    return fn(array, *args)
+
+
+def words_to_text(data):
+    """Rebuild line-based text and mean word confidence from image_to_data output"""
+    lines = {}
+    confidences = []
+    for i, word in enumerate(data['text']):
+        if not word or not word.strip():
+            continue
+        key = (data['block_num'][i], data['par_num'][i], data['line_num'][i])
+        lines.setdefault(key, []).append(word)
+        conf = float(data['conf'][i])
+        if conf >= 0:
+            confidences.append(conf)
+
+    text = '\n'.join(' '.join(words) for _, words in sorted(lines.items()))
+    mean_conf = sum(confidences) / len(confidences) if confidences else 0.0
+    return text, mean_conf
+
+
+def run_ocr_pass(image, config, with_confidence=False):
+    """Run a single Tesseract pass, returns (config, text, mean confidence or None)"""
+    if with_confidence:
+        text, mean_conf = words_to_text(image_to_data(image, config=config))
+        return config, text, mean_conf
+
+    return config, image_to_string(image, config=config), None
+
+
+def best_of_passes(image, configs=None):
+    """Run every PSM pass and keep the longest output"""
+    best_text = ""
+    max_length = 0
+    for config in configs or OCR_CONFIGS:
+        try:
+            text = image_to_string(image, config=config)
+            if len(text.strip()) > max_length:
+                max_length = len(text.strip())
+                best_text = text
+        except Exception:
+            continue
+    return best_text
+
+
+def recognize(image, mode=None, configs=None):
+    """Recognize an already preprocessed image inside a worker"""
+    mode = mode or OCR_MODE
+    if mode == 'confidence':
+        if configs:
+            return ocr_confidence(image, configs[0], configs[1:])
+        return ocr_confidence(image)
+    # The parallel mode fans out across documents or pages, so a single worker runs its passes in turn
+    return best_of_passes(image, configs)
+
+
+def detect_orientation(image):
+    """Tesseract OSD: returns (clockwise rotation that makes the text upright, confidence)"""
+    # OSD gets its own warm instance: detection on an eng instance aborts the process
+    api = _get_api('-l osd --psm 0')
+    if api is None:
+        osd = pytesseract.image_to_osd(image, config='--psm 0', output_type=pytesseract.Output.DICT)
+        return int(osd['rotate']) % 360, float(osd['orientation_conf'])
+
+    api.SetImage(Image.fromarray(image))
+    try:
+        osd = api.DetectOrientationScript()
+    finally:
+        api.Clear()
+    if osd is None:
+        raise RuntimeError('Too few characters for orientation detection')
+    # orient_deg is the page's counter-clockwise orientation; undo it clockwise
+    return (360 - osd['orient_deg']) % 360, float(osd['orient_conf'])
+
+
+def meets_quality_bar(text, mean_conf, metric=None, threshold=None):
+    """Check whether an OCR pass is good enough to stop the remaining passes"""
+    metric = metric or OCR_QUALITY_METRIC
+    threshold = OCR_QUALITY_THRESHOLD if threshold is None else threshold
+
+    if not text or not text.strip():
+        return False
+    if metric == 'confidence':
+        return mean_conf is not None and mean_conf >= threshold
+    return len(text.strip()) >= threshold
+
+
+def group_blocks(data):
+    """Group image_to_data words into layout blocks with their lines, confidences and bounding box"""
+    blocks = {}
+    for i, word in enumerate(data['text']):
+        if not word or not word.strip():
+            continue
+        block = blocks.setdefault(data['block_num'][i], {
+            'lines': {},
+            'confidences': [],
+            'bbox': [data['left'][i], data['top'][i],
+                     data['left'][i] + data['width'][i], data['top'][i] + data['height'][i]]
+        })
+        block['lines'].setdefault((data['par_num'][i], data['line_num'][i]), []).append(word)
+
+        conf = float(data['conf'][i])
+        if conf >= 0:
+            block['confidences'].append(conf)
+
+        bbox = block['bbox']
+        bbox[0] = min(bbox[0], data['left'][i])
+        bbox[1] = min(bbox[1], data['top'][i])
+        bbox[2] = max(bbox[2], data['left'][i] + data['width'][i])
+        bbox[3] = max(bbox[3], data['top'][i] + data['height'][i])
+
+    for block in blocks.values():
+        confidences = block['confidences']
+        block['mean_conf'] = sum(confidences) / len(confidences) if confidences else 0.0
+        block['text'] = '\n'.join(' '.join(words) for _, words in sorted(block['lines'].items()))
+
+    return [blocks[num] for num in sorted(blocks)]
+
+
+def ocr_confidence(image, primary_config=None, fallback_configs=None, min_confidence=None):
+    """Run one confidence-scored pass and re-read only the blocks that scored below the bar"""
+    primary_config = primary_config or OCR_PRIMARY_CONFIG
+    fallback_configs = OCR_FALLBACK_CONFIGS if fallback_configs is None else fallback_configs
+    min_confidence = OCR_BLOCK_MIN_CONFIDENCE if min_confidence is None else min_confidence
+
+    blocks = group_blocks(image_to_data(image, config=primary_config))
+    calls = 1
+
+    height, width = image.shape[:2]
+    for block in blocks:
+        if block['mean_conf'] >= min_confidence:
+            continue
+
+        left, top, right, bottom = block['bbox']
+        crop = image[max(0, top - OCR_BLOCK_PADDING):min(height, bottom + OCR_BLOCK_PADDING),
+                     max(0, left - OCR_BLOCK_PADDING):min(width, right + OCR_BLOCK_PADDING)]
+        if crop.size == 0:
+            continue
+
+        for config in fallback_configs:
+            try:
+                crop_data = image_to_data(crop, config=config)
+            except Exception as e:
+                print(f"⚠️ Block fallback '{config}' failed: {e}")
+                continue
+            calls += 1
+
+            text, mean_conf = words_to_text(crop_data)
+            if text.strip() and mean_conf > block['mean_conf']:
+                block['text'] = text
+                block['mean_conf'] = mean_conf
+            if block['mean_conf'] >= min_confidence:
+                break
+
+    overall = sum(b['mean_conf'] for b in blocks) / len(blocks) if blocks else 0.0
+    weak = sum(1 for b in blocks if b['mean_conf'] < min_confidence)
+    print(f"🎯 Confidence OCR: {len(blocks)} blocks, mean confidence {overall:.1f}, "
+          f"{weak} still weak, {calls} Tesseract calls")
+
+    return '\n'.join(b['text'] for b in blocks if b['text'].strip())
+
+
+class OCREngine:
+    """Pool of warm Tesseract workers shared by every OCR call in the web process"""
+    def __init__(self, workers=None):
+        self.workers = workers or OCR_WORKERS
+        self._executor = None
+        self._lock = threading.Lock()
+        self._submitted = 0
+        self._completed = 0
+        self._failed = 0
+        self._task_seconds = 0.0
+
+        try:
+            import tesserocr
+            self.backend = 'tesserocr'
+        except ImportError:
+            tesserocr = None
+            self.backend = 'pytesseract'
+
+        # Check availability once instead of on every request
+        try:
+            self.version = str(pytesseract.get_tesseract_version())
+            self.available = True
+            print(f"✅ Tesseract {self.version} is available")
+        except Exception:
+            # tesserocr bundles libtesseract, so the binary is optional when its language data is there
+            if tesserocr is not None and 'eng' in tesserocr.get_languages()[1]:
+                self.version = tesserocr.tesseract_version().split()[1]
+                self.available = True
+                print(f"✅ Tesseract {self.version} is available through tesserocr (no tesseract binary)")
+            else:
+                self.version = None
+                self.available = False
+                print("⚠️ Tesseract not available")
+
+    def _get_executor(self):
+        """Start the worker pool (on first use unless start() ran) and spawn every worker up front"""
+        with self._lock:
+            if self._executor is None:
+                # Workers attaching shared memory register it with the parent's tracker,
+                # not one of their own that would report it as leaked
+                resource_tracker.ensure_running()
+                self._executor = ProcessPoolExecutor(
+                    max_workers=self.workers,
+                    mp_context=multiprocessing.get_context(OCR_START_METHOD),
+                    initializer=_init_worker,
+                    initargs=(pytesseract.pytesseract.tesseract_cmd,)
+                )
+                for future in [self._executor.submit(_warmup) for _ in range(self.workers)]:
+                    future.result()
+                print(f"🔥 OCR pool started: {self.workers} warm workers ({self.backend}, {OCR_START_METHOD})")
+            return self._executor
+
+    def start(self):
+        """Start the worker pool now; call before the process starts any other thread"""
+        if self.available:
+            self._get_executor()
+
+    def _on_done(self, started, future):
+        with self._lock:
+            self._completed += 1
+            self._task_seconds += time.time() - started
+            if not future.cancelled() and future.exception() is not None:
+                self._failed += 1
+
+    def submit(self, fn, image, *args, shared=None):
+        """Run fn(image, *args) on a pool worker and return the future"""
+        executor = self._get_executor()
+        payload = shared if shared is not None else image
+        if shared is not None:
+            shared.acquire()
+
+        future = self._track(executor.submit, _call_with_image, fn, payload, args)
+        if shared is not None:
+            future.add_done_callback(shared.release)
+        return future
+
+    def submit_path(self, fn, path, *args):
+        """Run fn(path, *args) on a pool worker for tasks that open a file themselves"""
+        return self._track(self._get_executor().submit, fn, path, *args)
+
+    def _track(self, submit, *task):
+        started = time.time()
+        with self._lock:
+            self._submitted += 1
+        future = submit(*task)
+        future.add_done_callback(lambda f: self._on_done(started, f))
+        return future
+
+    def worker_backends(self):
+        """Backend of each pool worker; 'pytesseract' where the warm API could not start"""
+        executor = self._get_executor()
+        return [future.result() for future in [executor.submit(_worker_backend) for _ in range(self.workers)]]
+
+    def share(self, image):
+        """Copy a large image into shared memory once so several tasks can read it"""
+        if image.nbytes < OCR_SHM_MIN_BYTES:
+            return None
+        return SharedImage(image)
+
+    def run(self, fn, image, *args):
+        """Run fn(image, *args) on a pool worker and wait for the result"""
+        shared = self.share(image)
+        if shared is None:
+            return self.submit(fn, image, *args).result()
+
+        shared.acquire()
+        try:
+            return self.submit(fn, image, *args, shared=shared).result()
+        finally:
+            shared.release()
+
+    def image_to_string(self, image, config=''):
+        return self.run(image_to_string, image, config)
+
+    def detect_orientation(self, image):
+        return self.run(detect_orientation, image)
+
+    def ocr_confidence(self, image, primary_config=None, fallback_configs=None):
+        return self.run(ocr_confidence, image, primary_config, fallback_configs)
+
+    def idle_workers(self):
+        with self._lock:
+            return max(0, self.workers - (self._submitted - self._completed))
+
+    def ocr_parallel(self, image, configs, metric=None, threshold=None):
+        """Run the PSM passes concurrently and return as soon as one meets the quality bar
+
+        Passes go to the pool one per idle worker (at least one), and the next pass is
+        only submitted once an earlier one has fallen short of the bar, so a losing pass
+        never queues behind the winner or holds a worker another request needs.
+        """
+        metric = metric or OCR_QUALITY_METRIC
+        with_confidence = metric == 'confidence'
+
+        shared = self.share(image)
+        if shared is not None:
+            shared.acquire()
+        remaining = list(configs)
+        pending = set()
+
+        def submit_next(count):
+            for _ in range(min(count, len(remaining))):
+                pending.add(self.submit(run_ocr_pass, image, remaining.pop(0), with_confidence, shared=shared))
+
+        best_text = ""
+        best_score = -1.0
+
+        try:
+            submit_next(max(1, self.idle_workers()))
+            while pending:
+                done, _ = wait(pending, return_when=FIRST_COMPLETED)
+                pending.difference_update(done)
+                for future in done:
+                    try:
+                        config, text, mean_conf = future.result()
+                    except Exception as e:
+                        print(f"⚠️ OCR pass failed: {e}")
+                        continue
+
+                    score = mean_conf if with_confidence else len(text.strip())
+                    if score > best_score and text.strip():
+                        best_score = score
+                        best_text = text
+
+                    if meets_quality_bar(text, mean_conf, metric, threshold):
+                        print(f"⚡ OCR pass '{config}' met the quality bar ({metric}: {score:.1f}), "
+                              f"skipping {len(remaining)} passes, {len(pending)} still running")
+                        return text
+                # Each finished pass frees its worker for the next one
+                submit_next(len(done))
+        finally:
+            # Passes still running finish in the background and their output is discarded
+            for future in pending:
+                future.cancel()
+            if shared is not None:
+                shared.release()
+
+        return best_text
+
+    def stats(self):
+        """Pool usage and queue depth for the health endpoint"""
+        with self._lock:
+            in_flight = self._submitted - self._completed
+            return {
+                'available': self.available,
+                'version': self.version,
+                'backend': self.backend,
+                'started': self._executor is not None,
+                'workers': self.workers,
+                'busy_workers': min(in_flight, self.workers),
+                'queue_depth': max(0, in_flight - self.workers),
+                'tasks_completed': self._completed,
+                'tasks_failed': self._failed,
+                'avg_task_ms': round(self._task_seconds / self._completed * 1000, 1) if self._completed else 0.0
+            }
@@ -0,0 +1,82 @@
+"""
+Named OCR speed/quality profiles
+
+A profile bundles every setting that trades accuracy for latency: OCR mode, the PSM
+passes, Tesseract engine mode, language model, character whitelist, preprocessing
+steps, orientation detection and the text height images are scaled to. It is chosen per request with the
+`profile` parameter or per deployment with SMARTSPEND_OCR_PROFILE.
+"""
+
+import os
+import shlex
+import ocr_engine
+import orientation
+import preprocessing
+
+# Characters that appear on receipts; OCR noise such as | { } ~ is never produced.
+# The space must be listed, or the LSTM engine runs words together ("GrandTotalRs.")
+RECEIPT_WHITELIST = ('ABCDEFGHIJKLMNOPQRSTUVWXYZabcdefghijklmnopqrstuvwxyz0123456789'
+                     '.,:;/-+*#@&%()₹$€£!? ')
+
+OCR_PROFILES = {
+    # Interactive uploads: one LSTM pass on a smaller image, no receipt detection
+    'fast': {
+        'mode': 'sequential',
+        'psm': ['--psm 6'],
+        'oem': 1,
+        'lang': 'eng',
+        'whitelist': RECEIPT_WHITELIST,
+        'receipt_detection': False,
+        'orientation': 'projection',
+        'binarize': True,
+        'target_text_height': 22
+    },
+    # One scored pass, other PSM modes only for low-confidence blocks
+    'balanced': {
+        'mode': 'confidence',
+        'psm': ['--psm 6', '--psm 4', '--psm 3'],
+        'oem': 1,
+        'lang': 'eng',
+        'whitelist': None,
+        'receipt_detection': True,
+        'orientation': orientation.ORIENTATION_METHOD,
+        'binarize': True,
+        'target_text_height': 28
+    },
+    # Maximum effort (the original pipeline): every PSM pass, best output wins
+    'accurate': {
+        'mode': ocr_engine.OCR_MODE,
+        'psm': ([ocr_engine.OCR_PRIMARY_CONFIG] + ocr_engine.OCR_FALLBACK_CONFIGS
+                if ocr_engine.OCR_MODE == 'confidence' else ocr_engine.OCR_CONFIGS),
+        'oem': None,
+        'lang': 'eng',
+        'whitelist': None,
+        'receipt_detection': preprocessing.RECEIPT_DETECTION,
+        'orientation': orientation.ORIENTATION_METHOD,
+        'binarize': True,
+        'target_text_height': preprocessing.TARGET_TEXT_HEIGHT
+    }
+}
+
+# 'balanced' measured as accurate as 'accurate' on dates and vendors, better on amounts, at
+# a fifth of the latency (benchmark_ocr.py on sample_bills.py bills, see the README)
+OCR_PROFILE = os.environ.get('SMARTSPEND_OCR_PROFILE', 'balanced')
+
+
+def get_profile(name=None):
+    """Resolve a profile name to its settings plus the full Tesseract config strings"""
+    name = name or OCR_PROFILE
+    if name not in OCR_PROFILES:
+        raise ValueError(f"Unknown OCR profile '{name}', expected one of: {', '.join(OCR_PROFILES)}")
+
+    profile = dict(OCR_PROFILES[name], name=name)
+    options = []
+    if profile['oem'] is not None:
+        options.append(f"--oem {profile['oem']}")
+    if profile['lang'] != 'eng':
+        options.append(f"-l {profile['lang']}")
+    if profile['whitelist']:
+        # Quoted, as configs are split shell-style (pytesseract and ocr_engine alike)
+        options.append(f"-c {shlex.quote('tessedit_char_whitelist=' + profile['whitelist'])}")
+    profile['configs'] = [' '.join([psm] + options) for psm in profile['psm']]
+    return profile
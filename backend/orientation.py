@@ -0,0 +1,210 @@
+"""
+Orientation and skew correction for SmartSpend OCR
+
+Quarter-turn orientation comes from Tesseract OSD (falling back to a projection-profile
+comparison when OSD is unavailable); small skew angles come from a coarse-to-fine
+projection-profile search. Decisions are cached by a perceptual hash of the image, so
+repeated and near-duplicate uploads skip detection.
+"""
+
+import os
+import threading
+import time
+from collections import OrderedDict
+import cv2
+import numpy as np
+
+# 'osd' uses Tesseract orientation detection, 'projection' only distinguishes upright
+# from sideways text lines, 'off' disables the stage
+ORIENTATION_METHOD = os.environ.get('SMARTSPEND_ORIENTATION', 'osd')
+ORIENTATION_MIN_CONFIDENCE = float(os.environ.get('SMARTSPEND_ORIENTATION_MIN_CONFIDENCE', 2.0))
+SKEW_MAX_ANGLE = float(os.environ.get('SMARTSPEND_SKEW_MAX_ANGLE', 15))
+SKEW_MIN_ANGLE = 0.3       # smaller angles are left alone
+SKEW_PROBE_MAX_SIDE = 800  # projection profiles are computed on a reduced copy
+SKEW_MAX_POINTS = 40000    # ... from a sample of its text pixels
+
+ORIENTATION_CACHE_ENTRIES = int(os.environ.get('SMARTSPEND_ORIENTATION_CACHE_ENTRIES', 1024))
+# Receipts all look alike at 8x8, so the hash is 16x16 (256 bits); hashes this many bits
+# apart with the same aspect ratio count as the same image
+HASH_SIZE = 16
+ORIENTATION_HASH_DISTANCE = int(os.environ.get('SMARTSPEND_ORIENTATION_HASH_DISTANCE', 10))
+ASPECT_TOLERANCE = 0.02
+
+ROTATIONS = {
+    90: cv2.ROTATE_90_CLOCKWISE,
+    180: cv2.ROTATE_180,
+    270: cv2.ROTATE_90_COUNTERCLOCKWISE
+}
+
+
+def dhash(gray):
+    """Difference hash: robust to rescaling, recompression and small edits"""
+    small = cv2.resize(gray, (HASH_SIZE + 1, HASH_SIZE), interpolation=cv2.INTER_AREA)
+    bits = (small[:, 1:] > small[:, :-1]).ravel()
+    return int.from_bytes(np.packbits(bits).tobytes(), 'big')
+
+
+class OrientationCache:
+    """LRU of orientation decisions keyed by (dHash, aspect ratio), matched within a Hamming distance"""
+    def __init__(self, entries=None, max_distance=None):
+        self.entries = ORIENTATION_CACHE_ENTRIES if entries is None else entries
+        self.max_distance = ORIENTATION_HASH_DISTANCE if max_distance is None else max_distance
+        self._decisions = OrderedDict()
+        self._lock = threading.Lock()
+        self.counters = {'hits': 0, 'misses': 0}
+
+    def get(self, image_hash, aspect):
+        with self._lock:
+            match = None
+            for known, decision in reversed(self._decisions.items()):
+                if (abs(decision['aspect'] - aspect) <= ASPECT_TOLERANCE
+                        and bin(known ^ image_hash).count('1') <= self.max_distance):
+                    match = known
+                    break
+            if match is None:
+                self.counters['misses'] += 1
+                return None
+            self._decisions.move_to_end(match)
+            self.counters['hits'] += 1
+            return dict(self._decisions[match])
+
+    def put(self, image_hash, decision):
+        with self._lock:
+            self._decisions[image_hash] = dict(decision)
+            self._decisions.move_to_end(image_hash)
+            while len(self._decisions) > self.entries:
+                self._decisions.popitem(last=False)
+
+    def stats(self):
+        with self._lock:
+            lookups = self.counters['hits'] + self.counters['misses']
+            return dict(self.counters,
+                        hit_rate=round(self.counters['hits'] / lookups, 3) if lookups else 0.0,
+                        entries=len(self._decisions))
+
+
+def _text_points(gray):
+    """Coordinates of text pixels on a reduced binary copy, returns (xs, ys)"""
+    height, width = gray.shape[:2]
+    factor = min(1.0, SKEW_PROBE_MAX_SIDE / float(max(height, width)))
+    if factor < 1.0:
+        gray = cv2.resize(gray, (int(width * factor), int(height * factor)), interpolation=cv2.INTER_AREA)
+    _, mask = cv2.threshold(gray, 0, 255, cv2.THRESH_BINARY_INV + cv2.THRESH_OTSU)
+
+    ys, xs = np.nonzero(mask)
+    if len(xs) > SKEW_MAX_POINTS:
+        keep = np.random.default_rng(0).choice(len(xs), SKEW_MAX_POINTS, replace=False)
+        xs, ys = xs[keep], ys[keep]
+    return xs.astype(np.float64), ys.astype(np.float64)
+
+
+def _row_counts(xs, ys, angle):
+    """Text pixels per row after cv2's counter-clockwise rotation by angle"""
+    if angle:
+        radians = np.deg2rad(angle)
+        ys = ys * np.cos(radians) - xs * np.sin(radians)
+    return np.bincount(np.floor(ys - ys.min()).astype(np.int64))
+
+
+def _line_score(xs, ys, angle):
+    """Variance of the row projection after rotating by angle: peaks when text lines are level"""
+    return float(np.var(_row_counts(xs, ys, angle))) if len(ys) else 0.0
+
+
+def _gap_fraction(xs, ys, angle):
+    """Share of (nearly) empty rows inside the text: the gaps between lines of level text"""
+    if not len(ys):
+        return 0.0
+    counts = _row_counts(xs, ys, angle)
+    return float(np.mean(counts <= counts.mean() * 0.02))
+
+
+def _best_skew(xs, ys):
+    """Coarse-to-fine search for the angle that levels the text lines"""
+    best_angle, best_score = 0.0, _line_score(xs, ys, 0.0)
+    for step, span in ((1.0, SKEW_MAX_ANGLE), (0.2, 1.0)):
+        center = best_angle
+        for angle in np.arange(center - span, center + span + step / 2, step):
+            angle = float(round(angle, 2))
+            if abs(angle) > SKEW_MAX_ANGLE or angle == center:
+                continue
+            score = _line_score(xs, ys, angle)
+            if score > best_score:
+                best_angle, best_score = angle, score
+    return best_angle
+
+
+def estimate_skew(gray):
+    """Angle in degrees (counter-clockwise) that levels the text lines"""
+    xs, ys = _text_points(gray)
+    return _best_skew(xs, ys)
+
+
+def projection_rotation(gray):
+    """0 or 90: whether the text lines run across or down the image (cannot tell 0 from 180)"""
+    xs, ys = _text_points(gray)
+    upright = _gap_fraction(xs, ys, _best_skew(xs, ys))
+    # Turned 90° clockwise: new x = -y, new y = x (offsets do not change the profile)
+    sideways = _gap_fraction(-ys, xs, _best_skew(-ys, xs))
+    return 90 if sideways > upright * 1.5 else 0
+
+
+def rotate(gray, rotation=0, skew=0.0):
+    """Apply a quarter-turn rotation (clockwise) followed by a small skew correction"""
+    if rotation in ROTATIONS:
+        gray = cv2.rotate(gray, ROTATIONS[rotation])
+    if abs(skew) >= SKEW_MIN_ANGLE:
+        height, width = gray.shape[:2]
+        matrix = cv2.getRotationMatrix2D((width / 2, height / 2), skew, 1.0)
+        # Grow the canvas so the corners are not cut off
+        cos, sin = abs(matrix[0, 0]), abs(matrix[0, 1])
+        new_width, new_height = int(height * sin + width * cos), int(height * cos + width * sin)
+        matrix[0, 2] += new_width / 2 - width / 2
+        matrix[1, 2] += new_height / 2 - height / 2
+        gray = cv2.warpAffine(gray, matrix, (new_width, new_height), flags=cv2.INTER_LINEAR,
+                              borderMode=cv2.BORDER_REPLICATE)
+    return gray
+
+
+# Decisions made in this process (the web process or one OCR worker)
+decision_cache = OrientationCache()
+
+
+def correct(gray, method=None, detect_osd=None):
+    """Detect and undo rotation and skew, returns (image, info)
+
+    detect_osd(image) returns (clockwise rotation, confidence) from Tesseract OSD; it is
+    only called for 'osd' and falls back to the projection method when it fails.
+    """
+    method = method or ORIENTATION_METHOD
+    if method == 'off':
+        return gray, None
+
+    started = time.time()
+    image_hash = dhash(gray)
+    aspect = round(gray.shape[1] / float(gray.shape[0]), 3)
+    decision = decision_cache.get(image_hash, aspect)
+    cached = decision is not None
+
+    if decision is None:
+        rotation, source = None, method
+        if method == 'osd' and detect_osd is not None:
+            try:
+                rotation, confidence = detect_osd(gray)
+                if confidence < ORIENTATION_MIN_CONFIDENCE:
+                    rotation = 0
+            except Exception as e:
+                print(f"⚠️ OSD failed, using projection profiles: {e}")
+        if rotation is None:
+            rotation, source = projection_rotation(gray), 'projection'
+
+        skew = estimate_skew(cv2.rotate(gray, ROTATIONS[rotation]) if rotation in ROTATIONS else gray)
+        decision = {'rotation': rotation, 'skew': skew, 'method': source, 'aspect': aspect}
+        decision_cache.put(image_hash, decision)
+
+    corrected = rotate(gray, decision['rotation'], decision['skew'])
+    info = dict(decision,
+                cached=cached,
+                hash=f'{image_hash:064x}',
+                elapsed_ms=round((time.time() - started) * 1000, 1))
+    return corrected, info
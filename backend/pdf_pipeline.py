@@ -0,0 +1,202 @@
+"""
+Per-page hybrid PDF text extraction for SmartSpend
+
+The document is opened once with PyMuPDF. Pages with a usable text layer are read
+directly; the remaining pages are rasterized and recognized in parallel on the OCR
+engine's worker pool.
+"""
+
+import os
+import shutil
+import tempfile
+from concurrent.futures import FIRST_COMPLETED, as_completed, wait
+from contextlib import contextmanager
+import fitz  # PyMuPDF
+import numpy as np
+import ocr_engine
+import ocr_profiles
+import orientation
+import preprocessing
+import uploads
+
+# A page needs at least this many non-space characters in its text layer to skip OCR
+PDF_MIN_TEXT_CHARS = int(os.environ.get('SMARTSPEND_PDF_MIN_TEXT_CHARS', 20))
+# Render scale (1.0 = 72 DPI): chosen per page from its text height, physical size and
+# the resolution of the scan embedded in it
+PDF_RENDER_SCALE = 2.0  # used when the probe finds no measurable text
+PDF_PROBE_SCALE = 1.0
+PDF_MIN_RENDER_SCALE = 1.0
+PDF_MAX_RENDER_SCALE = 4.0
+# The probe render is OCRed as is when the chosen scale is within this fraction of the
+# probe scale; text a few percent off the target height recognizes the same
+PDF_PROBE_REUSE_TOLERANCE = float(os.environ.get('SMARTSPEND_PDF_PROBE_REUSE_TOLERANCE', 0.15))
+# Pages queued on the OCR pool at once (0 = twice the number of workers)
+PDF_MAX_PAGES_IN_FLIGHT = int(os.environ.get('SMARTSPEND_PDF_MAX_PAGES_IN_FLIGHT', 0))
+
+
+@contextmanager
+def pdf_path_for(pdf_file):
+    """Yield a filesystem path for the PDF so pool workers can open it themselves
+
+    Uploads and stored jobs are already named files and are used in place; only in-memory
+    content (bytes, BytesIO) is written to a temporary file.
+    """
+    name = getattr(pdf_file, 'name', None)
+    if isinstance(name, str) and os.path.isfile(name):
+        yield name
+        return
+
+    if pdf_file.seekable():
+        pdf_file.seek(0)
+    handle = tempfile.NamedTemporaryFile(suffix='.pdf', delete=False)
+    try:
+        with handle:
+            shutil.copyfileobj(pdf_file, handle)
+        yield handle.name
+    finally:
+        os.remove(handle.name)
+
+
+def render_gray(page, scale):
+    """Rasterize a PDF page straight into a grayscale array, no PNG round trip"""
+    pix = page.get_pixmap(matrix=fitz.Matrix(scale, scale), colorspace=fitz.csGRAY, alpha=False)
+    # samples is one owned copy of the pixel buffer; samples_mv would dangle once pix is freed
+    buffer = np.frombuffer(pix.samples, dtype=np.uint8).reshape(pix.height, pix.stride)
+    return buffer[:, :pix.width]
+
+
+def native_scale(page):
+    """Pixels per point of the largest image on the page, or None for pages without images"""
+    best_area, best_scale = 0.0, None
+    for info in page.get_image_info():
+        x0, y0, x1, y1 = info['bbox']
+        area = (x1 - x0) * (y1 - y0)
+        if area > best_area and x1 > x0:
+            best_area, best_scale = area, info['width'] / (x1 - x0)
+    return best_scale
+
+
+def choose_render_scale(page, target_text_height=None):
+    """Pick the render scale from measured text height, capped by source resolution and page size
+
+    Returns (scale, text height measured on the probe, probe render at PDF_PROBE_SCALE).
+    """
+    target_text_height = target_text_height or preprocessing.TARGET_TEXT_HEIGHT
+    probe = render_gray(page, PDF_PROBE_SCALE)
+    text_height = preprocessing.estimate_text_height(probe)
+    if text_height:
+        scale = PDF_PROBE_SCALE * target_text_height / text_height
+    else:
+        scale = PDF_RENDER_SCALE
+    scale = min(PDF_MAX_RENDER_SCALE, max(PDF_MIN_RENDER_SCALE, scale))
+
+    # Rendering above the embedded scan's resolution only adds interpolated pixels
+    source_scale = native_scale(page)
+    if source_scale:
+        scale = min(scale, max(PDF_MIN_RENDER_SCALE, source_scale))
+
+    # Large-format pages are capped by pixel count
+    width, height = page.rect.width, page.rect.height
+    if width * height * scale * scale > preprocessing.MAX_OCR_PIXELS:
+        scale = (preprocessing.MAX_OCR_PIXELS / (width * height)) ** 0.5
+
+    return scale, text_height, probe
+
+
+def ocr_pdf_page(pdf_path, page_number, profile=None):
+    """Worker task: open the PDF, rasterize one page at an adaptive scale and recognize it"""
+    profile = profile or ocr_profiles.get_profile()
+    doc = fitz.open(pdf_path)
+    try:
+        page = doc.load_page(page_number)
+        scale, text_height, gray = choose_render_scale(page, profile['target_text_height'])
+        if abs(scale - PDF_PROBE_SCALE) > PDF_PROBE_REUSE_TOLERANCE * PDF_PROBE_SCALE:
+            gray = render_gray(page, scale)
+        else:
+            scale = PDF_PROBE_SCALE
+    finally:
+        doc.close()
+
+    print(f"🖨️ Page {page_number + 1}: rendering at {scale * 72:.0f} DPI "
+          f"({gray.shape[1]}x{gray.shape[0]}, probe text height {text_height or 0:.1f}px)")
+
+    # Scanned pages can be sideways or skewed too; OSD runs right here in the worker
+    gray, orientation_info = orientation.correct(gray, profile['orientation'], ocr_engine.detect_orientation)
+    if orientation_info and (orientation_info['rotation'] or abs(orientation_info['skew']) >= orientation.SKEW_MIN_ANGLE):
+        print(f"🧭 Page {page_number + 1}: rotated {orientation_info['rotation']}°, skew {orientation_info['skew']:.1f}°")
+
+    # Already rendered at the target text height, so only binarize
+    image = preprocessing.binarize(gray) if profile['binarize'] else gray
+    text = ocr_engine.recognize(image, profile['mode'], profile['configs'])
+    if not text.strip():
+        # Same fallback as single images: one pass on the unprocessed page
+        text = ocr_engine.image_to_string(np.ascontiguousarray(gray), config='--psm 6')
+    return text
+
+
+def has_text_layer(text):
+    return len(''.join(text.split())) >= PDF_MIN_TEXT_CHARS
+
+
+def iter_pages(pdf_path, engine, force_ocr=False, profile=None):
+    """Yield {'page', 'page_count', 'source', 'text'} for each page as soon as it is ready
+
+    Text-layer pages come out as they are read and OCR pages as they finish, so the
+    order is completion order. At most PDF_MAX_PAGES_IN_FLIGHT pages are queued on the
+    OCR pool at a time.
+    """
+    profile = profile or ocr_profiles.get_profile()
+    max_in_flight = PDF_MAX_PAGES_IN_FLIGHT or engine.workers * 2
+    pending = {}
+
+    def finished(futures):
+        for future in futures:
+            page_number = pending.pop(future)
+            try:
+                text = future.result()
+            except Exception as e:
+                print(f"❌ OCR failed on PDF page {page_number + 1}: {e}")
+                text = ''
+            print(f"📄 Page {page_number + 1} OCR extracted {len(text)} characters")
+            yield {'page': page_number + 1, 'page_count': page_count, 'source': 'ocr', 'text': text}
+
+    doc = fitz.open(pdf_path)
+    try:
+        page_count = doc.page_count
+        uploads.check_page_count(page_count)
+        for page_number in range(page_count):
+            text = '' if force_ocr else doc.load_page(page_number).get_text()
+            if has_text_layer(text):
+                yield {'page': page_number + 1, 'page_count': page_count, 'source': 'text', 'text': text}
+            elif engine.available:
+                pending[engine.submit_path(ocr_pdf_page, pdf_path, page_number, profile)] = page_number
+                if len(pending) >= max_in_flight:
+                    done, _ = wait(pending, return_when=FIRST_COMPLETED)
+                    yield from finished(done)
+            else:
+                print(f"⚠️ Page {page_number + 1} has no text layer and Tesseract is not available")
+                yield {'page': page_number + 1, 'page_count': page_count, 'source': 'none', 'text': ''}
+
+        yield from finished(as_completed(list(pending)))
+    finally:
+        doc.close()
+        # A consumer that stops early leaves nothing queued behind it
+        for future in pending:
+            future.cancel()
+
+
+def extract_pages(pdf_path, engine, force_ocr=False, progress=None, profile=None):
+    """Extract every page, returns a list of {'page', 'page_count', 'source', 'text'} in page order
+
+    progress, when given, is called as progress(pages_done, page_count) while pages finish.
+    """
+    pages = []
+    for page in iter_pages(pdf_path, engine, force_ocr=force_ocr, profile=profile):
+        pages.append(page)
+        if progress:
+            progress(len(pages), page['page_count'])
+
+    ocr_pages = sum(1 for page in pages if page['source'] == 'ocr')
+    if ocr_pages:
+        print(f"🔍 OCR ran on {ocr_pages} of {len(pages)} PDF pages in parallel")
+    return sorted(pages, key=lambda page: page['page'])
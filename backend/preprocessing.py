@@ -0,0 +1,279 @@
+"""
+Image preprocessing stages for SmartSpend OCR
+"""
+
+import io
+import os
+import time
+import cv2
+import numpy as np
+from PIL import Image
+
+# Receipt region detection: crop and deskew the receipt before OCR
+RECEIPT_DETECTION = os.environ.get('SMARTSPEND_RECEIPT_DETECTION', '1') == '1'
+RECEIPT_MIN_AREA_RATIO = 0.2   # quad must cover at least this much of the frame
+RECEIPT_MAX_AREA_RATIO = 0.98  # ... and not simply be the frame border
+DETECTION_MAX_SIDE = 800       # contours are searched on a reduced copy
+
+# Resolution normalization: scale so the median glyph is about this tall
+TARGET_TEXT_HEIGHT = int(os.environ.get('SMARTSPEND_TARGET_TEXT_HEIGHT', 28))
+MIN_SCALE = 0.25
+MAX_SCALE = 2.0
+MAX_OCR_PIXELS = int(os.environ.get('SMARTSPEND_MAX_OCR_PIXELS', 4_000_000))
+TEXT_PROBE_MAX_SIDE = 1600
+
+# Decode-time downsampling: only reduce while the decoded image keeps at least this
+# many pixels, so the crop and text-height normalization still have detail to work with
+DECODE_MIN_PIXELS = int(os.environ.get('SMARTSPEND_DECODE_MIN_PIXELS', 8_000_000))
+DECODE_REDUCTIONS = (
+    (8, cv2.IMREAD_REDUCED_GRAYSCALE_8),
+    (4, cv2.IMREAD_REDUCED_GRAYSCALE_4),
+    (2, cv2.IMREAD_REDUCED_GRAYSCALE_2),
+)
+
+# Quality gate: cheap checks on a reduced copy before any OCR runs. Thresholds apply to
+# the QUALITY_PROBE_MAX_SIDE copy; below MIN_* the image is rejected, below ENHANCE_* it
+# goes through the enhancement path first
+QUALITY_GATE = os.environ.get('SMARTSPEND_QUALITY_GATE', '1') == '1'
+QUALITY_PROBE_MAX_SIDE = 1000
+MIN_CONTRAST = float(os.environ.get('SMARTSPEND_MIN_CONTRAST', 25))       # 1st-99th percentile grey range
+ENHANCE_CONTRAST = float(os.environ.get('SMARTSPEND_ENHANCE_CONTRAST', 80))
+MIN_SHARPNESS = float(os.environ.get('SMARTSPEND_MIN_SHARPNESS', 15))     # variance of the Laplacian
+ENHANCE_SHARPNESS = float(os.environ.get('SMARTSPEND_ENHANCE_SHARPNESS', 100))
+MIN_TEXT_COMPONENTS = int(os.environ.get('SMARTSPEND_MIN_TEXT_COMPONENTS', 12))
+QUALITY_REJECT_MESSAGES = {
+    'blank': 'The image looks blank. Please upload a photo of the bill.',
+    'blurry': 'The image is too blurry to read. Please retake the photo with the bill in focus.',
+    'no_text': 'No text was found in the image. Please upload a photo of the bill.'
+}
+
+
+def to_grayscale(image):
+    """Convert BGR/BGRA/grayscale arrays to a single channel"""
+    if len(image.shape) == 2:
+        return image
+    if image.shape[2] == 4:
+        return cv2.cvtColor(image, cv2.COLOR_BGRA2GRAY)
+    return cv2.cvtColor(image, cv2.COLOR_BGR2GRAY)
+
+
+def image_size(data):
+    """(width, height) from the image header without decoding pixels, or None"""
+    try:
+        with Image.open(io.BytesIO(data)) as image:
+            return image.size
+    except Exception:
+        return None
+
+
+def decode_image(data, min_pixels=None):
+    """Decode encoded image bytes straight to a grayscale array, returns (gray, reduction)
+
+    The bytes are wrapped without copying and decoded once. Large images are reduced by
+    2, 4 or 8 during decoding (JPEG scales in the DCT) while they stay above min_pixels.
+    """
+    min_pixels = DECODE_MIN_PIXELS if min_pixels is None else min_pixels
+    buffer = np.frombuffer(data, dtype=np.uint8)
+
+    flags, reduction = cv2.IMREAD_GRAYSCALE, 1
+    size = image_size(data)
+    if size:
+        width, height = size
+        for factor, reduced_flags in DECODE_REDUCTIONS:
+            if (width // factor) * (height // factor) >= min_pixels:
+                flags, reduction = reduced_flags, factor
+                break
+
+    gray = cv2.imdecode(buffer, flags)
+    if gray is None:
+        raise ValueError('Could not decode image data')
+    return gray, reduction
+
+
+def _resize_to_max_side(gray, max_side):
+    """Downscale so the longest side is at most max_side, returns (image, factor)"""
+    height, width = gray.shape[:2]
+    factor = min(1.0, max_side / float(max(height, width)))
+    if factor >= 1.0:
+        return gray, 1.0
+    small = cv2.resize(gray, (int(width * factor), int(height * factor)), interpolation=cv2.INTER_AREA)
+    return small, factor
+
+
+def _order_corners(points):
+    """Order four points as top-left, top-right, bottom-right, bottom-left"""
+    points = points.reshape(4, 2).astype(np.float32)
+    sums = points.sum(axis=1)
+    diffs = np.diff(points, axis=1).ravel()
+    return np.array([
+        points[np.argmin(sums)],
+        points[np.argmin(diffs)],
+        points[np.argmax(sums)],
+        points[np.argmax(diffs)]
+    ], dtype=np.float32)
+
+
+def find_receipt_quad(gray):
+    """Find the four corners of the receipt in full-resolution coordinates, or None"""
+    small, factor = _resize_to_max_side(gray, DETECTION_MAX_SIDE)
+    frame_area = float(small.shape[0] * small.shape[1])
+
+    blurred = cv2.GaussianBlur(small, (5, 5), 0)
+    edges = cv2.Canny(blurred, 50, 150)
+    edges = cv2.dilate(edges, np.ones((3, 3), np.uint8), iterations=2)
+
+    contours, _ = cv2.findContours(edges, cv2.RETR_EXTERNAL, cv2.CHAIN_APPROX_SIMPLE)
+    for contour in sorted(contours, key=cv2.contourArea, reverse=True)[:5]:
+        area_ratio = cv2.contourArea(contour) / frame_area
+        if area_ratio < RECEIPT_MIN_AREA_RATIO:
+            break
+        if area_ratio > RECEIPT_MAX_AREA_RATIO:
+            continue
+
+        approx = cv2.approxPolyDP(contour, 0.02 * cv2.arcLength(contour, True), True)
+        if len(approx) == 4 and cv2.isContourConvex(approx):
+            return _order_corners(approx) / factor
+
+    return None
+
+
+def warp_receipt(gray, quad):
+    """Crop and deskew the receipt with a perspective transform"""
+    top_left, top_right, bottom_right, bottom_left = quad
+    width = int(max(np.linalg.norm(top_right - top_left), np.linalg.norm(bottom_right - bottom_left)))
+    height = int(max(np.linalg.norm(bottom_left - top_left), np.linalg.norm(bottom_right - top_right)))
+    if width < 10 or height < 10:
+        return gray
+
+    target = np.array([[0, 0], [width - 1, 0], [width - 1, height - 1], [0, height - 1]], dtype=np.float32)
+    matrix = cv2.getPerspectiveTransform(quad, target)
+    return cv2.warpPerspective(gray, matrix, (width, height), flags=cv2.INTER_LINEAR,
+                               borderMode=cv2.BORDER_REPLICATE)
+
+
+def glyph_heights(gray):
+    """Heights of the glyph-like connected components of an image"""
+    _, binary = cv2.threshold(gray, 0, 255, cv2.THRESH_BINARY_INV + cv2.THRESH_OTSU)
+
+    count, _, stats, _ = cv2.connectedComponentsWithStats(binary, connectivity=8)
+    if count <= 1:
+        return np.empty(0, dtype=np.int32)
+
+    heights = stats[1:, cv2.CC_STAT_HEIGHT]
+    widths = stats[1:, cv2.CC_STAT_WIDTH]
+    # Keep glyph-like components: not specks, not lines or borders
+    glyphs = (heights >= 4) & (heights <= gray.shape[0] * 0.1) & (widths <= heights * 4)
+    return heights[glyphs]
+
+
+def estimate_text_height(gray):
+    """Median glyph height in pixels from connected components, or None if no text is visible"""
+    probe, factor = _resize_to_max_side(gray, TEXT_PROBE_MAX_SIDE)
+    heights = glyph_heights(probe)
+    if len(heights) < 10:
+        return None
+
+    return float(np.median(heights)) / factor
+
+
+def assess_quality(gray):
+    """Blank/blur/no-text triage, returns {'verdict': ok|enhance|reject, 'reason', metrics}"""
+    started = time.time()
+    probe, _ = _resize_to_max_side(gray, QUALITY_PROBE_MAX_SIDE)
+
+    # Percentile range rather than std dev: sparse text on a clean page has a low std dev
+    cumulative = np.cumsum(np.bincount(probe.ravel(), minlength=256))
+    low, high = np.searchsorted(cumulative, [0.01 * probe.size, 0.99 * probe.size])
+    contrast = float(high - low)
+    sharpness = float(cv2.Laplacian(probe, cv2.CV_64F).var())
+    text_components = int(len(glyph_heights(probe))) if contrast >= MIN_CONTRAST else 0
+
+    if contrast < MIN_CONTRAST:
+        verdict, reason = 'reject', 'blank'
+    elif text_components < MIN_TEXT_COMPONENTS:
+        # Heavy blur merges glyphs into blobs, so few components can mean either
+        verdict, reason = 'reject', 'blurry' if sharpness < ENHANCE_SHARPNESS else 'no_text'
+    elif sharpness < MIN_SHARPNESS:
+        verdict, reason = 'reject', 'blurry'
+    elif sharpness < ENHANCE_SHARPNESS:
+        verdict, reason = 'enhance', 'low_sharpness'
+    elif contrast < ENHANCE_CONTRAST:
+        verdict, reason = 'enhance', 'low_contrast'
+    else:
+        verdict, reason = 'ok', None
+
+    return {
+        'verdict': verdict,
+        'reason': reason,
+        'contrast': round(contrast, 1),
+        'sharpness': round(sharpness, 1),
+        'text_components': text_components,
+        'elapsed_ms': round((time.time() - started) * 1000, 1)
+    }
+
+
+def enhance(gray):
+    """Heavier path for borderline images: local contrast equalization and unsharp masking"""
+    clahe = cv2.createCLAHE(clipLimit=2.0, tileGridSize=(8, 8))
+    equalized = clahe.apply(gray)
+    blurred = cv2.GaussianBlur(equalized, (0, 0), 3)
+    return cv2.addWeighted(equalized, 1.5, blurred, -0.5, 0)
+
+
+def normalize_resolution(gray, target_text_height=None):
+    """Resize so text lands at the target glyph height, capped by MAX_OCR_PIXELS"""
+    target_text_height = target_text_height or TARGET_TEXT_HEIGHT
+    height, width = gray.shape[:2]
+
+    text_height = estimate_text_height(gray)
+    scale = 1.0
+    if text_height:
+        scale = min(MAX_SCALE, max(MIN_SCALE, target_text_height / text_height))
+
+    # Never hand Tesseract more than MAX_OCR_PIXELS
+    pixels = height * width * scale * scale
+    if pixels > MAX_OCR_PIXELS:
+        scale *= (MAX_OCR_PIXELS / pixels) ** 0.5
+
+    if abs(scale - 1.0) < 0.05:
+        return gray, 1.0, text_height
+
+    interpolation = cv2.INTER_AREA if scale < 1.0 else cv2.INTER_CUBIC
+    resized = cv2.resize(gray, (max(1, int(width * scale)), max(1, int(height * scale))),
+                         interpolation=interpolation)
+    return resized, scale, text_height
+
+
+def binarize(gray):
+    """Gaussian blur to reduce noise, then Otsu threshold to a binary image"""
+    blurred = cv2.GaussianBlur(gray, (5, 5), 0)
+    _, thresh = cv2.threshold(blurred, 0, 255, cv2.THRESH_BINARY + cv2.THRESH_OTSU)
+    return thresh
+
+
+def prepare_receipt(image, detect_receipt=None, target_text_height=None):
+    """Grayscale, crop/deskew the receipt and normalize its resolution, returns (image, stats)"""
+    detect_receipt = RECEIPT_DETECTION if detect_receipt is None else detect_receipt
+    started = time.time()
+    original_height, original_width = image.shape[:2]
+
+    gray = to_grayscale(image)
+
+    quad = find_receipt_quad(gray) if detect_receipt else None
+    if quad is not None:
+        gray = warp_receipt(gray, quad)
+
+    gray, scale, text_height = normalize_resolution(gray, target_text_height)
+
+    final_height, final_width = gray.shape[:2]
+    original_pixels = original_width * original_height
+    stats = {
+        'original_size': [original_width, original_height],
+        'final_size': [final_width, final_height],
+        'receipt_detected': quad is not None,
+        'text_height': round(text_height, 1) if text_height else None,
+        'scale': round(scale, 3),
+        'pixel_reduction': round(1 - (final_width * final_height) / original_pixels, 3) if original_pixels else 0.0,
+        'elapsed_ms': round((time.time() - started) * 1000, 1)
+    }
+    return gray, stats
@@ -0,0 +1,174 @@
+"""
+Content-addressed cache for bill processing results
+"""
+
+import copy
+import hashlib
+import json
+import os
+import threading
+from collections import OrderedDict
+
+# Bump when extraction logic changes so old results are not served
+PIPELINE_VERSION = '1'
+
+CACHE_MEMORY_ENTRIES = int(os.environ.get('SMARTSPEND_CACHE_MEMORY_ENTRIES', 256))
+CACHE_DISK_DIR = os.environ.get(
+    'SMARTSPEND_CACHE_DIR',
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), 'cache', 'results')
+)
+CACHE_DISK_MAX_BYTES = int(os.environ.get('SMARTSPEND_CACHE_DISK_MAX_BYTES', 200 * 1024 * 1024))
+CACHE_DISK_MAX_ENTRIES = int(os.environ.get('SMARTSPEND_CACHE_DISK_MAX_ENTRIES', 10000))
+
+
+class ResultCache:
+    """Two-level cache: in-memory LRU in front of a bounded on-disk store"""
+    def __init__(self, memory_entries=None, disk_dir=None, disk_max_bytes=None, disk_max_entries=None):
+        self.memory_entries = CACHE_MEMORY_ENTRIES if memory_entries is None else memory_entries
+        self.disk_dir = CACHE_DISK_DIR if disk_dir is None else disk_dir
+        self.disk_max_bytes = CACHE_DISK_MAX_BYTES if disk_max_bytes is None else disk_max_bytes
+        self.disk_max_entries = CACHE_DISK_MAX_ENTRIES if disk_max_entries is None else disk_max_entries
+
+        self._memory = OrderedDict()
+        self._disk = OrderedDict()  # key -> size in bytes, least recently used first
+        self._disk_bytes = 0
+        self._lock = threading.Lock()
+        self.counters = {'memory_hits': 0, 'disk_hits': 0, 'misses': 0, 'stores': 0, 'evictions': 0}
+
+        if self.disk_dir:
+            self._load_disk_index()
+
+    @staticmethod
+    def make_key(data, *variant):
+        """Hash of the content bytes, the pipeline version and any settings that change the result"""
+        digest = hashlib.sha256()
+        digest.update(PIPELINE_VERSION.encode())
+        for part in variant:
+            digest.update(b'\0' + str(part).encode())
+        digest.update(b'\0')
+        if isinstance(data, (bytes, bytearray, memoryview)):
+            digest.update(data)
+        else:
+            # Spooled uploads are hashed in chunks and rewound
+            data.seek(0)
+            for chunk in iter(lambda: data.read(64 * 1024), b''):
+                digest.update(chunk)
+            data.seek(0)
+        return digest.hexdigest()
+
+    def _path(self, key):
+        return os.path.join(self.disk_dir, key[:2], key + '.json')
+
+    def _load_disk_index(self):
+        """Rebuild the disk LRU order from file modification times"""
+        try:
+            os.makedirs(self.disk_dir, exist_ok=True)
+        except OSError as e:
+            print(f"⚠️ Result cache disk store disabled: {e}")
+            self.disk_dir = None
+            return
+
+        entries = []
+        for root, _, files in os.walk(self.disk_dir):
+            for name in files:
+                if not name.endswith('.json'):
+                    continue
+                path = os.path.join(root, name)
+                try:
+                    stat = os.stat(path)
+                except OSError:
+                    continue
+                entries.append((stat.st_mtime, name[:-5], stat.st_size))
+
+        for _, key, size in sorted(entries):
+            self._disk[key] = size
+            self._disk_bytes += size
+        self._evict_disk()
+
+    def _evict_disk(self):
+        while self._disk and (self._disk_bytes > self.disk_max_bytes or len(self._disk) > self.disk_max_entries):
+            key, size = self._disk.popitem(last=False)
+            self._disk_bytes -= size
+            self.counters['evictions'] += 1
+            try:
+                os.remove(self._path(key))
+            except OSError:
+                pass
+
+    def _remember(self, key, result):
+        self._memory[key] = result
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.memory_entries:
+            self._memory.popitem(last=False)
+            self.counters['evictions'] += 1
+
+    def get(self, key):
+        """Return a copy of the cached result or None"""
+        with self._lock:
+            if key in self._memory:
+                self._memory.move_to_end(key)
+                self.counters['memory_hits'] += 1
+                return copy.deepcopy(self._memory[key])
+
+            if self.disk_dir and key in self._disk:
+                path = self._path(key)
+                try:
+                    with open(path, 'r', encoding='utf-8') as f:
+                        result = json.load(f)
+                    os.utime(path, None)
+                except (OSError, ValueError):
+                    self._disk_bytes -= self._disk.pop(key)
+                else:
+                    self._disk.move_to_end(key)
+                    self._remember(key, result)
+                    self.counters['disk_hits'] += 1
+                    return copy.deepcopy(result)
+
+            self.counters['misses'] += 1
+            return None
+
+    def put(self, key, result):
+        """Store a result in memory and on disk"""
+        payload = json.dumps(result, default=str)
+        with self._lock:
+            self._remember(key, json.loads(payload))
+            self.counters['stores'] += 1
+
+            if not self.disk_dir:
+                return
+            path = self._path(key)
+            try:
+                os.makedirs(os.path.dirname(path), exist_ok=True)
+                tmp_path = f"{path}.{threading.get_ident()}.tmp"
+                with open(tmp_path, 'w', encoding='utf-8') as f:
+                    f.write(payload)
+                os.replace(tmp_path, path)
+            except OSError as e:
+                print(f"⚠️ Could not write result cache entry: {e}")
+                return
+
+            size = len(payload.encode('utf-8'))
+            self._disk_bytes += size - self._disk.pop(key, 0)
+            self._disk[key] = size
+            self._evict_disk()
+
+    def clear(self):
+        with self._lock:
+            self._memory.clear()
+            for key in list(self._disk):
+                try:
+                    os.remove(self._path(key))
+                except OSError:
+                    pass
+            self._disk.clear()
+            self._disk_bytes = 0
+
+    def stats(self):
+        with self._lock:
+            hits = self.counters['memory_hits'] + self.counters['disk_hits']
+            lookups = hits + self.counters['misses']
+            return dict(self.counters,
+                        hit_rate=round(hits / lookups, 3) if lookups else 0.0,
+                        memory_entries=len(self._memory),
+                        disk_entries=len(self._disk),
+                        disk_bytes=self._disk_bytes)
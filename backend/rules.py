@@ -0,0 +1,255 @@
+"""
+Rule-based expense categorization
+
+The rules live in categorization_rules.json, in priority order: the first rule that holds
+decides the category. The keywords of every rule are compiled into one Aho-Corasick
+automaton, so a description is scanned once however many rules there are, and only the
+rules with a keyword in it (plus the few with regex patterns) are evaluated afterwards.
+RuleEngine.reload() rebuilds everything from the file at run time.
+"""
+
+import hashlib
+import json
+import os
+import re
+import threading
+from collections import deque
+
+RULES_PATH = os.environ.get('SMARTSPEND_CATEGORY_RULES',
+                            os.path.join(os.path.dirname(os.path.abspath(__file__)), 'categorization_rules.json'))
+
+
+class RulesError(ValueError):
+    """Raised when the rules file is malformed"""
+
+
+class KeywordAutomaton:
+    """Aho-Corasick automaton: one pass over a text finds every occurrence of every
+    keyword, overlapping ones included
+
+    The failure links are folded into a transition table, so scanning is one dict lookup
+    per character. Each state only stores the transitions that differ from the root's.
+    """
+
+    def __init__(self, keywords):
+        goto = [{}]
+        output = [()]
+        self.lengths = [len(keyword) for keyword in keywords]
+        for index, keyword in enumerate(keywords):
+            state = 0
+            for char in keyword:
+                next_state = goto[state].get(char)
+                if next_state is None:
+                    next_state = len(goto)
+                    goto[state][char] = next_state
+                    goto.append({})
+                    output.append(())
+                state = next_state
+            output[state] += (index,)
+
+        # Breadth first, so the failure state (a shorter suffix) is always complete already
+        fail = [0] * len(goto)
+        self.transitions = [dict(row) for row in goto]
+        queue = deque(goto[0].values())
+        while queue:
+            state = queue.popleft()
+            for char, next_state in goto[state].items():
+                queue.append(next_state)
+                fallback = fail[state]
+                while fallback and char not in goto[fallback]:
+                    fallback = fail[fallback]
+                fail[next_state] = goto[fallback].get(char, 0)
+                output[next_state] += output[fail[next_state]]
+            if state:
+                inherited = dict(self.transitions[fail[state]]) if fail[state] else {}
+                inherited.update(goto[state])
+                self.transitions[state] = inherited
+        self.output = output
+
+    def find_all(self, text):
+        """(start, keyword index) of every keyword occurrence, by end position"""
+        transitions, output, lengths = self.transitions, self.output, self.lengths
+        root = transitions[0]
+        found = []
+        state = 0
+        for position, char in enumerate(text, 1):
+            next_state = transitions[state].get(char)
+            state = root.get(char, 0) if next_state is None else next_state
+            if output[state]:
+                for index in output[state]:
+                    found.append((position - lengths[index], index))
+        return found
+
+
+def _is_word_char(char):
+    # What \w matches in a str pattern
+    return char.isalnum() or char == '_'
+
+
+def _at_boundary(text, position):
+    """Whether \\b holds at position"""
+    before = position > 0 and _is_word_char(text[position - 1])
+    after = position < len(text) and _is_word_char(text[position])
+    return before != after
+
+
+class Condition:
+    """At least min_count distinct terms (keywords or whole words) present"""
+    __slots__ = ('terms', 'min_count')
+
+    def __init__(self, terms, min_count):
+        self.terms = frozenset(terms)
+        self.min_count = min_count
+
+    def holds(self, matched):
+        if self.min_count == 1:
+            return not self.terms.isdisjoint(matched)
+        return len(self.terms.intersection(matched)) >= self.min_count
+
+
+class Rule:
+    __slots__ = ('name', 'category', 'condition', 'pattern', 'requires', 'unless', 'message')
+
+    def __init__(self, name, category, condition, pattern, requires, unless, message):
+        self.name = name
+        self.category = category
+        self.condition = condition
+        self.pattern = pattern
+        self.requires = requires
+        self.unless = unless
+        self.message = message
+
+
+class RuleSet:
+    """Compiled form of one rules file"""
+
+    def __init__(self, config):
+        try:
+            self.default_category = config['default_category']
+            self.large_amount = config.get('large_amount')
+            rule_configs = config['rules']
+        except (KeyError, TypeError) as e:
+            raise RulesError(f'Rules file is missing {e}')
+
+        self.terms = []  # (text, whole word) per term id
+        term_ids = {}
+
+        def condition(spec, where):
+            ids = []
+            for key, whole_word in (('keywords', False), ('words', True)):
+                for text in spec.get(key, []):
+                    term = (text.lower(), whole_word)
+                    if term not in term_ids:
+                        term_ids[term] = len(self.terms)
+                        self.terms.append(term)
+                    ids.append(term_ids[term])
+            min_count = spec.get('min_count', 1)
+            if not ids and not spec.get('patterns'):
+                raise RulesError(f'{where} has no keywords, words or patterns')
+            return Condition(ids, min_count)
+
+        self.rules = []
+        self.rules_by_term = {}
+        self.pattern_rules = []
+        for index, spec in enumerate(rule_configs):
+            name = spec.get('name', f'rule {index}')
+            if 'category' not in spec:
+                raise RulesError(f'{name} has no category')
+            try:
+                pattern = re.compile('|'.join(f'(?:{p})' for p in spec['patterns'])) if spec.get('patterns') else None
+            except re.error as e:
+                raise RulesError(f'{name} has an invalid pattern: {e}')
+            rule = Rule(name, spec['category'], condition(spec, name), pattern,
+                        [condition(sub, f'{name} requires') for sub in spec.get('requires', [])],
+                        [condition(sub, f'{name} unless') for sub in spec.get('unless', [])],
+                        spec.get('message'))
+            self.rules.append(rule)
+            for term_id in rule.condition.terms:
+                self.rules_by_term.setdefault(term_id, []).append(index)
+            if pattern is not None:
+                self.pattern_rules.append(index)
+
+        self.automaton = KeywordAutomaton([text for text, _ in self.terms])
+
+    def matches(self, text):
+        """{term id: start of its first occurrence} for the terms present in text"""
+        first = {}
+        terms = self.terms
+        for start, term_id in self.automaton.find_all(text):
+            if term_id in first:
+                continue  # occurrences come in order, the first valid one is kept
+            term, whole_word = terms[term_id]
+            if whole_word and not (_at_boundary(text, start) and _at_boundary(text, start + len(term))):
+                continue
+            first[term_id] = start
+        return first
+
+    def categorize(self, description_lower, amount):
+        """(category, Rule or None, matched text or None) for a lowercased description"""
+        first = self.matches(description_lower)
+        matched = first.keys()
+
+        # Only rules with a term present can hold, besides the regex ones
+        candidates = set(self.pattern_rules)
+        for term_id in first:
+            candidates.update(self.rules_by_term.get(term_id, ()))
+
+        for index in sorted(candidates):
+            rule = self.rules[index]
+            hit = None
+            if rule.condition.holds(matched):
+                start, term_id = min((first[term_id], term_id) for term_id in rule.condition.terms if term_id in first)
+                hit = (start, self.terms[term_id][0])
+            if rule.pattern is not None:
+                match = rule.pattern.search(description_lower)
+                if match and (hit is None or match.start() < hit[0]):
+                    hit = (match.start(), match.group(0))
+            if hit is None:
+                continue
+            if not all(condition.holds(matched) for condition in rule.requires):
+                continue
+            if any(condition.holds(matched) for condition in rule.unless):
+                continue
+            return rule.category, rule, hit[1]
+
+        # Default category based on amount and context
+        if self.large_amount and amount > self.large_amount['above']:
+            return self.large_amount['category'], None, None  # Large amounts likely business-related
+        return self.default_category, None, None
+
+
+class RuleEngine:
+    """The categorization rules loaded from a file, swappable at run time"""
+
+    def __init__(self, path=RULES_PATH):
+        self.path = path
+        self._lock = threading.Lock()
+        self.rule_set, self.digest = self._load()
+        self.mtime = os.path.getmtime(path)
+
+    def _load(self):
+        """(RuleSet, digest of the file content) for the rules file"""
+        with open(self.path, 'rb') as f:
+            content = f.read()
+        try:
+            config = json.loads(content.decode('utf-8'))
+        except ValueError as e:
+            raise RulesError(f'{self.path} is not valid JSON: {e}')
+        return RuleSet(config), hashlib.sha256(content).hexdigest()[:16]
+
+    def reload(self):
+        """Re-read the rules file; the old rules stay in place if the new ones are invalid"""
+        rule_set, digest = self._load()
+        with self._lock:
+            self.rule_set, self.digest = rule_set, digest
+            self.mtime = os.path.getmtime(self.path)
+        return self.stats()
+
+    def categorize(self, description, amount):
+        return self.rule_set.categorize(description.lower(), amount)
+
+    def stats(self):
+        rule_set = self.rule_set
+        return {'path': self.path, 'rules': len(rule_set.rules), 'terms': len(rule_set.terms),
+                'states': len(rule_set.automaton.transitions), 'file_mtime': self.mtime,
+                'digest': self.digest}
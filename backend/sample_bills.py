@@ -0,0 +1,117 @@
+"""
+Render synthetic bills with known totals, dates and vendors for benchmark_ocr.py
+
+Each bill is a receipt typeset with PyMuPDF's built-in fonts (GSTIN, phone and bill
+number lines included as distractors) and saved as one of: a clean 200 DPI scan (PNG),
+a phone photo (JPEG: small tilt, blur, uneven lighting, sensor noise), a photo taken
+sideways, or a scan wrapped in an image-only PDF. truth.json maps each file name to
+its amount, date (YYYY-MM-DD) and vendor, which benchmark_ocr.py scores profiles against.
+
+Usage:
+    python sample_bills.py path/to/folder [--count 24] [--seed 0]
+"""
+
+import argparse
+import datetime
+import json
+import os
+import random
+import sys
+
+import cv2
+import fitz  # PyMuPDF
+import numpy as np
+
+VENDORS = ['SHREE GANESH STORES', 'ANNAPURNA RESTAURANT', 'CITY MEDICALS', 'METRO FUEL STATION',
+           'GREEN LEAF CAFE', 'SHARMA HARDWARE', 'BLUE STAR ELECTRONICS', 'FRESH MART SUPERMARKET']
+ITEMS = ['Rice 5kg', 'Toor Dal 1kg', 'Sunflower Oil 1L', 'Paneer Tikka', 'Butter Naan', 'Veg Biryani',
+         'Paracetamol 500', 'Cough Syrup', 'Petrol', 'Masala Chai', 'Cold Coffee', 'Claw Hammer',
+         'Drill Bits Set', 'USB Cable', 'LED Bulb 9W', 'Milk 1L', 'Bread', 'Eggs 12']
+DATE_FORMATS = ['%d/%m/%Y', '%Y-%m-%d', '%d %b %Y']
+FONTS = ['cour', 'helv', 'tiro']
+KINDS = ['scan', 'photo', 'sideways', 'pdf']
+RENDER_DPI = 200
+
+
+def receipt_lines(rng):
+    vendor = rng.choice(VENDORS)
+    date = datetime.date(2025, 1, 1) + datetime.timedelta(days=rng.randint(0, 364))
+    items = [(item, rng.randint(2, 900) + rng.choice([0, 0.5, 0.25, 0.75])) for item in rng.sample(ITEMS, rng.randint(2, 6))]
+    total = round(sum(price for _, price in items), 2)
+    lines = [vendor, f'GSTIN: 27{rng.randint(10000, 99999)}ABCDE1Z{rng.randint(1, 9)}',
+             f'Ph: 98{rng.randint(10000000, 99999999)}', f'Bill No: {rng.randint(1000, 9999)}',
+             f'Date: {date.strftime(rng.choice(DATE_FORMATS))}', '-' * 30]
+    lines += [f'{item:<20}{price:>9.2f}' for item, price in items]
+    lines += ['-' * 30, f"{'Grand Total Rs.':<20}{total:>9.2f}", 'Thank you, visit again']
+    return lines, {'amount': total, 'date': date.isoformat(), 'vendor': vendor}
+
+
+def render(lines, font):
+    """The receipt as a grayscale scan at RENDER_DPI"""
+    doc = fitz.open()
+    page = doc.new_page(width=260, height=40 + 16 * len(lines))
+    for i, line in enumerate(lines):
+        page.insert_text((14, 28 + 16 * i), line, fontname=font, fontsize=10 if font == 'cour' else 11)
+    pix = page.get_pixmap(dpi=RENDER_DPI, colorspace=fitz.csGRAY, alpha=False)
+    image = np.frombuffer(pix.samples, dtype=np.uint8).reshape(pix.height, pix.stride)[:, :pix.width].copy()
+    doc.close()
+    return image
+
+
+def photograph(image, rng, sideways=False):
+    """Tilt, blur, light unevenly and add noise, as a phone photo of the receipt would"""
+    height, width = image.shape
+    canvas = np.full((height + 200, width + 200), 90, dtype=np.uint8)
+    canvas[100:100 + height, 100:100 + width] = image
+    matrix = cv2.getRotationMatrix2D((canvas.shape[1] / 2, canvas.shape[0] / 2), rng.uniform(-3, 3), 1.0)
+    photo = cv2.warpAffine(canvas, matrix, (canvas.shape[1], canvas.shape[0]), borderValue=90).astype(np.float32)
+    photo = cv2.GaussianBlur(photo, (3, 3), rng.uniform(0.6, 1.2))
+    photo *= np.linspace(rng.uniform(0.7, 0.85), 1.0, photo.shape[1], dtype=np.float32)[None, :]
+    photo += np.random.default_rng(rng.randint(0, 2 ** 32 - 1)).normal(0, 8, photo.shape).astype(np.float32)
+    photo = np.clip(photo, 0, 255).astype(np.uint8)
+    return np.ascontiguousarray(np.rot90(photo)) if sideways else photo
+
+
+def write_bill(folder, index, kind, image):
+    if kind == 'scan':
+        name = f'bill_{index:03d}_scan.png'
+        cv2.imwrite(os.path.join(folder, name), image)
+    elif kind == 'pdf':
+        name = f'bill_{index:03d}_scan.pdf'
+        doc = fitz.open()
+        page = doc.new_page(width=image.shape[1] * 72 / RENDER_DPI, height=image.shape[0] * 72 / RENDER_DPI)
+        page.insert_image(page.rect, stream=cv2.imencode('.png', image)[1].tobytes())
+        doc.save(os.path.join(folder, name))
+        doc.close()
+    else:
+        name = f'bill_{index:03d}_{kind}.jpg'
+        cv2.imwrite(os.path.join(folder, name), image, [cv2.IMWRITE_JPEG_QUALITY, 75])
+    return name
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('folder')
+    parser.add_argument('--count', type=int, default=24)
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+
+    rng = random.Random(args.seed)
+    os.makedirs(args.folder, exist_ok=True)
+    truth = {}
+    for index in range(args.count):
+        lines, labels = receipt_lines(rng)
+        image = render(lines, FONTS[index % len(FONTS)])
+        kind = KINDS[index % len(KINDS)]
+        if kind in ('photo', 'sideways'):
+            image = photograph(image, rng, sideways=kind == 'sideways')
+        truth[write_bill(args.folder, index, kind, image)] = labels
+
+    with open(os.path.join(args.folder, 'truth.json'), 'w') as f:
+        json.dump(truth, f, indent=2)
+    print(f"✅ {args.count} bills and truth.json written to {args.folder}")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
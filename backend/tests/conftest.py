@@ -0,0 +1,13 @@
+import atexit
+import os
+import shutil
+import sys
+import tempfile
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+# app builds its result cache and job queue at import; keep their files out of the tree
+_scratch = tempfile.mkdtemp(prefix='smartspend-tests-')
+atexit.register(shutil.rmtree, _scratch, ignore_errors=True)
+os.environ.setdefault('SMARTSPEND_CACHE_DIR', os.path.join(_scratch, 'results'))
+os.environ.setdefault('SMARTSPEND_JOBS_DIR', os.path.join(_scratch, 'jobs'))
@@ -0,0 +1,89 @@
+import pytest
+
+import app
+from app import BillExtractor
+
+
+@pytest.fixture
+def client():
+    return app.app.test_client()
+
+
+@pytest.fixture(autouse=True)
+def empty_category_cache():
+    app.bill_extractor.category_cache.clear()
+
+
+@pytest.mark.parametrize('amount, expected', [
+    (250, 250.0), ('250', 250.0), ('99.50', 99.5), (None, 0.0), ('', 0.0), (0, 0.0)
+])
+def test_expense_amount_coerces_numbers_and_missing_values(amount, expected):
+    assert BillExtractor._expense_amount(amount) == expected
+
+
+@pytest.mark.parametrize('amount', ['twelve', '12,50', [5], {'value': 5}])
+def test_expense_amount_rejects_anything_else(amount):
+    with pytest.raises(ValueError, match='valid number'):
+        BillExtractor._expense_amount(amount)
+
+
+def test_string_and_numeric_amounts_share_a_cache_entry():
+    extractor = app.bill_extractor
+    category = extractor.categorize_expense('Uber ride to office', '350')
+    hits = extractor.category_cache.counters['hits']
+
+    assert extractor.categorize_expense('  uber RIDE to   office ', 350.0) == category
+    assert extractor.category_cache.counters['hits'] == hits + 1
+
+
+def test_model_sees_the_original_description(monkeypatch):
+    extractor = app.bill_extractor
+    seen = []
+
+    def predict(descriptions, amounts):
+        seen.extend(descriptions)
+        return ['Business'] * len(descriptions)
+
+    monkeypatch.setattr(extractor, 'expense_model', object())
+    monkeypatch.setattr(extractor, '_predict_categories', predict)
+
+    assert extractor.categorize_expense('QWERTY Zxcv  #42', '75') == 'Business'
+    assert extractor.categorize_expenses([('ASDF Ghjk', 10)])[0]['category'] == 'Business'
+    assert seen == ['QWERTY Zxcv  #42', 'ASDF Ghjk']
+    # ...while the cache entry is keyed on the normalized one
+    assert extractor.categorize_expense('qwerty zxcv #42', 75) == 'Business'
+    assert len(seen) == 2
+
+
+def test_categorize_endpoint_accepts_string_and_null_amounts(client):
+    for amount in ('1200', None):
+        response = client.post('/api/categorize-expense', json={'description': 'Electricity bill', 'amount': amount})
+        assert response.status_code == 200
+        assert response.get_json()['success']
+
+
+def test_categorize_endpoint_rejects_bad_amounts(client):
+    response = client.post('/api/categorize-expense', json={'description': 'Electricity bill', 'amount': 'twelve'})
+    assert response.status_code == 400
+    assert 'valid number' in response.get_json()['error']
+
+
+def test_batch_endpoint_matches_single_categorization(client):
+    expenses = [{'description': 'Uber ride', 'amount': '350'},
+                {'description': 'Pizza dinner with team', 'amount': 800},
+                {'description': 'Electricity bill', 'amount': None},
+                {'description': 'uber  RIDE', 'amount': 350}]
+    response = client.post('/api/categorize-expenses', json={'expenses': expenses})
+    assert response.status_code == 200
+    batch = [result['category'] for result in response.get_json()['results']]
+
+    app.bill_extractor.category_cache.clear()
+    single = [app.bill_extractor.categorize_expense(e['description'], e['amount']) for e in expenses]
+    assert batch == single
+
+
+def test_batch_endpoint_rejects_bad_amounts(client):
+    response = client.post('/api/categorize-expenses',
+                           json={'expenses': [{'description': 'Taxi', 'amount': 10}, {'description': 'Taxi', 'amount': 'x'}]})
+    assert response.status_code == 400
+    assert 'Expense 1' in response.get_json()['error']
@@ -0,0 +1,148 @@
+import json
+import os
+import time
+
+import pytest
+
+import job_queue
+from job_queue import JobQueue
+
+
+def write_job(jobs_dir, job_id, status, created_at, upload=b'bill', **fields):
+    """A job record (and its upload) as a previous process left them on disk"""
+    job = dict({
+        'id': job_id, 'status': status, 'stage': status, 'progress': 0.5, 'file_type': 'image',
+        'filename': f'{job_id}.png', 'options': {}, 'created_at': created_at, 'version': 3,
+        'result': None, 'error': None
+    }, **fields)
+    with open(os.path.join(jobs_dir, job_id + '.json'), 'w', encoding='utf-8') as f:
+        json.dump(job, f)
+    if upload is not None:
+        with open(os.path.join(jobs_dir, job_id + '.upload'), 'wb') as f:
+            f.write(upload)
+    return job
+
+
+def read_job(jobs_dir, job_id):
+    with open(os.path.join(jobs_dir, job_id + '.json'), encoding='utf-8') as f:
+        return json.load(f)
+
+
+def wait_until_finished(jobs, job_ids, timeout=10.0):
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        found = [jobs.get(job_id) for job_id in job_ids]
+        if all(job and job['status'] in job_queue.FINISHED_STATES for job in found):
+            return found
+        time.sleep(0.01)
+    raise AssertionError(f'jobs did not finish: {[jobs.get(job_id) for job_id in job_ids]}')
+
+
+@pytest.fixture
+def jobs_dir(tmp_path):
+    return str(tmp_path)
+
+
+@pytest.fixture
+def handled():
+    """Handler that records (job id, upload bytes) and returns the upload's length"""
+    calls = []
+
+    def handler(job, payload, progress):
+        data = payload.read()
+        calls.append((job['id'], data))
+        progress('ocr', 0.5)
+        return {'success': True, 'size': len(data)}
+    handler.calls = calls
+    return handler
+
+
+def test_unfinished_jobs_are_requeued_and_run_in_order(jobs_dir, handled):
+    now = time.time()
+    write_job(jobs_dir, 'running', 'running', now - 10, upload=b'second')
+    write_job(jobs_dir, 'queued', 'queued', now - 20, upload=b'first')
+
+    jobs = JobQueue(handled, workers=1, jobs_dir=jobs_dir)
+    jobs.start()
+    finished = wait_until_finished(jobs, ['queued', 'running'])
+
+    assert [job['status'] for job in finished] == ['done', 'done']
+    assert handled.calls == [('queued', b'first'), ('running', b'second')]
+    assert jobs.stats()['recovered'] == 2
+    assert read_job(jobs_dir, 'running')['result'] == {'success': True, 'size': 6}
+    assert not os.path.exists(os.path.join(jobs_dir, 'running.upload'))
+
+
+def test_finished_jobs_are_kept_without_running_again(jobs_dir, handled):
+    write_job(jobs_dir, 'done', 'done', time.time() - 60, upload=None,
+              finished_at=time.time() - 30, result={'success': True, 'amount': 42.0})
+
+    jobs = JobQueue(handled, workers=1, jobs_dir=jobs_dir)
+    jobs.start()
+
+    assert jobs.get('done')['result'] == {'success': True, 'amount': 42.0}
+    assert jobs.stats()['recovered'] == 0
+    assert handled.calls == []
+
+
+def test_expired_finished_jobs_are_removed(jobs_dir, handled):
+    finished_at = time.time() - job_queue.JOB_RETENTION_SECONDS - 60
+    write_job(jobs_dir, 'old', 'failed', finished_at - 10, finished_at=finished_at, error='boom')
+
+    jobs = JobQueue(handled, workers=1, jobs_dir=jobs_dir)
+    jobs.start()
+
+    assert jobs.get('old') is None
+    assert os.listdir(jobs_dir) == []
+
+
+def test_unreadable_records_are_skipped(jobs_dir, handled):
+    with open(os.path.join(jobs_dir, 'broken.json'), 'w', encoding='utf-8') as f:
+        f.write('{"id": "broken", "stat')
+    write_job(jobs_dir, 'queued', 'queued', time.time())
+
+    jobs = JobQueue(handled, workers=1, jobs_dir=jobs_dir)
+    jobs.start()
+
+    assert wait_until_finished(jobs, ['queued'])[0]['status'] == 'done'
+    assert jobs.get('broken') is None
+
+
+def test_jobs_beyond_capacity_fail_instead_of_waiting_forever(jobs_dir, handled):
+    now = time.time()
+    for i in range(3):
+        write_job(jobs_dir, f'job{i}', 'queued', now + i)
+
+    # No workers, so nothing drains the queue while it is refilled
+    jobs = JobQueue(handled, workers=0, max_depth=1, jobs_dir=jobs_dir)
+    jobs.start()
+
+    assert [jobs.get(f'job{i}')['status'] for i in range(3)] == ['queued', 'failed', 'failed']
+    assert jobs.get('job2')['error'] == 'Job queue full after restart'
+    assert read_job(jobs_dir, 'job2')['status'] == 'failed'
+    assert jobs.stats()['recovered'] == 1
+
+
+def test_jobs_accepted_before_a_crash_run_after_the_restart(jobs_dir, handled):
+    # Accepted and persisted, but the process died before a worker picked it up
+    crashed = JobQueue(handled, workers=0, jobs_dir=jobs_dir)
+    job = crashed.submit('image', 'receipt.png', b'receipt bytes', options={'profile': 'fast'})
+
+    jobs = JobQueue(handled, workers=1, jobs_dir=jobs_dir)
+    jobs.start()
+    finished = wait_until_finished(jobs, [job['id']])[0]
+
+    assert finished['status'] == 'done'
+    assert finished['options'] == {'profile': 'fast'}
+    assert handled.calls == [(job['id'], b'receipt bytes')]
+
+
+def test_jobs_whose_upload_is_gone_fail(jobs_dir, handled):
+    write_job(jobs_dir, 'lost', 'running', time.time(), upload=None)
+
+    jobs = JobQueue(handled, workers=1, jobs_dir=jobs_dir)
+    jobs.start()
+    finished = wait_until_finished(jobs, ['lost'])[0]
+
+    assert finished['status'] == 'failed'
+    assert handled.calls == []
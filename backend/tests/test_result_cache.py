@@ -0,0 +1,114 @@
+import io
+import json
+import shutil
+
+import pytest
+
+import app
+import ocr_profiles
+import rules
+from result_cache import ResultCache
+
+
+@pytest.fixture
+def result_cache(monkeypatch, tmp_path):
+    cache = ResultCache(disk_dir=str(tmp_path))
+    monkeypatch.setattr(app, 'result_cache', cache)
+    return cache
+
+
+def counting(result):
+    calls = []
+
+    def compute():
+        calls.append(1)
+        return dict(result)
+    return compute, calls
+
+
+def result_key(file_type='image'):
+    return ResultCache.make_key(b'bill', *app.pipeline_variant(file_type, ocr_profiles.get_profile()))
+
+
+def test_key_covers_the_content_and_every_variant_part():
+    key = ResultCache.make_key(b'bill', 'image', 'balanced')
+    assert ResultCache.make_key(b'bill', 'image', 'balanced') == key
+    assert ResultCache.make_key(b'bill 2', 'image', 'balanced') != key
+    assert ResultCache.make_key(b'bill', 'pdf', 'balanced') != key
+    assert ResultCache.make_key(b'bill', 'image', 'accurate') != key
+    assert ResultCache.make_key(b'bill', 'image', 'balanced', 'retrained') != key
+
+
+def test_file_objects_hash_like_their_bytes_and_are_rewound():
+    upload = io.BytesIO(b'%PDF-1.4 bill')
+    upload.seek(5)
+    assert ResultCache.make_key(upload, 'pdf') == ResultCache.make_key(b'%PDF-1.4 bill', 'pdf')
+    assert upload.tell() == 0
+
+
+def test_result_key_changes_with_the_model_and_the_rules(monkeypatch):
+    key = result_key()
+    assert result_key() == key
+    assert result_key('pdf') != key
+
+    monkeypatch.setattr(app.bill_extractor, 'model_fingerprint', (('expense_model.pkl', 1024, 1760000000.0),))
+    retrained = result_key()
+    assert retrained != key
+
+    monkeypatch.setattr(app.bill_extractor.category_rules, 'digest', '0123456789abcdef')
+    assert result_key() not in (key, retrained)
+
+
+def test_rules_digest_follows_the_file_content(tmp_path):
+    path = tmp_path / 'rules.json'
+    shutil.copy(rules.RULES_PATH, path)
+    engine = rules.RuleEngine(str(path))
+    digest = engine.digest
+
+    engine.reload()
+    assert engine.digest == digest
+
+    path.write_text(json.dumps(json.loads(path.read_text(encoding='utf-8'))), encoding='utf-8')
+    engine.reload()
+    assert engine.digest != digest
+    assert engine.stats()['digest'] == engine.digest
+
+
+def test_cached_results_are_recomputed_after_a_model_change(monkeypatch, result_cache):
+    compute, calls = counting({'success': True, 'extracted_text': 'Grand Total 100.00', 'amount': 100.0})
+
+    assert app.cached_result(b'bill', 'image', compute)['cached'] is False
+    assert app.cached_result(b'bill', 'image', compute)['cached'] is True
+    assert len(calls) == 1
+
+    monkeypatch.setattr(app.bill_extractor, 'model_fingerprint', (('expense_model.pkl', 1024, 1760000000.0),))
+    assert app.cached_result(b'bill', 'image', compute)['cached'] is False
+    assert len(calls) == 2
+
+
+def test_cache_hits_rederive_the_date(result_cache):
+    # Stored with the current-date fallback of the day it was first extracted
+    compute, calls = counting({'success': True, 'date': '2020-01-01',
+                               'extracted_text': 'GREEN LEAF CAFE\nDate: 14/03/2025\nTotal 100.00'})
+    app.cached_result(b'bill', 'image', compute)
+
+    result = app.cached_result(b'bill', 'image', compute)
+    assert result['cached'] is True
+    assert result['date'] == '2025-03-14'
+    assert len(calls) == 1
+
+
+def test_failed_extractions_are_not_cached(result_cache):
+    compute, calls = counting({'success': True, 'manual_entry_required': True})
+    app.cached_result(b'bill', 'image', compute)
+    app.cached_result(b'bill', 'image', compute)
+    assert len(calls) == 2
+
+
+def test_rules_reload_forgets_cached_categories():
+    extractor = app.bill_extractor
+    extractor.categorize_expense('Uber ride', 300)
+    assert extractor.category_cache.stats()['entries'] > 0
+
+    extractor.reload_categorization_rules()
+    assert extractor.category_cache.stats()['entries'] == 0
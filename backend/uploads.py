@@ -0,0 +1,100 @@
+"""
+Upload size limits and spooling
+
+PDFs are written straight to named temporary files and handed to PyMuPDF and the OCR
+workers by that path, so memory per request stays bounded whatever the file size and
+the upload is on disk exactly once. Other bodies are spooled (memory up to
+UPLOAD_SPOOL_BYTES, then disk). Images have to be decoded in memory and get their own
+byte and pixel limits.
+"""
+
+import os
+import shutil
+import tempfile
+
+MB = 1024 * 1024
+
+# Whole request body, enforced by Flask (MAX_CONTENT_LENGTH) with a 413 response
+MAX_UPLOAD_BYTES = int(float(os.environ.get('SMARTSPEND_MAX_UPLOAD_MB', 50)) * MB)
+# Uploads larger than this are spooled to a temporary file instead of memory
+UPLOAD_SPOOL_BYTES = int(float(os.environ.get('SMARTSPEND_UPLOAD_SPOOL_MB', 1)) * MB)
+MAX_IMAGE_BYTES = int(float(os.environ.get('SMARTSPEND_MAX_IMAGE_MB', 25)) * MB)
+MAX_IMAGE_PIXELS = int(os.environ.get('SMARTSPEND_MAX_IMAGE_PIXELS', 80_000_000))
+MAX_PDF_PAGES = int(os.environ.get('SMARTSPEND_MAX_PDF_PAGES', 100))
+
+CHUNK_SIZE = 64 * 1024
+
+
+class UploadTooLargeError(ValueError):
+    """Raised when an upload exceeds a size, pixel or page limit"""
+
+
+def _copy_limited(stream, target, max_bytes, head):
+    max_bytes = MAX_UPLOAD_BYTES if max_bytes is None else max_bytes
+    target.write(head)
+    size = len(head)
+    while True:
+        chunk = stream.read(CHUNK_SIZE)
+        if not chunk:
+            break
+        size += len(chunk)
+        if size > max_bytes:
+            target.close()
+            raise UploadTooLargeError(f'Upload exceeds {max_bytes // MB} MB')
+        target.write(chunk)
+    target.seek(0)
+    return target
+
+
+def spool(stream, max_bytes=None, head=b''):
+    """Copy a stream into a spooled temporary file in chunks, enforcing max_bytes
+
+    head is data already read off the stream (e.g. to sniff the type); it goes first.
+    """
+    return _copy_limited(stream, tempfile.SpooledTemporaryFile(max_size=UPLOAD_SPOOL_BYTES), max_bytes, head)
+
+
+def spool_pdf(stream, max_bytes=None, head=b''):
+    """Like spool, but into a named temporary file whose path pdf_pipeline reuses as is
+
+    A spooled file that rolled over to disk has no path, so it would be copied once more.
+    The file is deleted when closed.
+    """
+    return _copy_limited(stream, pdf_temp_file(), max_bytes, head)
+
+
+def pdf_temp_file():
+    return tempfile.NamedTemporaryFile(suffix='.pdf')
+
+
+def is_pdf_upload(content_type, filename):
+    return content_type == 'application/pdf' or (filename or '').lower().endswith('.pdf')
+
+
+def read_limited(stream, max_bytes):
+    """Read a whole stream into memory, refusing anything over max_bytes"""
+    data = stream.read(max_bytes + 1)
+    if len(data) > max_bytes:
+        raise UploadTooLargeError(f'Image exceeds {max_bytes // MB} MB')
+    return data
+
+
+def check_image_pixels(width, height):
+    if width * height > MAX_IMAGE_PIXELS:
+        raise UploadTooLargeError(f'Image is {width}x{height}, limit is {MAX_IMAGE_PIXELS // 1_000_000} megapixels')
+
+
+def check_page_count(page_count):
+    if page_count > MAX_PDF_PAGES:
+        raise UploadTooLargeError(f'PDF has {page_count} pages, limit is {MAX_PDF_PAGES}')
+
+
+def copy_to_path(source, path):
+    """Write bytes or a file object to path without loading the file object whole"""
+    with open(path, 'wb') as f:
+        if isinstance(source, (bytes, bytearray, memoryview)):
+            f.write(source)
+        else:
+            source.seek(0)
+            shutil.copyfileobj(source, f, CHUNK_SIZE)
+            source.seek(0)